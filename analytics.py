@@ -0,0 +1,249 @@
+# Модуль потоковой аналитики измерений и пороговых оповещений
+# Для каждого устройства и показателя (температура, влажность) хранится окно последних
+# window измерений и сумма окна, а также экспоненциальное среднее (EWMA) и дисперсия.
+# Пачка измерений от конвейера обрабатывается массивами NumPy сразу для всех устройств:
+# O(1) на измерение, история не пересматривается. Скользящее среднее берется из суммы окна,
+# минимум, максимум и скорость изменения считаются по окну одного устройства при запросе.
+# Оценка аномалии - отклонение от EWMA в единицах EWMA-стандартного отклонения.
+# Оповещения (ниже/выше порога, аномалия) проходят через задержку: состояние меняется,
+# только если условие держится hold секунд по времени измерений, поэтому дребезг
+# около порога не порождает лавину сообщений.
+import threading                    # Блокировка: пачки приходят из рабочего потока, запросы - из GUI
+from collections import deque       # Последние оповещения
+import numpy as np                  # Обработка пачки массивами
+from fleet import MAX_DEVICES       # Тот же лимит устройств, что и у буферов графиков
+
+METRICS = ("temperature", "humidity")   # Показатели (индекс 0 и 1 в массивах)
+ALERTS = ("low", "high", "anomaly")     # Виды оповещений (индекс в массивах состояния)
+WINDOW = 60                 # Измерений в скользящем окне
+EWMA_ALPHA = 0.1            # Вес нового измерения в EWMA
+WARMUP = 10                 # Измерений до начала оценки аномалий
+MIN_STD = 0.1               # Минимальное стандартное отклонение (точность датчика DHT)
+ANOMALY_THRESHOLD = 4.0     # Оценка аномалии, при которой поднимается оповещение
+ALERT_HOLD_S = 10.0         # Сколько секунд условие должно держаться (или пропасть) для смены состояния
+RAISED = "raised"           # Оповещение поднято
+CLEARED = "cleared"         # Оповещение снято
+DEFAULT_RULE = "*"          # Ключ правил для всех устройств
+INITIAL_DEVICES = 16        # Начальный размер массивов (растет вдвое)
+RECENT_ALERTS = 100         # Сколько последних оповещений хранить для GUI
+
+
+# Функция возвращает пороги (нижний, верхний) показателя для устройства
+# rules - {"*": {"temperature": (низ, верх), ...}, "ID устройства": {...}}, None - без границы
+def thresholds(rules, device_id, metric):
+    bounds = (rules.get(device_id) or {}).get(metric)
+    if bounds is None:
+        bounds = (rules.get(DEFAULT_RULE) or {}).get(metric)
+    low, high = bounds if bounds is not None else (None, None)
+    return (-np.inf if low is None else low), (np.inf if high is None else high)
+
+
+# Функция форматирует оповещение для строки статуса и консоли
+def format_alert(event):
+    if event["alert"] == "anomaly":
+        detail = f"score {event['score']:.1f}"
+    else:
+        detail = f"{event['value']:.1f} vs {event['alert']} {event['threshold']:g}"
+    return f"{event['device']} {event['metric']} {event['alert']} {event['state']} ({detail})"
+
+
+# Класс потоковой аналитики для всего парка устройств
+class StreamAnalytics:
+    # Конструктор класса
+    # rules - пороги по устройствам (см. thresholds), on_alert(event) - вызывается для каждого
+    # поднятого и снятого оповещения в рабочем потоке конвейера (вне блокировки)
+    # max_devices - сколько устройств отслеживать (измерения остальных пропускаются)
+    def __init__(self, rules=None, window=WINDOW, alpha=EWMA_ALPHA, anomaly_threshold=ANOMALY_THRESHOLD,
+                 hold=ALERT_HOLD_S, on_alert=None, max_devices=MAX_DEVICES):
+        self.rules = rules or {}
+        self.window = window
+        self.max_devices = max_devices
+        self.alpha = alpha
+        self.anomaly_threshold = anomaly_threshold
+        self.on_alert = on_alert
+        # Задержка подъема для порогов - hold, для аномалии - 0 (всплеск короткий); снятия - всегда hold
+        self.raise_hold = np.array([hold, hold, 0.0])
+        self.clear_hold = np.array([hold, hold, hold])
+        self.rows = {}              # ID устройства -> строка массивов
+        self.device_ids = []        # Строка массивов -> ID устройства
+        self.lock = threading.Lock()
+        self.recent = deque(maxlen=RECENT_ALERTS)  # Последние оповещения (новые в конце)
+        # Счетчики
+        self.readings = 0       # Обработано измерений
+        self.rejected = 0       # Пропущено измерений устройств сверх max_devices
+        self.raised = 0         # Поднято оповещений
+        self.cleared = 0        # Снято оповещений
+        self._allocate(min(INITIAL_DEVICES, max_devices))
+
+    # Метод создает (или увеличивает) массивы состояния на capacity устройств
+    def _allocate(self, capacity):
+        old = getattr(self, "values", None)
+        size = 0 if old is None else len(old)
+        channels = len(METRICS)
+        arrays = {
+            "values": np.full((capacity, channels, self.window), np.nan),  # Окно значений
+            "times": np.zeros((capacity, self.window)),                     # Время значений окна
+            "position": np.zeros(capacity, dtype=np.int64),                 # Следующая ячейка окна
+            "count": np.zeros(capacity, dtype=np.int64),                    # Всего измерений
+            "sums": np.zeros((capacity, channels)),                         # Сумма окна
+            "mean": np.zeros((capacity, channels)),                         # EWMA среднее
+            "var": np.zeros((capacity, channels)),                          # EWMA дисперсия
+            "score": np.zeros((capacity, channels)),                        # Последняя оценка аномалии
+            "low": np.full((capacity, channels), -np.inf),                  # Нижние пороги
+            "high": np.full((capacity, channels), np.inf),                  # Верхние пороги
+            "active": np.zeros((capacity, channels, len(ALERTS)), dtype=bool),  # Поднятые оповещения
+            "pending": np.full((capacity, channels, len(ALERTS)), np.nan),  # Начало расхождения условия
+        }                                                                   # и состояния оповещения
+        for name, array in arrays.items():
+            if size:
+                array[:size] = getattr(self, name)
+            setattr(self, name, array)
+
+    # Метод возвращает строку массивов устройства (новое устройство получает пороги из правил)
+    # None - достигнут лимит устройств (защита от мусорных топиков: массивы не растут без конца)
+    def _row(self, device_id):
+        row = self.rows.get(device_id)
+        if row is None:
+            row = len(self.device_ids)
+            if row >= self.max_devices:
+                return None
+            if row == len(self.values):
+                self._allocate(min(row * 2, self.max_devices))
+            self.rows[device_id] = row
+            self.device_ids.append(device_id)
+            for channel, metric in enumerate(METRICS):
+                self.low[row, channel], self.high[row, channel] = thresholds(self.rules, device_id, metric)
+        return row
+
+    # Метод обрабатывает пачку измерений (обработчик конвейера приема)
+    # readings - список кортежей (ID устройства, время, температура, влажность)
+    def add_readings(self, readings):
+        events = []
+        with self.lock:
+            # Пачка делится на проходы, в каждом устройство встречается не больше одного раза,
+            # чтобы обновления одного устройства применялись по порядку
+            rounds = []
+            seen = {}
+            rows = []
+            accepted = []
+            for reading in readings:
+                row = self._row(reading[0])
+                if row is None:
+                    continue  # Устройство сверх лимита
+                occurrence = seen.get(row, 0)
+                seen[row] = occurrence + 1
+                if occurrence == len(rounds):
+                    rounds.append([])
+                rounds[occurrence].append(len(rows))
+                rows.append(row)
+                accepted.append(reading)
+            self.rejected += len(readings) - len(accepted)
+            readings = accepted
+            rows = np.array(rows, dtype=np.int64)
+            data = np.array([reading[1:4] for reading in readings], dtype=np.float64).reshape(-1, 3)
+            for indexes in rounds:
+                if len(rounds) > 1:
+                    indexes = np.asarray(indexes)
+                    self._update(rows[indexes], data[indexes, 0], data[indexes, 1:], events)
+                else:
+                    self._update(rows, data[:, 0], data[:, 1:], events)
+            self.readings += len(readings)
+            self.recent.extend(events)
+        # Оповещения отправляются вне блокировки: GUI может в это время запрашивать статистику
+        if self.on_alert is not None:
+            for event in events:
+                try:
+                    self.on_alert(event)
+                except Exception as e:
+                    print(f"Error in alert handler: {e}")
+
+    # Метод обновляет состояние устройств rows (без повторов) новыми значениями values (k x 2)
+    def _update(self, rows, times, values, events):
+        # Окно: заменяем самое старое значение, сумма окна обновляется на разность
+        slot = self.position[rows]
+        filled = self.count[rows] >= self.window
+        old = self.values[rows, :, slot]
+        self.sums[rows] += values - np.where(filled[:, None], old, 0.0)
+        self.values[rows, :, slot] = values
+        self.times[rows, slot] = times
+        self.position[rows] = (slot + 1) % self.window
+        # Оценка аномалии по EWMA до обновления (первое измерение задает начальное среднее)
+        previous = self.count[rows]
+        mean = np.where(previous[:, None] > 0, self.mean[rows], values)
+        variance = self.var[rows]
+        deviation = values - mean
+        score = np.abs(deviation) / np.sqrt(np.maximum(variance, MIN_STD * MIN_STD))
+        score[previous < WARMUP] = 0.0
+        self.score[rows] = score
+        self.mean[rows] = mean + self.alpha * deviation
+        self.var[rows] = (1 - self.alpha) * (variance + self.alpha * deviation * deviation)
+        self.count[rows] = previous + 1
+        # Условия оповещений: (устройство, показатель, вид)
+        condition = np.stack((values < self.low[rows], values > self.high[rows],
+                              score > self.anomaly_threshold), axis=2)
+        active = self.active[rows]
+        pending = self.pending[rows]
+        differs = condition != active
+        now = times[:, None, None]
+        pending = np.where(differs, np.where(np.isnan(pending), now, pending), np.nan)
+        hold = np.where(active, self.clear_hold, self.raise_hold)
+        flip = differs & (now - pending >= hold)
+        self.active[rows] = active ^ flip
+        self.pending[rows] = np.where(flip, np.nan, pending)
+        # Смена состояния - редкое событие, описания оповещений собираем по одному
+        for index, channel, kind in zip(*np.nonzero(flip)):
+            row = rows[index]
+            state = CLEARED if active[index, channel, kind] else RAISED
+            if state == RAISED:
+                self.raised += 1
+            else:
+                self.cleared += 1
+            alert = ALERTS[kind]
+            threshold = {"low": self.low, "high": self.high}.get(alert)
+            events.append({
+                "device": self.device_ids[row],
+                "metric": METRICS[channel],
+                "alert": alert,
+                "state": state,
+                "value": float(values[index, channel]),
+                "threshold": (float(threshold[row, channel]) if threshold is not None
+                              else self.anomaly_threshold),
+                "score": float(score[index, channel]),
+                "time": float(times[index]),
+            })
+
+    # Метод возвращает статистику устройства: {показатель: {avg, min, max, rate, score}} или None
+    # rate - скорость изменения за окно, единиц в минуту
+    def device_stats(self, device_id):
+        with self.lock:
+            row = self.rows.get(device_id)
+            if row is None or not self.count[row]:
+                return None
+            filled = min(int(self.count[row]), self.window)
+            oldest = int(self.position[row]) if self.count[row] >= self.window else 0
+            newest = (int(self.position[row]) - 1) % self.window
+            span = self.times[row, newest] - self.times[row, oldest]
+            result = {}
+            for channel, metric in enumerate(METRICS):
+                window = self.values[row, channel]
+                rate = (window[newest] - window[oldest]) / span * 60 if span > 0 else 0.0
+                result[metric] = {
+                    "avg": float(self.sums[row, channel] / filled),
+                    "min": float(np.nanmin(window)),
+                    "max": float(np.nanmax(window)),
+                    "rate": float(rate),
+                    "score": float(self.score[row, channel]),
+                }
+            return result
+
+    # Метод возвращает количество поднятых сейчас оповещений
+    def active_count(self):
+        with self.lock:
+            return int(self.active[:len(self.device_ids)].sum())
+
+    # Метод возвращает список поднятых оповещений: (ID устройства, показатель, вид)
+    def active_alerts(self):
+        with self.lock:
+            rows, channels, kinds = np.nonzero(self.active[:len(self.device_ids)])
+            return [(self.device_ids[row], METRICS[channel], ALERTS[kind])
+                    for row, channel, kind in zip(rows, channels, kinds)]
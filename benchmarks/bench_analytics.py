@@ -0,0 +1,55 @@
+# Бенчмарк потоковой аналитики: пачки измерений от парка устройств -> StreamAnalytics
+# Сравнивает обработку пачками NumPy с пересчетом статистики по окну каждого устройства
+# (как если бы среднее, минимум и максимум считались заново по истории при каждом измерении).
+# Запуск: python benchmarks/bench_analytics.py [--devices 1000] [--readings 200000] [--batch 500]
+import argparse                     # Для разбора аргументов командной строки
+import os                           # Для работы с путями
+import sys                          # Для добавления корня проекта в путь импорта
+import time                         # Для замера времени
+from collections import defaultdict, deque # Окна для варианта с пересчетом
+
+import numpy as np                  # Для генерации измерений
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analytics import StreamAnalytics, WINDOW # noqa: E402
+
+
+# Функция генерирует пачки измерений (ID устройства, время, температура, влажность)
+def make_batches(devices, readings, batch):
+    rng = np.random.default_rng(42)
+    temps = rng.normal(22, 1, readings)
+    hums = rng.normal(50, 3, readings)
+    items = [(f"node-{i % devices}", 1e9 + i * 0.01, float(temps[i]), float(hums[i])) for i in range(readings)]
+    return [items[i:i + batch] for i in range(0, readings, batch)]
+
+
+# Вариант с пересчетом: среднее, минимум и максимум окна заново для каждого измерения
+def rescan(batches):
+    windows = defaultdict(lambda: (deque(maxlen=WINDOW), deque(maxlen=WINDOW)))
+    for batch in batches:
+        for device_id, _, temperature, humidity in batch:
+            for window, value in zip(windows[device_id], (temperature, humidity)):
+                window.append(value)
+                sum(window) / len(window), min(window), max(window)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming analytics benchmark")
+    parser.add_argument("--devices", type=int, default=1000, help="number of devices")
+    parser.add_argument("--readings", type=int, default=200000, help="total readings")
+    parser.add_argument("--batch", type=int, default=500, help="readings per ingest batch")
+    args = parser.parse_args()
+
+    batches = make_batches(args.devices, args.readings, args.batch)
+    print(f"{args.readings} readings from {args.devices} devices in batches of {args.batch}")
+    analytics = StreamAnalytics({"*": {"temperature": (5, 40), "humidity": (15, 85)}})
+    for name, run in (("rescan", lambda: rescan(batches)),
+                      ("numpy", lambda: [analytics.add_readings(batch) for batch in batches])):
+        started = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - started
+        print(f"{name:>8} {args.readings / elapsed:>12,.0f} readings/s  {elapsed * 1e6 / args.readings:6.2f} us/reading")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# Сравнение форматов сообщений DHT: JSON против двоичного кадра (binary_frames.py)
+# Показывает размер одного измерения (в сообщении и в пакете MQTT) и скорость разбора
+# Запуск: python benchmarks/bench_binary.py [--count 200000]
+import argparse                     # Для разбора аргументов командной строки
+import json                         # Для формирования JSON сообщений
+import os                           # Для работы с путями
+import random                       # Для генерации измерений
+import sys                          # Для добавления корня проекта в путь импорта
+import time                         # Для замера времени
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from binary_frames import encode_dht_frame  # noqa: E402
+from decoders import available_decoders, get_decoder  # noqa: E402
+
+JSON_TOPIC = "esp32/node-001/sensor/dht"
+BINARY_TOPIC = "esp32/node-001/sensor/dht/bin"
+
+
+# Размер пакета MQTT PUBLISH с QoS 0: фиксированный заголовок + длина топика + топик + данные
+def publish_packet_size(topic, payload):
+    remaining = 2 + len(topic.encode()) + len(payload)
+    length_bytes = 1 if remaining < 128 else 2 if remaining < 16384 else 3
+    return 1 + length_bytes + remaining
+
+
+# Функция замеряет скорость разбора (сообщений в секунду), лучшая из repeat попыток
+def measure(decode, payloads, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for payload in payloads:
+            decode(payload)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(payloads) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON vs binary DHT frame benchmark")
+    parser.add_argument("--count", type=int, default=200000, help="number of readings")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per decoder, best is reported")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    readings = [(round(rng.uniform(15, 35), 1), round(rng.uniform(20, 80), 1)) for _ in range(args.count)]
+    json_payloads = [json.dumps({"temperature": t, "humidity": h}).encode() for t, h in readings]
+    binary_payloads = [encode_dht_frame(t, h) for t, h in readings]
+
+    print(f"{args.count} readings")
+    print(f"{'format':>16} {'payload B':>10} {'packet B':>9} {'msg/s':>12} {'us/msg':>8}")
+    rows = []
+    for name in available_decoders():
+        rows.append((f"json/{name}", json_payloads, JSON_TOPIC, get_decoder(name)))
+    rows.append(("binary", binary_payloads, BINARY_TOPIC, get_decoder("json")))
+    for label, payloads, topic, decode in rows:
+        payload_size = sum(map(len, payloads)) / len(payloads)
+        packet_size = sum(publish_packet_size(topic, p) for p in payloads) / len(payloads)
+        rate = measure(decode, payloads, args.repeat)
+        print(f"{label:>16} {payload_size:>10.1f} {packet_size:>9.1f} {rate:>12,.0f} {1e6 / rate:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# Бенчмарк разбора сообщений DHT: старый путь on_message против декодеров из decoders.py
+# Запуск: python benchmarks/bench_decode.py [--payloads payloads.txt] [--count 200000]
+# Файл с записанными сообщениями - по одному JSON на строку (например, вывод mosquitto_sub)
+import argparse                     # Для разбора аргументов командной строки
+import json                         # Для старого варианта разбора
+import os                           # Для работы с путями
+import random                       # Для генерации синтетических сообщений
+import sys                          # Для добавления корня проекта в путь импорта
+import time                         # Для замера времени
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from decoders import DecodeError, available_decoders, get_decoder  # noqa: E402
+
+
+# Старый вариант из on_message: байты -> строка -> dict -> get + round
+def legacy_decode(payload):
+    data = json.loads(payload.decode("utf-8"))
+    temperature = round(data.get("temperature", 0), 1)
+    humidity = round(data.get("humidity", 0), 1)
+    return temperature, humidity
+
+
+# Функция читает записанные сообщения из файла
+def load_payloads(path):
+    with open(path, "rb") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+# Функция генерирует сообщения в формате прошивки ESP32
+def synthetic_payloads(count):
+    rng = random.Random(42)
+    return [json.dumps({"temperature": round(rng.uniform(15, 35), 1),
+                        "humidity": round(rng.uniform(20, 80), 1)}).encode()
+            for _ in range(count)]
+
+
+# Функция замеряет скорость разбора (сообщений в секунду), лучшая из repeat попыток
+def measure(decode, payloads, repeat):
+    best = None
+    errors = 0
+    for _ in range(repeat):
+        errors = 0
+        start = time.perf_counter()
+        for payload in payloads:
+            try:
+                decode(payload)
+            except (DecodeError, ValueError, AttributeError, TypeError):
+                errors += 1
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(payloads) / best, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DHT payload decoding benchmark")
+    parser.add_argument("--payloads", help="file with recorded payloads, one JSON per line")
+    parser.add_argument("--count", type=int, default=200000, help="number of synthetic payloads")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per decoder, best is reported")
+    args = parser.parse_args()
+
+    payloads = load_payloads(args.payloads) if args.payloads else synthetic_payloads(args.count)
+    print(f"{len(payloads)} payloads, {sum(map(len, payloads)) / len(payloads):.1f} bytes on average")
+
+    baseline, errors = measure(legacy_decode, payloads, args.repeat)
+    print(f"{'decoder':>8} {'msg/s':>12} {'us/msg':>8} {'speedup':>8} {'rejected':>9}")
+    print(f"{'legacy':>8} {baseline:>12,.0f} {1e6 / baseline:>8.2f} {1.0:>7.1f}x {errors:>9}")
+    for name in available_decoders():
+        rate, errors = measure(get_decoder(name, detect_binary=False), payloads, args.repeat)
+        print(f"{name:>8} {rate:>12,.0f} {1e6 / rate:>8.2f} {rate / baseline:>7.1f}x {errors:>9}")
+
+
+if __name__ == "__main__":
+    main()
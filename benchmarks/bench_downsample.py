@@ -0,0 +1,69 @@
+# Бенчмарк отрисовки больших историй: с прореживанием до ширины графика и без него
+# Рисование выполняется в памяти (Agg), окно не нужно
+# Запуск: python benchmarks/bench_downsample.py [--sizes 1000 1000000] [--method minmax]
+import argparse                     # Для разбора аргументов командной строки
+import os                           # Для работы с путями
+import sys                          # Для добавления корня проекта в путь импорта
+import time                         # Для замера времени
+
+import numpy as np                  # Для генерации данных
+from matplotlib.backends.backend_agg import FigureCanvasAgg # Отрисовка без окна
+from matplotlib.figure import Figure # Для создания графиков
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from renderer import GraphRenderer  # noqa: E402
+
+
+# Функция создает рендерер таким же, как в приложении (фигура 8x4 дюйма, 100 dpi)
+def make_renderer(downsample):
+    figure = Figure(figsize=(8, 4), dpi=100)
+    canvas = FigureCanvasAgg(figure)
+    temp_plot = figure.add_subplot(211)
+    hum_plot = figure.add_subplot(212, sharex=temp_plot)
+    # Полная перерисовка каждого кадра - замеряем стоимость рисования самих линий
+    return GraphRenderer(figure, canvas, temp_plot, hum_plot, use_blit=False, downsample=downsample)
+
+
+# Функция генерирует историю: медленные колебания, шум и редкие выбросы
+def make_series(count):
+    rng = np.random.default_rng(42)
+    times = time.time() - count + np.arange(count, dtype=np.float64)
+    temps = (25 + 5 * np.sin(np.arange(count) / 5000) + rng.normal(0, 0.2, count)).astype(np.float32)
+    hums = (50 + 10 * np.cos(np.arange(count) / 7000) + rng.normal(0, 0.5, count)).astype(np.float32)
+    spikes = rng.integers(0, count, max(1, count // 100000))
+    temps[spikes] += 15  # Выбросы должны остаться видны после прореживания
+    return times, temps, hums
+
+
+# Функция замеряет среднее время кадра в миллисекундах
+def measure(renderer, series, frames):
+    renderer.render(series)  # Первый кадр: создание линий и размещение
+    start = time.perf_counter()
+    for frame in range(frames):
+        renderer.render(series, signature=frame)
+    return 1000 * (time.perf_counter() - start) / frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Downsampling render benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000],
+                        help="numbers of stored points")
+    parser.add_argument("--method", default="minmax", choices=["minmax", "lttb"])
+    parser.add_argument("--frames", type=int, default=5, help="frames per measurement")
+    args = parser.parse_args()
+
+    print(f"{'points':>9} {'drawn':>6} {'raw ms/frame':>13} {args.method + ' ms/frame':>16} {'spikes kept':>12}")
+    for count in args.sizes:
+        times, temps, hums = make_series(count)
+        series = [("esp32", times, temps, hums)]
+        raw = make_renderer(None)
+        reduced = make_renderer(args.method)
+        raw_ms = measure(raw, series, args.frames)
+        reduced_ms = measure(reduced, series, args.frames)
+        drawn_times, drawn_temps, _ = reduced.reduce_series(times, temps, hums)
+        spikes_kept = float(drawn_temps.max()) == float(temps.max())
+        print(f"{count:>9} {len(drawn_times):>6} {raw_ms:>13.1f} {reduced_ms:>16.1f} {str(spikes_kept):>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+# Сквозной бенчмарк под нагрузкой: брокер -> MQTT клиент -> конвейер -> буферы -> кадр графика
+# Встроенный брокер (fake_broker.py) рассылает сообщения DHT от N виртуальных ESP32,
+# приложение принимает их настоящим MQTT клиентом и ядром (core.py), а кадры графиков
+# рисуются в памяти (Agg) теми же вызовами, что и ESP32ControlApp._update_graphs.
+# Сеть и окно не нужны, поэтому бенчмарк можно запускать в CI: с --check он завершается
+# с кодом 1, если превышены пороги задержки, времени кадра или есть потерянные сообщения.
+# Запуск: python benchmarks/bench_end_to_end.py [--devices 100] [--rate 20] [--duration 5] [--check]
+import argparse                     # Для разбора аргументов командной строки
+import asyncio                      # Для клиента на asyncio (--client async)
+import json                         # Для сохранения результатов
+import os                           # Для работы с путями
+import sys                          # Для добавления корня проекта в путь импорта
+import tempfile                     # Временная база истории
+import threading                    # Для блокировки списка показанных измерений
+import time                         # Для замера времени
+
+import numpy as np                  # Для перцентилей
+from matplotlib.backends.backend_agg import FigureCanvasAgg # Отрисовка без окна
+from matplotlib.figure import Figure # Для создания графиков
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core import IngestCore         # noqa: E402
+from mqtt_client import MQTTClient, AsyncMQTTClient # noqa: E402
+from renderer import GraphRenderer  # noqa: E402
+from fake_broker import FakeBroker  # noqa: E402
+
+TOPIC_TEMPLATE = "esp32/node-{}/sensor/dht"  # Топик виртуального устройства
+FLEET_PATTERN = "esp32/+/sensor/dht"         # Шаблон подписки, "+" - ID устройства
+SLOTS = 1000                # Номер сообщения передается во влажности: 0.0 ... 99.9
+
+
+# Функция возвращает ячейку для номера сообщения (0 ... SLOTS-1)
+# Номера перемешиваются, чтобы значения сразу занимали весь диапазон оси и масштаб
+# графика не менялся от кадра к кадру (как у датчика, значения которого колеблются)
+def seq_slot(seq):
+    return (seq * 7919) % SLOTS  # 7919 - простое, взаимно простое с SLOTS
+
+
+# Функция формирует сообщение виртуального устройства
+# Влажность кодирует номер сообщения, чтобы сопоставить измерение с временем отправки
+def make_payload(device, seq):
+    return b'{"temperature": %.1f, "humidity": %.1f}' % (20 + device % 10, seq_slot(seq) / 10)
+
+
+# Класс для замера задержек: отправка -> буфер устройства -> кадр на экране
+class LatencyTracker:
+    def __init__(self, devices, shown):
+        self.index = {f"node-{i}": i for i in range(devices)}
+        self.sent_at = [[0.0] * SLOTS for _ in range(devices)]
+        self.shown = set(shown)
+        self.buffer_latency = []    # Отправка -> запись в буфер устройства, сек
+        self.screen_latency = []    # Запись в буфер -> конец кадра, в котором точка видна, сек
+        self._visible = []          # Время записи в буфер точек показанных устройств
+        self._lock = threading.Lock()
+
+    # Вызывается брокером сразу после отправки сообщения
+    def on_sent(self, device, seq):
+        self.sent_at[device][seq_slot(seq)] = time.perf_counter()
+
+    # Обработчик конвейера (рабочий поток): измерения уже записаны в буферы устройств
+    def on_readings(self, readings):
+        now = time.perf_counter()
+        visible = []
+        for device_id, _, _, humidity in readings:
+            device = self.index.get(device_id)
+            if device is None:
+                continue
+            self.buffer_latency.append(now - self.sent_at[device][round(humidity * 10)])
+            if device_id in self.shown:
+                visible.append(now)
+        if visible:
+            with self._lock:
+                self._visible.extend(visible)
+
+    # Вызывается после кадра: все точки, записанные до начала кадра, теперь на экране
+    def frame_done(self, frame_start, frame_end):
+        with self._lock:
+            ready = [t for t in self._visible if t <= frame_start]
+            self._visible = [t for t in self._visible if t > frame_start]
+        self.screen_latency.extend(frame_end - t for t in ready)
+
+
+# Класс, который рисует кадры так же, как ESP32ControlApp._update_graphs (вкладка DHT открыта)
+class FrameLoop:
+    def __init__(self, core, shown, refresh_ms, use_blit=True, downsample="minmax"):
+        self.core = core
+        self.shown = tuple(shown)
+        self.refresh = refresh_ms / 1000
+        figure = Figure(figsize=(8, 4), dpi=100)
+        canvas = FigureCanvasAgg(figure)
+        temp_plot = figure.add_subplot(211)
+        hum_plot = figure.add_subplot(212, sharex=temp_plot)
+        self.renderer = GraphRenderer(figure, canvas, temp_plot, hum_plot,
+                                      use_blit=use_blit, downsample=downsample)
+        self.frame_times = []       # Время кадров с перерисовкой только линий (blitting), сек
+        self.full_redraw_times = [] # Время кадров с полной перерисовкой (новые линии, новый масштаб), сек
+
+    # Метод рисует один кадр, возвращает (начало, конец)
+    def frame(self):
+        started = time.perf_counter()
+        full_redraws = self.renderer.full_redraws
+        self.core.pipeline.take_snapshot()
+        # Как в окне: без новых данных снимок не делается
+        if not self.renderer.is_current(self.core.fleet.signature(self.shown)):
+            snapshot = self.core.fleet.snapshot(self.shown, self.renderer.reduce_series)
+            series = [item[:4] for item in snapshot]
+            signature = tuple((item[0], item[4]) for item in snapshot)
+            self.renderer.render(series, signature)
+        finished = time.perf_counter()
+        if self.renderer.full_redraws != full_redraws:
+            self.full_redraw_times.append(finished - started)
+        else:
+            self.frame_times.append(finished - started)
+        return started, finished
+
+    # Метод рисует кадры с периодом refresh, пока done() не вернет True
+    def run(self, tracker, done):
+        while not done():
+            started, finished = self.frame()
+            tracker.frame_done(started, finished)
+            time.sleep(max(0.01, self.refresh - (finished - started)))
+
+
+# Функция возвращает перцентили в миллисекундах
+def percentiles(values):
+    if not values:
+        return {"p50": None, "p99": None, "max": None}
+    p50, p99, top = np.percentile(np.asarray(values) * 1000, [50, 99, 100])
+    return {"p50": round(float(p50), 2), "p99": round(float(p99), 2), "max": round(float(top), 2)}
+
+
+# Функция запускает MQTT клиента, возвращает функцию остановки
+def start_client(kind, port, core):
+    topics = [FLEET_PATTERN]
+    if kind == "async":
+        # Как в режиме --headless: цикл asyncio в своем потоке
+        client = AsyncMQTTClient("127.0.0.1", port, "", "", core.submit, topics=topics)
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_until_complete, args=(client.run(),), daemon=True)
+        thread.start()
+
+        def stop():
+            loop.call_soon_threadsafe(client.stop)
+            thread.join(5)
+        return client, stop
+    # Как в окне: сеть в фоновом потоке, on_message только кладет сообщение в очередь
+    client = MQTTClient("127.0.0.1", port, "", "",
+                        lambda c, userdata, msg: core.submit(msg.topic, msg.payload), topics=topics)
+    client.connect()
+    return client, client.disconnect
+
+
+# Функция выполняет один прогон и возвращает словарь с результатами
+def run_benchmark(args):
+    broker = FakeBroker()
+    port = broker.start()
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = None if args.no_history else os.path.join(directory, "history.db")
+        core = IngestCore([], [FLEET_PATTERN], db_path=db_path)
+        shown = [f"node-{i}" for i in range(min(args.shown, args.devices))]
+        tracker = LatencyTracker(args.devices, shown)
+        core.pipeline.add_sink(tracker.on_readings)  # После буферов устройств и истории
+        core.start()
+        client, stop_client = start_client(args.client, port, core)
+        # Ждем подписки клиента
+        deadline = time.monotonic() + 10
+        while broker.subscribers() == 0:
+            if time.monotonic() > deadline:
+                raise SystemExit("MQTT client did not subscribe to the fake broker")
+            time.sleep(0.01)
+
+        frames = FrameLoop(core, shown, args.refresh_ms)
+        started = time.perf_counter()
+        generator = broker.start_devices(args.devices, args.rate, args.duration, make_payload,
+                                         tracker.on_sent, TOPIC_TEMPLATE)
+        pipeline = core.pipeline
+
+        # Кадры рисуются, пока идет нагрузка и пока конвейер не разберет все сообщения
+        def done():
+            if not generator.done():
+                return False
+            handled = pipeline.processed + pipeline.failed + pipeline.dropped + pipeline.ignored
+            return handled >= generator.result() or time.perf_counter() - started > args.duration + 10
+        frames.run(tracker, done)
+        elapsed = time.perf_counter() - started
+        started_frame, finished_frame = frames.frame()  # Последний кадр с остатком данных
+        tracker.frame_done(started_frame, finished_frame)
+
+        stop_client()
+        core.stop()
+        broker.stop()
+        sent = generator.result()
+        return {
+            "client": args.client,
+            "devices": args.devices,
+            "target_rate": args.devices * args.rate,
+            "duration_s": round(elapsed, 2),
+            "sent": sent,
+            "received": pipeline.received,
+            "processed": pipeline.processed,
+            "dropped": pipeline.dropped + (sent - pipeline.received),
+            "failed": pipeline.failed,
+            "throughput": round(pipeline.processed / elapsed),
+            "publish_to_buffer_ms": percentiles(tracker.buffer_latency),
+            "buffer_to_screen_ms": percentiles(tracker.screen_latency),
+            "frame_ms": percentiles(frames.frame_times),
+            "full_redraw_ms": percentiles(frames.full_redraw_times),
+            "frames": len(frames.frame_times) + len(frames.full_redraw_times),
+            "full_redraws": len(frames.full_redraw_times),
+        }
+
+
+# Функция проверяет пороги, возвращает список нарушений
+def check(result, args):
+    problems = []
+    if result["dropped"] or result["failed"]:
+        problems.append(f"lost messages: dropped {result['dropped']}, failed {result['failed']}")
+    achieved = result["processed"] / max(result["sent"], 1)
+    if achieved < 0.999:
+        problems.append(f"processed only {achieved:.1%} of sent messages")
+    if result["publish_to_buffer_ms"]["p99"] > args.max_latency_ms:
+        problems.append(f"publish->buffer p99 {result['publish_to_buffer_ms']['p99']} ms > {args.max_latency_ms} ms")
+    if result["frame_ms"]["p99"] is not None and result["frame_ms"]["p99"] > args.max_frame_ms:
+        problems.append(f"frame p99 {result['frame_ms']['p99']} ms > {args.max_frame_ms} ms")
+    if result["full_redraws"] > args.max_full_redraws:
+        problems.append(f"{result['full_redraws']} full redraws > {args.max_full_redraws}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end MQTT ingest and render benchmark")
+    parser.add_argument("--devices", type=int, default=100, help="number of virtual ESP32 devices")
+    parser.add_argument("--rate", type=float, default=20, help="messages per second per device")
+    parser.add_argument("--duration", type=float, default=5, help="load duration, seconds")
+    parser.add_argument("--client", default="thread", choices=["thread", "async"],
+                        help="MQTT client: background thread (GUI) or asyncio (--headless)")
+    parser.add_argument("--shown", type=int, default=4, help="devices drawn on the graph")
+    parser.add_argument("--refresh-ms", type=int, default=200, help="graph refresh period")
+    parser.add_argument("--no-history", action="store_true", help="do not write the SQLite history")
+    parser.add_argument("--json", help="save the results to this file")
+    parser.add_argument("--check", action="store_true", help="exit with code 1 if thresholds are exceeded")
+    parser.add_argument("--max-latency-ms", type=float, default=100, help="p99 publish->buffer threshold")
+    parser.add_argument("--max-frame-ms", type=float, default=50, help="p99 blit frame time threshold")
+    parser.add_argument("--max-full-redraws", type=int, default=5, help="full redraw count threshold")
+    args = parser.parse_args()
+
+    result = run_benchmark(args)
+    print(f"client {result['client']}, {result['devices']} devices, "
+          f"target {result['target_rate']:.0f} msg/s for {args.duration:g} s")
+    print(f"sent {result['sent']}  received {result['received']}  processed {result['processed']}  "
+          f"dropped {result['dropped']}  failed {result['failed']}")
+    print(f"throughput        {result['throughput']} msg/s")
+    for name in ("publish_to_buffer_ms", "buffer_to_screen_ms", "frame_ms", "full_redraw_ms"):
+        values = result[name]
+        print(f"{name:<22} p50 {values['p50']:>8} ms  p99 {values['p99']:>8} ms  max {values['max']:>8} ms")
+    print(f"frames {result['frames']}  full redraws {result['full_redraws']}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.check:
+        problems = check(result, args)
+        for problem in problems:
+            print(f"FAIL: {problem}")
+        if problems:
+            sys.exit(1)
+        print("OK: all thresholds met")
+
+
+if __name__ == "__main__":
+    main()
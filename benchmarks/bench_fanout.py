@@ -0,0 +1,72 @@
+# Бенчмарк групповой рассылки команд RGB: FanOutPublisher -> MQTT клиент -> встроенный брокер
+# Одна команда (сериализуется один раз) рассылается в топики N устройств с разным размером
+# окна неподтвержденных сообщений и QoS. Окно 1 - отправка с ожиданием каждого подтверждения.
+# Выводит время передачи сообщений клиенту, время до последнего подтверждения и скорость.
+# Запуск: python benchmarks/bench_fanout.py [--targets 1000] [--windows 1,10,100,1000] [--qos 0,1]
+import argparse                     # Для разбора аргументов командной строки
+import json                         # Для содержимого команды и сохранения результатов
+import os                           # Для работы с путями
+import sys                          # Для добавления корня проекта в путь импорта
+import time                         # Для ожидания подключения
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mqtt_client import MQTTClient  # noqa: E402
+from fanout import FanOutPublisher  # noqa: E402
+from fake_broker import FakeBroker  # noqa: E402
+
+TOPIC_TEMPLATE = "esp32/node-{}/control/rgb"  # Топик команд виртуального устройства
+
+
+# Функция рассылает одну команду targets устройствам, возвращает итог задания
+def run_fanout(client, targets, window, qos):
+    client.set_max_inflight(max(window, 20))
+    fanout = FanOutPublisher(lambda topic, payload, q: client.publish(topic, payload, q, queue=False),
+                             window=window, qos=qos)
+    client.client.on_publish = lambda c, userdata, mid: fanout.on_ack(mid)
+    fanout.start()
+    payload = json.dumps({"red": 255, "green": 128, "blue": 0, "brightness": 200}).encode()
+    job = fanout.send([(f"node-{i}", TOPIC_TEMPLATE.format(i), payload) for i in range(targets)])
+    job.done.wait()
+    fanout.stop()
+    return job.summary()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Group RGB command fan-out benchmark")
+    parser.add_argument("--targets", type=int, default=1000, help="devices in the group")
+    parser.add_argument("--windows", default="1,10,100,1000", help="comma-separated in-flight windows")
+    parser.add_argument("--qos", default="0,1", help="comma-separated QoS levels")
+    parser.add_argument("--json", help="save results to a JSON file")
+    args = parser.parse_args()
+
+    broker = FakeBroker()
+    port = broker.start()
+    client = MQTTClient("127.0.0.1", port, "", "", lambda *a: None, topics=["bench/none"])
+    client.connect()
+    deadline = time.monotonic() + 5
+    while not client.connected and time.monotonic() < deadline:
+        time.sleep(0.01)
+    if not client.connected:
+        raise SystemExit("could not connect to the in-process broker")
+
+    results = []
+    print(f"{args.targets} targets")
+    print(f"{'qos':>3} {'window':>7} {'publish_ms':>11} {'total_ms':>9} {'msg/s':>10} {'acked':>6} {'failed':>7}")
+    for qos in (int(value) for value in args.qos.split(",")):
+        for window in (int(value) for value in args.windows.split(",")):
+            result = run_fanout(client, args.targets, window, qos)
+            result["window"] = window
+            results.append(result)
+            print(f"{qos:>3} {window:>7} {result['publish_s'] * 1000:>11.1f} {result['total_s'] * 1000:>9.1f} "
+                  f"{args.targets / result['total_s']:>10,.0f} {result['acked']:>6} "
+                  f"{result['failed'] + result['timeout']:>7}")
+    client.disconnect(wait=2.0)
+    broker.stop()
+    print(f"broker received {broker.published} messages")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
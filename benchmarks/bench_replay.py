@@ -0,0 +1,106 @@
+# Бенчмарк на записанном трафике: чтение записи -> конвейер -> буферы -> кадры графика
+# Запись (python main.py --record FILE) дает повторяемую нагрузку: одни и те же сообщения
+# в том же порядке и с теми же интервалами. Без --capture создается синтетическая запись.
+# Выводит скорость чтения файла (mmap), скорость приема через ядро, время разбора
+# и кадров графика, пиковый объем памяти процесса.
+# Запуск: python benchmarks/bench_replay.py [--capture FILE] [--speed max] [--messages 1000000]
+import argparse                     # Для разбора аргументов командной строки
+import json                         # Для синтетических сообщений
+import os                           # Для работы с путями
+import random                       # Для синтетических значений
+import sys                          # Для добавления корня проекта в путь импорта
+import tempfile                     # Временная запись
+import threading                    # Кадры графика рисуются параллельно с воспроизведением
+import time                         # Для замера времени
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core import IngestCore         # noqa: E402
+from headless import peak_memory_mb # noqa: E402
+from recording import Recorder, Replayer, iter_records, parse_speed, scan # noqa: E402
+from bench_end_to_end import FrameLoop, percentiles, TOPIC_TEMPLATE, FLEET_PATTERN # noqa: E402
+
+
+# Функция создает синтетическую запись: devices устройств, rate сообщений в секунду каждое
+def generate_capture(path, messages, devices, rate):
+    rng = random.Random(42)
+    recorder = Recorder(path)
+    recorder.open()
+    start = time.time() - messages / (devices * rate)
+    for i in range(messages):
+        payload = json.dumps({"temperature": round(rng.uniform(15, 35), 1),
+                              "humidity": round(rng.uniform(20, 80), 1)}).encode()
+        recorder.record(TOPIC_TEMPLATE.format(i % devices), payload, start + i / (devices * rate))
+    recorder.close()
+
+
+# Функция форматирует время в мс как остальные строки вывода; None (кадров не было) - "-"
+def format_ms(value):
+    return f"{'-':>8}" if value is None else f"{value:8.2f}"
+
+
+# Функция замеряет скорость чтения записи без обработки сообщений
+def measure_read(path):
+    started = time.perf_counter()
+    count = 0
+    for _ in iter_records(path):
+        count += 1
+    return count, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded MQTT capture through the ingest pipeline")
+    parser.add_argument("--capture", help="recording made with main.py --record (default: synthetic)")
+    parser.add_argument("--messages", type=int, default=1000000, help="messages in the synthetic capture")
+    parser.add_argument("--devices", type=int, default=100, help="devices in the synthetic capture")
+    parser.add_argument("--rate", type=float, default=10, help="messages per second per synthetic device")
+    parser.add_argument("--speed", type=parse_speed, default=0, help="replay speed: 1, 100 or max (default)")
+    parser.add_argument("--shown", type=int, default=10, help="devices drawn on the graph")
+    parser.add_argument("--refresh-ms", type=int, default=200, help="graph refresh period, ms")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = args.capture
+        if path is None:
+            path = os.path.join(directory, "capture.rec")
+            started = time.perf_counter()
+            generate_capture(path, args.messages, args.devices, args.rate)
+            print(f"synthetic capture: {args.messages} messages written in {time.perf_counter() - started:.1f} s")
+        info = scan(path)
+        span = (info["last"] - info["first"]) if info["messages"] else 0.0
+        print(f"{path}: {info['size'] / 1e6:.1f} MB, {info['messages']} messages, "
+              f"{len(info['topics'])} topics, {span:.0f} s of traffic")
+
+        count, elapsed = measure_read(path)
+        print(f"read (mmap)     {count / elapsed:>12,.0f} msg/s  {info['size'] / 1e6 / elapsed:8.0f} MB/s")
+
+        core = IngestCore([], [FLEET_PATTERN])
+        core.start()
+        replayer = Replayer(path, core.submit, args.speed, keep_time=False,
+                            backlog=lambda: core.pipeline.queued, max_backlog=core.pipeline.maxsize // 2)
+        shown = [f"node-{i}" for i in range(args.shown)]
+        frames = FrameLoop(core, shown, args.refresh_ms)
+        started = time.perf_counter()
+        thread = threading.Thread(target=replayer.run, daemon=True)
+        thread.start()
+        while thread.is_alive():
+            frame_started, frame_finished = frames.frame()
+            time.sleep(max(0.01, frames.refresh - (frame_finished - frame_started)))
+        core.stop()
+        elapsed = time.perf_counter() - started
+
+    stats = core.stats()
+    parse = core.pipeline.parse_time
+    print(f"replay ({'max' if not args.speed else f'x{args.speed:g}'})  {replayer.replayed / elapsed:>12,.0f} msg/s  "
+          f"processed {stats['processed']}  failed {stats['failed']}  dropped {stats['dropped']}")
+    print(f"parse           p50 {parse.quantile(0.5) * 1e6:8.2f} us  p99 {parse.quantile(0.99) * 1e6:8.2f} us")
+    frame_ms = percentiles(frames.frame_times)
+    full_ms = percentiles(frames.full_redraw_times)
+    print(f"frame_ms        p50 {format_ms(frame_ms['p50'])} ms  p99 {format_ms(frame_ms['p99'])} ms  "
+          f"(full redraws {len(frames.full_redraw_times)}, p50 {format_ms(full_ms['p50'])} ms)")
+    memory = peak_memory_mb()
+    if memory is not None:
+        print(f"peak memory     {memory:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
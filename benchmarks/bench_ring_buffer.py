@@ -0,0 +1,79 @@
+# Микро-бенчмарк: списки со срезами (старый on_message) против RingBuffer
+# Запуск: python benchmarks/bench_ring_buffer.py [--rate 10000] [--seconds 1]
+import argparse                     # Для разбора аргументов командной строки
+import os                           # Для работы с путями
+import sys                          # Для добавления корня проекта в путь импорта
+import time                         # Для замера времени
+
+import numpy as np                  # Типы данных для массивов
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ring_buffer import RingBuffer  # noqa: E402
+
+
+# Старый вариант: три списка и пересоздание срезом после переполнения
+# Списки заранее заполнены до max_points - замеряем установившийся режим
+def run_lists(readings, max_points):
+    temp_data, hum_data, time_data = [20.0] * max_points, [40.0] * max_points, ["00:00:00"] * max_points
+    for temperature, humidity, timestamp in readings:
+        temp_data.append(temperature)
+        hum_data.append(humidity)
+        time_data.append(time.strftime("%H:%M:%S", time.localtime(timestamp)))
+        if len(temp_data) > max_points:
+            temp_data = temp_data[-max_points:]
+            hum_data = hum_data[-max_points:]
+            time_data = time_data[-max_points:]
+    # Копия с округлением, как в старом _update_graphs
+    return [round(t, 1) for t in temp_data], [round(h, 1) for h in hum_data]
+
+
+# Новый вариант: три кольцевых буфера и срезы без копирования
+def run_ring(readings, max_points):
+    temp_data = RingBuffer(max_points, np.float32)
+    hum_data = RingBuffer(max_points, np.float32)
+    time_data = RingBuffer(max_points, np.float64)
+    for buffer in (temp_data, hum_data, time_data):
+        buffer.extend(np.zeros(max_points))
+    for temperature, humidity, timestamp in readings:
+        temp_data.append(temperature)
+        hum_data.append(humidity)
+        time_data.append(timestamp)
+    return temp_data.view(), hum_data.view()
+
+
+# Функция замеряет время обработки всех сообщений (вместе с заполнением буферов)
+def measure(func, readings, max_points):
+    start = time.perf_counter()
+    func(readings, max_points)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ring buffer vs list slicing benchmark")
+    parser.add_argument("--rate", type=int, default=10000, help="messages per second")
+    parser.add_argument("--seconds", type=float, default=1.0, help="simulated duration")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 1000, 10000, 100000],
+                        help="max_points values to test")
+    args = parser.parse_args()
+
+    count = int(args.rate * args.seconds)
+    now = time.time()
+    # Синтетический поток: сообщения равномерно с заданной частотой
+    readings = [(20.0 + (i % 100) * 0.1, 40.0 + (i % 50) * 0.2, now + i / args.rate)
+                for i in range(count)]
+
+    print(f"{count} messages ({args.rate} msg/s for {args.seconds:g} s)")
+    print(f"{'max_points':>10} {'lists us/msg':>13} {'ring us/msg':>12} {'speedup':>8} "
+          f"{'lists CPU %':>12} {'ring CPU %':>11}")
+    for max_points in args.sizes:
+        lists_time = measure(run_lists, readings, max_points)
+        ring_time = measure(run_ring, readings, max_points)
+        # Доля одного ядра, которую займет обработка потока в реальном времени
+        lists_cpu = 100.0 * lists_time / args.seconds
+        ring_cpu = 100.0 * ring_time / args.seconds
+        print(f"{max_points:>10} {1e6 * lists_time / count:>13.2f} {1e6 * ring_time / count:>12.2f} "
+              f"{lists_time / ring_time:>7.1f}x {lists_cpu:>11.1f}% {ring_cpu:>10.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# Бенчмарк холодного запуска: время импорта модулей (python -X importtime) и появления окна
+# Каждый замер - отдельный процесс Python, поэтому модули каждый раз импортируются заново.
+# Выводит время импорта main (медиана нескольких запусков) с разбивкой по пакетам, а если
+# есть дисплей - время до появления окна, до запуска клиента MQTT и до создания графиков
+# при быстром запуске (FAST_STARTUP = True) и при создании всего сразу.
+# Запуск: python benchmarks/bench_startup.py [--module main] [--repeat 5] [--check --max-import-ms 300]
+import argparse                     # Для разбора аргументов командной строки
+import json                         # Результаты замера окна и сохранение результатов
+import os                           # Для работы с путями
+import socket                       # Свободный порт: клиент MQTT подключается к закрытому порту
+import statistics                   # Медиана запусков
+import subprocess                   # Каждый замер - отдельный процесс
+import sys                          # Путь к интерпретатору
+import time                         # Время запуска интерпретатора
+from collections import defaultdict # Время импорта по пакетам
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Корень проекта
+
+# Программа замера окна: время от начала импорта main до появления окна, до запуска
+# клиента MQTT и до создания графиков на вкладке DHT Data (аргументы: режим и порт брокера)
+WINDOW_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+if main.tk is None:
+    raise SystemExit("tkinter is not available")
+main.FAST_STARTUP = sys.argv[1] == "fast"
+main.MQTT_BROKER, main.MQTT_PORT = "127.0.0.1", int(sys.argv[2])
+root = main.tk.Tk()
+app = main.ESP32ControlApp(root, db_path=None)
+shown = time.perf_counter()
+while not app.services_started:
+    root.update()
+ready = time.perf_counter()
+app.tab_control.select(app.tab_dht)
+root.update()
+graphs = time.perf_counter()
+app.on_closing()
+print(json.dumps({"import_ms": (imported - started) * 1000, "window_ms": (shown - started) * 1000,
+                  "ready_ms": (ready - started) * 1000, "graphs_ms": (graphs - started) * 1000}))
+"""
+
+
+# Функция разбирает вывод -X importtime: (общее время импорта module в мкс, {пакет: собственное время})
+def parse_importtime(stderr, module):
+    total = None
+    packages = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # Заголовок таблицы
+        own, cumulative, name = int(fields[0]), int(fields[1]), fields[2]
+        packages[name.strip().split(".")[0]] += own
+        if name.strip() == module and not name.startswith("  "):
+            total = cumulative
+    return total, packages
+
+
+# Функция импортирует module в новом процессе и возвращает результат parse_importtime
+def import_profile(module):
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                             cwd=ROOT, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{process.stderr[-2000:]}")
+    return parse_importtime(process.stderr, module)
+
+
+# Функция возвращает время запуска и завершения пустого интерпретатора, мс
+def interpreter_ms(repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+# Функция замеряет запуск окна в режиме mode ("fast" или "full"), возвращает словарь или текст ошибки
+def window_profile(mode, repeat):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]  # После закрытия порт свободен - подключение сразу получит отказ
+    runs = []
+    for _ in range(repeat):
+        process = subprocess.run([sys.executable, "-c", WINDOW_SCRIPT, mode, str(port)],
+                                 cwd=ROOT, capture_output=True, text=True)
+        if process.returncode != 0:
+            return (process.stderr.strip().splitlines() or ["unknown error"])[-1]
+        runs.append(json.loads(process.stdout.strip().splitlines()[-1]))
+    return {name: round(statistics.median(run[name] for run in runs), 1) for name in runs[0]}
+
+
+# Функция проверяет пороги, возвращает список нарушений
+def check(result, args):
+    problems = []
+    if result["import_ms"] > args.max_import_ms:
+        problems.append(f"import {args.module} {result['import_ms']} ms > {args.max_import_ms} ms")
+    fast = result["window"].get("fast")
+    if isinstance(fast, dict) and fast["window_ms"] > args.max_window_ms:
+        problems.append(f"window shown after {fast['window_ms']} ms > {args.max_window_ms} ms")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start benchmark: import times and time to window")
+    parser.add_argument("--module", default="main", help="module to import (default: main)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement (median is shown)")
+    parser.add_argument("--top", type=int, default=12, help="packages shown in the import breakdown")
+    parser.add_argument("--no-window", action="store_true", help="measure imports only")
+    parser.add_argument("--json", help="save the results to this file")
+    parser.add_argument("--check", action="store_true", help="exit with code 1 if thresholds are exceeded")
+    parser.add_argument("--max-import-ms", type=float, default=300, help="import time threshold")
+    parser.add_argument("--max-window-ms", type=float, default=500, help="time to window threshold (fast startup)")
+    args = parser.parse_args()
+
+    # Запуск с медианным временем импорта дает разбивку по пакетам
+    runs = sorted((import_profile(args.module) for _ in range(args.repeat)), key=lambda run: run[0])
+    total, packages = runs[len(runs) // 2]
+    result = {
+        "module": args.module,
+        "interpreter_ms": round(interpreter_ms(args.repeat), 1),
+        "import_ms": round(total / 1000, 1),
+        "packages_ms": {name: round(own / 1000, 1)
+                        for name, own in sorted(packages.items(), key=lambda item: -item[1])},
+        "window": {},
+    }
+    print(f"interpreter start  {result['interpreter_ms']:>8.1f} ms")
+    print(f"import {args.module:<11} {result['import_ms']:>8.1f} ms  (median of {args.repeat}, -X importtime)")
+    for name, own in list(result["packages_ms"].items())[:args.top]:
+        print(f"  {name:<16} {own:>8.1f} ms")
+
+    if not args.no_window and args.module == "main":
+        for mode in ("fast", "full"):
+            profile = result["window"][mode] = window_profile(mode, args.repeat)
+            if isinstance(profile, str):
+                print(f"{mode} startup: skipped ({profile})")
+                break
+            print(f"{mode} startup: window {profile['window_ms']:.0f} ms, MQTT client started "
+                  f"{profile['ready_ms']:.0f} ms, DHT graphs {profile['graphs_ms']:.0f} ms")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.check:
+        problems = check(result, args)
+        for problem in problems:
+            print(f"FAIL: {problem}")
+        if problems:
+            sys.exit(1)
+        print("OK: all thresholds met")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+# Встроенный MQTT брокер для бенчмарков (без сети: только 127.0.0.1 внутри процесса)
+# Поддерживает минимум MQTT 5, нужный клиенту paho: CONNECT, SUBSCRIBE (шаблоны + и #),
+# PUBLISH с QoS 0/1, PINGREQ и DISCONNECT. Работает в фоновом потоке со своим циклом asyncio.
+# Генератор нагрузки (start_devices) рассылает подписчикам сообщения так, как если бы
+# их опубликовали N устройств ESP32 с заданной частотой.
+import asyncio                      # Цикл событий брокера
+import struct                       # Для упаковки полей пакетов MQTT
+import threading                    # Брокер работает в отдельном потоке
+import time                         # Для расписания генератора нагрузки
+
+TICK = 0.005                # Период генератора нагрузки, сек
+
+
+# Функция кодирует длину пакета MQTT (variable byte integer)
+def encode_length(value):
+    out = bytearray()
+    while True:
+        byte, value = value % 128, value // 128
+        out.append(byte | (0x80 if value else 0))
+        if not value:
+            return bytes(out)
+
+
+# Функция разбирает variable byte integer, возвращает (значение, следующая позиция)
+def decode_length(data, pos):
+    value, multiplier = 0, 1
+    while True:
+        byte = data[pos]
+        pos += 1
+        value += (byte & 0x7F) * multiplier
+        multiplier *= 128
+        if not byte & 0x80:
+            return value, pos
+
+
+# Функция проверяет, подходит ли топик под шаблон подписки
+def topic_matches(pattern, topic):
+    pattern_parts = pattern.split("/")
+    topic_parts = topic.split("/")
+    for i, part in enumerate(pattern_parts):
+        if part == "#":
+            return True
+        if i >= len(topic_parts) or (part != "+" and part != topic_parts[i]):
+            return False
+    return len(pattern_parts) == len(topic_parts)
+
+
+# Функция собирает пакет PUBLISH с QoS 0 (MQTT 5, без свойств)
+def publish_packet(topic, payload):
+    topic = topic.encode()
+    body = struct.pack("!H", len(topic)) + topic + b"\x00" + payload
+    return b"\x30" + encode_length(len(body)) + body
+
+
+# Класс встроенного брокера
+class FakeBroker:
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port            # 0 - свободный порт выбирается при запуске
+        self.published = 0          # Сообщений, опубликованных клиентами
+        self.delivered = 0          # Сообщений, отправленных подписчикам
+        self.received = []          # Последние сообщения от клиентов (topic, payload, qos)
+        self._subscriptions = {}    # writer -> список шаблонов подписки
+        self._loop = None
+        self._server = None
+        self._thread = None
+
+    # Метод запускает брокер в фоновом потоке и возвращает номер порта
+    def start(self):
+        ready = threading.Event()
+        self._loop = asyncio.new_event_loop()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port))
+            self.port = self._server.sockets[0].getsockname()[1]
+            ready.set()
+            self._loop.run_forever()
+            # Завершаем обработчики соединений, чтобы они не остались висеть при закрытии цикла
+            tasks = asyncio.all_tasks(self._loop)
+            for task in tasks:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="fake-broker", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self.port
+
+    # Метод останавливает брокер и закрывает соединения
+    def stop(self):
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._shutdown)
+        self._thread.join(5)
+        self._loop = None
+
+    def _shutdown(self):
+        self._server.close()
+        for writer in list(self._subscriptions):
+            writer.close()
+        self._loop.stop()
+
+    # Метод разрывает все соединения (проверка переподключения клиентов)
+    def drop_connections(self):
+        self._loop.call_soon_threadsafe(
+            lambda: [writer.close() for writer in list(self._subscriptions)])
+
+    # Метод возвращает количество подключенных клиентов с подписками
+    def subscribers(self):
+        return sum(1 for patterns in list(self._subscriptions.values()) if patterns)
+
+    # Метод запускает генератор нагрузки: devices устройств по rate сообщений в секунду каждое
+    # make_payload(device_index, seq) - содержимое сообщения, on_sent(device_index, seq) -
+    # вызывается непосредственно перед отправкой (в потоке брокера).
+    # Возвращает concurrent.futures.Future с количеством отправленных сообщений.
+    def start_devices(self, devices, rate, duration, make_payload, on_sent=None,
+                      topic_template="esp32/node-{}/sensor/dht"):
+        return asyncio.run_coroutine_threadsafe(
+            self._generate(devices, rate, duration, make_payload, on_sent, topic_template), self._loop)
+
+    async def _generate(self, devices, rate, duration, make_payload, on_sent, topic_template):
+        topics = [topic_template.format(i) for i in range(devices)]
+        seqs = [0] * devices
+        total_rate = devices * rate
+        sent = 0
+        device = 0
+        start = time.perf_counter()
+        while True:
+            elapsed = time.perf_counter() - start
+            due = int(min(elapsed, duration) * total_rate)
+            # Сообщения, которые по расписанию уже должны были уйти, отправляем пачкой
+            while sent < due:
+                payload = make_payload(device, seqs[device])
+                if on_sent is not None:
+                    on_sent(device, seqs[device])  # До отправки: клиент может разобрать сообщение сразу
+                self._deliver(topics[device], payload)
+                seqs[device] += 1
+                sent += 1
+                device = (device + 1) % devices
+            for writer in list(self._subscriptions):
+                try:
+                    await writer.drain()  # Медленный клиент замедляет генератор, как настоящий брокер
+                except ConnectionError:
+                    pass
+            if elapsed >= duration:
+                return sent
+            await asyncio.sleep(TICK)
+
+    # Метод отправляет сообщение всем подписчикам с подходящим шаблоном
+    def _deliver(self, topic, payload):
+        packet = None
+        for writer, patterns in self._subscriptions.items():
+            if any(topic_matches(pattern, topic) for pattern in patterns):
+                if packet is None:
+                    packet = publish_packet(topic, payload)
+                writer.write(packet)
+                self.delivered += 1
+
+    # Функция читает один пакет MQTT, возвращает (первый байт, тело пакета)
+    @staticmethod
+    async def _read_packet(reader):
+        header = (await reader.readexactly(1))[0]
+        length, multiplier = 0, 1
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length += (byte & 0x7F) * multiplier
+            multiplier *= 128
+            if not byte & 0x80:
+                break
+        return header, await reader.readexactly(length)
+
+    # Обработка одного подключения клиента
+    async def _handle(self, reader, writer):
+        patterns = []
+        self._subscriptions[writer] = patterns
+        try:
+            while True:
+                header, body = await self._read_packet(reader)
+                packet_type = header >> 4
+                if packet_type == 1:      # CONNECT -> CONNACK (успех, без свойств)
+                    writer.write(b"\x20\x03\x00\x00\x00")
+                elif packet_type == 8:    # SUBSCRIBE -> SUBACK
+                    packet_id = body[:2]
+                    properties, pos = decode_length(body, 2)
+                    pos += properties
+                    codes = bytearray()
+                    while pos < len(body):
+                        size = struct.unpack_from("!H", body, pos)[0]
+                        patterns.append(body[pos + 2:pos + 2 + size].decode())
+                        codes.append(body[pos + 2 + size] & 0x03)  # Выданный QoS
+                        pos += 3 + size
+                    answer = packet_id + b"\x00" + bytes(codes)
+                    writer.write(b"\x90" + encode_length(len(answer)) + answer)
+                elif packet_type == 3:    # PUBLISH -> PUBACK для QoS 1, пересылка подписчикам
+                    qos = (header >> 1) & 0x03
+                    size = struct.unpack_from("!H", body)[0]
+                    topic = body[2:2 + size].decode()
+                    pos = 2 + size
+                    if qos:
+                        packet_id = body[pos:pos + 2]
+                        pos += 2
+                    properties, pos = decode_length(body, pos)
+                    payload = body[pos + properties:]
+                    self.published += 1
+                    self.received.append((topic, payload, qos))
+                    del self.received[:-1000]
+                    if qos:
+                        writer.write(b"\x40\x02" + packet_id)
+                    self._deliver(topic, payload)
+                elif packet_type == 12:   # PINGREQ -> PINGRESP
+                    writer.write(b"\xd0\x00")
+                elif packet_type == 14:   # DISCONNECT
+                    break
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass  # Клиент отключился или брокер останавливается
+        finally:
+            self._subscriptions.pop(writer, None)
+            writer.close()
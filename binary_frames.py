@@ -0,0 +1,49 @@
+# Модуль компактного двоичного формата сообщений (альтернатива JSON)
+# Формат кадра (little-endian):
+#   байт 0    - признак двоичного кадра FRAME_MAGIC (JSON всегда начинается с "{" или пробела)
+#   байт 1    - тип кадра (FRAME_DHT или FRAME_RGB)
+#   DHT: int16 температура * 10, uint16 влажность * 10       - всего 6 байт
+#   RGB: uint8 red, uint8 green, uint8 blue, uint8 brightness - всего 6 байт
+import struct                       # Для упаковки и распаковки двоичных данных
+
+FRAME_MAGIC = 0xA5          # Первый байт двоичного кадра
+FRAME_DHT = 0x01            # Кадр с измерением DHT сенсора
+FRAME_RGB = 0x02            # Кадр с командой для RGB светодиода
+FORMAT_JSON = "json"        # Имена форматов сообщений
+FORMAT_BINARY = "binary"
+MAGIC_BYTE = bytes((FRAME_MAGIC,))  # Первый байт кадра для сравнения со срезом сообщения
+
+DHT_FRAME = struct.Struct("<BBhH")  # magic, тип, температура*10, влажность*10
+RGB_FRAME = struct.Struct("<BBBBBB")  # magic, тип, red, green, blue, brightness
+SCALE = 10.0                # Значения передаются с точностью 0.1
+
+
+# Ошибка разбора двоичного кадра
+class FrameError(ValueError):
+    pass
+
+
+# Функция определяет формат сообщения по первому байту
+def payload_format(payload):
+    return FORMAT_BINARY if payload[:1] == MAGIC_BYTE else FORMAT_JSON
+
+
+# Функция упаковывает измерение DHT в двоичный кадр
+def encode_dht_frame(temperature, humidity):
+    return DHT_FRAME.pack(FRAME_MAGIC, FRAME_DHT, round(temperature * SCALE), round(humidity * SCALE))
+
+
+# Функция распаковывает двоичный кадр DHT прямо из байтов (без промежуточной строки)
+# Возвращает кортеж (температура, влажность)
+def decode_dht_frame(payload):
+    if len(payload) < DHT_FRAME.size:
+        raise FrameError(f"DHT frame too short: {len(payload)} bytes")
+    magic, frame_type, temperature, humidity = DHT_FRAME.unpack_from(payload)
+    if magic != FRAME_MAGIC or frame_type != FRAME_DHT:
+        raise FrameError(f"not a DHT frame: {magic:#04x} {frame_type:#04x}")
+    return temperature / SCALE, humidity / SCALE
+
+
+# Функция упаковывает команду RGB в двоичный кадр
+def encode_rgb_frame(red, green, blue, brightness):
+    return RGB_FRAME.pack(FRAME_MAGIC, FRAME_RGB, red, green, blue, brightness)
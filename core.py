@@ -0,0 +1,150 @@
+# Модуль ядра приема данных, общего для окна (main.py) и режима без интерфейса (headless.py)
+# Ядро связывает конвейер приема (разбор и проверка сообщений), буферы устройств
+# в памяти и историю на диске. Откуда приходят сообщения (поток paho или цикл asyncio)
+# и кто их показывает, ядру не важно: сообщения передаются в submit(topic, payload).
+from fleet import Fleet, DEFAULT_DEVICE_ID, device_id_from_topic # Хранение данных от множества устройств
+from ingest import IngestPipeline, QUEUE_SIZE, BATCH_SIZE, DROP_OLDEST # Конвейер приема сообщений
+from decoders import get_decoder    # Быстрый разбор сообщений DHT (msgspec/orjson/json)
+from storage import HistoryStore    # История измерений на диске (SQLite)
+from metrics import MetricsRegistry # Метрики для панели диагностики и экспорта
+from recording import Recorder, RecordingError # Запись сырого трафика MQTT в файл
+
+
+# Класс ядра приема данных
+class IngestCore:
+    # Конструктор класса
+    # legacy_topics - топики одного ESP32 без ID (данные записываются как DEFAULT_DEVICE_ID)
+    # fleet_patterns - шаблоны топиков парка устройств, "+" - ID устройства
+    # db_path - файл истории SQLite (None - не сохранять историю)
+    # record_path - файл записи сырого трафика для воспроизведения (None - не записывать)
+    # analytics - потоковая аналитика и оповещения (StreamAnalytics или None)
+    def __init__(self, legacy_topics, fleet_patterns, maxsize=QUEUE_SIZE, batch_size=BATCH_SIZE,
+                 policy=DROP_OLDEST, decoder="auto", db_path=None, record_path=None, analytics=None):
+        self.legacy_topics = frozenset(legacy_topics)
+        self.fleet_patterns = list(fleet_patterns)
+        # Хранилище данных для графиков - отдельный буфер для каждого устройства
+        self.fleet = Fleet()
+        # Конвейер приема: поток MQTT только кладет сообщения в очередь,
+        # рабочий поток разбирает их пачками и записывает в буферы устройств
+        self.pipeline = IngestPipeline(self.resolve_device, maxsize, batch_size, policy,
+                                       decoder=get_decoder(decoder))
+        self.pipeline.add_sink(self.fleet.add_readings)
+        # Скользящая статистика и оповещения считаются по той же пачке, что и буферы графиков
+        self.analytics = analytics
+        if analytics is not None:
+            self.pipeline.add_sink(analytics.add_readings)
+        self.store = None
+        # Запись трафика: все сообщения до разбора, включая некорректные и выброшенные очередью
+        self.recorder = None
+        if record_path:
+            try:
+                self.recorder = Recorder(record_path)
+                self.recorder.open()
+                print(f"Recording MQTT traffic to {record_path}")
+            except (OSError, RecordingError) as e:
+                print(f"Recording disabled: {e}")
+                self.recorder = None
+        # Метрики ядра читаются из счетчиков компонентов только при экспорте
+        self.metrics = MetricsRegistry()
+        self.register_metrics(self.metrics)
+        if db_path:
+            self.open_store(db_path)
+
+    # Метод открывает историю на диске: подгружает последние измерения, новые пишутся в фоне
+    # Вызывается до start()
+    def open_store(self, db_path):
+        store = self.load_store(db_path)
+        if store is not None:
+            self.attach_store(store)
+
+    # Метод открывает базу и подгружает последние измерения в буферы устройств
+    # На большой базе это секунды, поэтому окно вызывает его в фоновом потоке
+    # Результат: хранилище или None, если история недоступна
+    def load_store(self, db_path):
+        try:
+            store = HistoryStore(db_path)
+            self.fleet.add_readings(store.load_recent(self.fleet.max_points))
+        except Exception as e:
+            print(f"History storage disabled: {e}")
+            return None
+        return store
+
+    # Метод подключает хранилище к конвейеру: новые измерения пишутся в фоне (вызывается до start())
+    def attach_store(self, store):
+        self.store = store
+        self.pipeline.add_sink(store.add_readings)
+        self.metrics.counter("history_written_total", "Readings written to SQLite", lambda: store.written)
+        self.metrics.counter("history_dropped_total", "Readings not queued for SQLite", lambda: store.dropped)
+
+    # Функция определяет ID устройства по топику (None - топик не от сенсора)
+    def resolve_device(self, topic):
+        if topic in self.legacy_topics:
+            return DEFAULT_DEVICE_ID  # Старый топик одного ESP32 без ID
+        for pattern in self.fleet_patterns:
+            device_id = device_id_from_topic(topic, pattern)
+            if device_id is not None:
+                return device_id
+        return None
+
+    # Метод регистрирует метрики конвейера, аналитики и записи трафика
+    def register_metrics(self, metrics):
+        pipeline = self.pipeline
+        metrics.counter("messages_received_total", "Messages received from MQTT", lambda: pipeline.received)
+        metrics.counter("messages_processed_total", "Readings parsed and stored", lambda: pipeline.processed)
+        metrics.counter("messages_failed_total", "Messages rejected as invalid", lambda: pipeline.failed)
+        metrics.counter("messages_ignored_total", "Messages from non-sensor topics", lambda: pipeline.ignored)
+        metrics.counter("messages_rejected_total", "Readings not added to the live fleet (device limit reached)",
+                        lambda: pipeline.rejected)
+        metrics.counter("messages_dropped_total", "Messages dropped on queue overflow", lambda: pipeline.dropped)
+        metrics.gauge("ingest_queue_depth", "Messages waiting in the ingest queue", lambda: pipeline.queued)
+        metrics.gauge("devices", "Devices with data in memory", lambda: len(self.fleet.device_ids()))
+        metrics.histogram("parse_seconds", "Time to decode one message (sampled)", pipeline.parse_time)
+        metrics.histogram("batch_seconds", "Time to process one ingest batch", pipeline.batch_time)
+        metrics.histogram("ingest_latency_seconds", "Queued to buffer latency (sampled)", pipeline.latency)
+        if self.analytics is not None:
+            analytics = self.analytics
+            metrics.counter("alerts_raised_total", "Alerts raised", lambda: analytics.raised)
+            metrics.counter("alerts_cleared_total", "Alerts cleared", lambda: analytics.cleared)
+            metrics.gauge("alerts_active", "Alerts currently raised", analytics.active_count)
+        if self.recorder is not None:
+            recorder = self.recorder
+            metrics.counter("recorded_total", "Messages written to the recording", lambda: recorder.recorded)
+
+    # Метод регистрирует метрики MQTT клиента (потокового или asyncio)
+    def register_client_metrics(self, client):
+        self.metrics.gauge("mqtt_connected", "1 if connected to the broker", lambda: client.connected)
+        self.metrics.counter("mqtt_connections_total", "Successful connections to the broker",
+                             lambda: client.connections)
+
+    # Метод принимает сырое сообщение (вызывается в потоке или цикле MQTT, при воспроизведении -
+    # в потоке воспроизведения с исходным временем приема received_at)
+    def submit(self, topic, payload, received_at=None):
+        if self.recorder is not None:
+            self.recorder.record(topic, payload, received_at)
+        return self.pipeline.submit(topic, payload, received_at)
+
+    # Метод запускает рабочие потоки конвейера и записи истории
+    def start(self):
+        if self.store is not None:
+            self.store.start()
+        self.pipeline.start()
+
+    # Метод останавливает рабочий поток конвейера, затем записывает остаток истории
+    def stop(self):
+        self.pipeline.stop()
+        if self.store is not None:
+            self.store.stop()
+        if self.recorder is not None:
+            self.recorder.close()
+
+    # Метод возвращает словарь со значениями счетчиков
+    def stats(self):
+        stats = self.pipeline.stats()
+        stats["devices"] = len(self.fleet.device_ids())
+        if self.store is not None:
+            stats["written"] = self.store.written
+        if self.recorder is not None:
+            stats["recorded"] = self.recorder.recorded
+        if self.analytics is not None:
+            stats["alerts"] = self.analytics.active_count()
+        return stats
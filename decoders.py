@@ -0,0 +1,172 @@
+# Модуль для разбора сообщений DHT сенсора
+# Сообщение разбирается прямо из байтов (без промежуточной строки) самой быстрой
+# доступной библиотекой: msgspec, затем orjson, затем стандартный json.
+# Двоичные кадры (binary_frames.py) распознаются по первому байту в каждом сообщении
+# (AutoDecoder - единственное место, где определяется формат сообщения).
+# Некорректные измерения отклоняются с ошибкой DecodeError, а не заменяются нулями.
+import json                         # Стандартный JSON - используется, если быстрых библиотек нет
+import math                         # Для проверки на NaN и бесконечность
+from collections import namedtuple  # Структура измерения, если msgspec не установлен
+from binary_frames import FORMAT_BINARY, FORMAT_JSON, FrameError, decode_dht_frame, payload_format # Двоичный формат кадров
+
+# Необязательные быстрые библиотеки
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Допустимые диапазоны значений датчика DHT22
+TEMPERATURE_MIN = -40.0
+TEMPERATURE_MAX = 80.0
+HUMIDITY_MIN = 0.0
+HUMIDITY_MAX = 100.0
+
+
+# Ошибка разбора или проверки сообщения
+class DecodeError(ValueError):
+    pass
+
+
+# Структура одного измерения DHT сенсора
+if msgspec is not None:
+    from typing import Annotated
+
+    # msgspec проверяет типы и диапазоны прямо при разборе JSON
+    class DHTReading(msgspec.Struct, frozen=True):
+        temperature: Annotated[float, msgspec.Meta(ge=TEMPERATURE_MIN, le=TEMPERATURE_MAX)]
+        humidity: Annotated[float, msgspec.Meta(ge=HUMIDITY_MIN, le=HUMIDITY_MAX)]
+else:
+    DHTReading = namedtuple("DHTReading", ["temperature", "humidity"])
+
+
+# Функция проверяет одно поле измерения и возвращает его как float
+def _check_field(data, name, low, high):
+    try:
+        value = data[name]
+    except KeyError:
+        raise DecodeError(f"missing field '{name}'") from None
+    except TypeError:
+        raise DecodeError("payload is not a JSON object") from None
+    # bool - подкласс int, но как значение датчика не подходит
+    if type(value) is not float and type(value) is not int:
+        raise DecodeError(f"field '{name}' must be a number, got {type(value).__name__}")
+    value = float(value)
+    if not math.isfinite(value) or not low <= value <= high:
+        raise DecodeError(f"field '{name}' out of range: {value}")
+    return value
+
+
+# Функция проверяет диапазоны значений, уже полученных как числа
+def checked_reading(temperature, humidity):
+    if not TEMPERATURE_MIN <= temperature <= TEMPERATURE_MAX:
+        raise DecodeError(f"field 'temperature' out of range: {temperature}")
+    if not HUMIDITY_MIN <= humidity <= HUMIDITY_MAX:
+        raise DecodeError(f"field 'humidity' out of range: {humidity}")
+    return DHTReading(temperature=temperature, humidity=humidity)
+
+
+# Функция строит измерение из словаря, проверяя типы и диапазоны
+def reading_from_dict(data):
+    temperature = _check_field(data, "temperature", TEMPERATURE_MIN, TEMPERATURE_MAX)
+    humidity = _check_field(data, "humidity", HUMIDITY_MIN, HUMIDITY_MAX)
+    return DHTReading(temperature=temperature, humidity=humidity)
+
+
+# Разбор через msgspec: JSON разбирается сразу в структуру DHTReading
+class MsgspecDecoder:
+    name = "msgspec"
+
+    def __init__(self):
+        self._decoder = msgspec.json.Decoder(DHTReading)
+
+    def __call__(self, payload):
+        try:
+            return self._decoder.decode(payload)
+        except msgspec.DecodeError as e:  # ValidationError - подкласс DecodeError
+            raise DecodeError(str(e)) from None
+
+
+# Разбор через orjson: байты -> словарь -> проверка полей
+class OrjsonDecoder:
+    name = "orjson"
+
+    def __call__(self, payload):
+        try:
+            data = orjson.loads(payload)
+        except orjson.JSONDecodeError as e:
+            raise DecodeError(str(e)) from None
+        return reading_from_dict(data)
+
+
+# Разбор стандартным json (принимает байты напрямую)
+class JsonDecoder:
+    name = "json"
+
+    def __call__(self, payload):
+        try:
+            data = json.loads(payload)
+        except (ValueError, UnicodeDecodeError) as e:
+            raise DecodeError(str(e)) from None
+        return reading_from_dict(data)
+
+
+# Разбор двоичного кадра DHT через struct.unpack_from (без копирования и строк)
+class BinaryDecoder:
+    name = "binary"
+
+    def __call__(self, payload):
+        try:
+            temperature, humidity = decode_dht_frame(payload)
+        except FrameError as e:
+            raise DecodeError(str(e)) from None
+        return checked_reading(temperature, humidity)
+
+
+# Декодер с автоопределением формата: двоичный кадр или JSON
+class AutoDecoder:
+    # json_decoder - декодер для JSON сообщений (msgspec/orjson/json)
+    def __init__(self, json_decoder):
+        self.json_decoder = json_decoder
+        self.binary_decoder = BinaryDecoder()
+        self.name = f"{json_decoder.name}+binary"
+
+    def __call__(self, payload):
+        return self.decode_with_format(payload)[1]
+
+    # Метод разбирает сообщение и возвращает (формат, измерение): конвейер запоминает
+    # формат устройства, чтобы отправлять ему команды в том же формате
+    def decode_with_format(self, payload):
+        if payload_format(payload) == FORMAT_BINARY:
+            return FORMAT_BINARY, self.binary_decoder(payload)
+        return FORMAT_JSON, self.json_decoder(payload)
+
+
+# Доступные реализации в порядке предпочтения
+DECODERS = {"msgspec": MsgspecDecoder, "orjson": OrjsonDecoder, "json": JsonDecoder}
+
+
+# Функция возвращает список имен реализаций, которые можно использовать
+def available_decoders():
+    names = []
+    if msgspec is not None:
+        names.append("msgspec")
+    if orjson is not None:
+        names.append("orjson")
+    names.append("json")
+    return names
+
+
+# Функция создает декодер по имени; "auto" - самый быстрый из доступных
+# detect_binary - дополнительно распознавать двоичные кадры в каждом сообщении
+def get_decoder(name="auto", detect_binary=True):
+    available = available_decoders()
+    if name == "auto":
+        name = available[0]
+    if name not in available:
+        raise ValueError(f"Decoder '{name}' is not available (installed: {', '.join(available)})")
+    decoder = DECODERS[name]()
+    return AutoDecoder(decoder) if detect_binary else decoder
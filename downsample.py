@@ -0,0 +1,78 @@
+# Модуль для прореживания данных перед отрисовкой
+# Рисовать больше точек, чем пикселей по ширине графика, бессмысленно - это только
+# замедляет отрисовку. Методы ниже оставляют ограниченное число точек, сохраняя форму
+# линии и выбросы (пики): min/max по столбцам пикселей и LTTB.
+import numpy as np                  # Для векторных вычислений
+
+METHOD_MINMAX = "minmax"    # Минимум и максимум в каждом столбце пикселей
+METHOD_LTTB = "lttb"        # Largest-Triangle-Three-Buckets
+
+
+# Функция возвращает индексы точек с минимумом и максимумом каждого ряда ys
+# в каждом из n_buckets равных по времени интервалов (x должен быть отсортирован)
+# Ряды прореживаются по общим индексам, поэтому у них остается одна ось времени
+def minmax_indices(x, ys, n_buckets):
+    n = len(x)
+    n_buckets = max(1, int(n_buckets))
+    edges = np.linspace(x[0], x[-1], n_buckets + 1)
+    # Начало каждого непустого интервала: бинарный поиск только по границам интервалов
+    starts = np.unique(np.searchsorted(x, edges[:-1], side="left"))
+    counts = np.diff(np.r_[starts, n])  # Точек в интервале (первый начинается с точки 0)
+    keep = [np.array([0, n - 1])]  # Первая и последняя точки всегда остаются
+    for y in ys:
+        # Минимум и максимум всех интервалов сразу (reduceat), затем первая точка каждого
+        # интервала с этим значением - как argmin/argmax, но без цикла по интервалам
+        for reduce in (np.fmin, np.fmax):
+            hits = np.flatnonzero(y == np.repeat(reduce.reduceat(y, starts), counts))
+            first = np.searchsorted(hits, starts)  # В каждом интервале есть хотя бы одна такая точка
+            keep.append(hits[first[first < len(hits)]])  # (кроме интервалов только из NaN)
+    return np.unique(np.concatenate(keep))
+
+
+# Функция возвращает индексы n_out точек по алгоритму Largest-Triangle-Three-Buckets
+# Из каждого интервала выбирается точка, образующая самый большой треугольник
+# с уже выбранной точкой слева и средней точкой следующего интервала
+def lttb_indices(x, y, n_out):
+    n = len(x)
+    n_out = int(n_out)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Границы n_out - 2 интервалов между первой и последней точками
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    # Средние точки интервалов считаются сразу для всех интервалов через cumsum
+    x_sums = np.r_[0.0, np.cumsum(x)]
+    y_sums = np.r_[0.0, np.cumsum(y)]
+    next_start = np.r_[edges[1:-1], n - 1]
+    next_end = np.r_[edges[2:], n]
+    counts = next_end - next_start
+    avg_x = (x_sums[next_end] - x_sums[next_start]) / counts
+    avg_y = (y_sums[next_end] - y_sums[next_start]) / counts
+    result = np.empty(n_out, dtype=np.intp)
+    result[0] = 0
+    result[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # Удвоенная площадь треугольника (a, точка интервала, среднее следующего интервала)
+        areas = np.abs((x[a] - avg_x[i]) * (y[start:end] - y[a])
+                       - (x[a] - x[start:end]) * (avg_y[i] - y[a]))
+        a = start + int(np.argmax(areas))
+        result[i + 1] = a
+    return result
+
+
+# Функция возвращает индексы точек для отрисовки не более max_points точек
+# или None, если прореживать не нужно
+def downsample_indices(x, ys, max_points, method=METHOD_MINMAX):
+    n = len(x)
+    if not method or n <= max_points or max_points < 4:
+        return None
+    if method == METHOD_MINMAX:
+        # До 2 точек (min и max) на каждый ряд в интервале
+        return minmax_indices(x, ys, (max_points - 2) // (2 * len(ys)))
+    if method == METHOD_LTTB:
+        # Объединяем точки, выбранные для каждого ряда
+        return np.unique(np.concatenate([lttb_indices(x, y, max_points // len(ys)) for y in ys]))
+    raise ValueError(f"Unknown downsampling method: {method}")
@@ -0,0 +1,228 @@
+# Модуль групповой отправки команд (сцены для сотен светодиодов)
+# Содержимое команды сериализуется один раз на формат (JSON, двоичный кадр), затем одни
+# и те же байты рассылаются в топики устройств группы - или одним сообщением в общий
+# топик группы. Отправка идет конвейером в отдельном потоке: одновременно ждут подтверждения
+# не больше window сообщений, каждое подтверждение брокера освобождает место для следующего.
+# Результат по каждому устройству (подтверждено, ошибка, нет подтверждения) собирается
+# в задании, поток Tk только получает итог через on_done.
+import fnmatch                      # Шаблоны ID устройств в группах
+import threading                    # Поток отправки и блокировка состояния
+import time                         # Время рассылки и таймауты
+from collections import deque       # Очередь заданий
+from metrics import Histogram       # Время рассылки
+from publisher import QUEUED        # Ответ publish(), когда связи нет
+
+WINDOW = 100                # Сообщений, одновременно ожидающих подтверждения
+QOS = 1                     # QoS рассылки
+ACK_TIMEOUT = 10.0          # Сколько ждать подтверждения одного сообщения, сек
+ACKED = "acked"             # Брокер подтвердил (для QoS 0 - сообщение записано в сокет)
+FAILED = "failed"           # publish() вернул ошибку или связи нет
+TIMEOUT = "timeout"         # Подтверждение не пришло за ACK_TIMEOUT
+
+
+# Функция возвращает ID устройств группы: patterns - шаблоны fnmatch ("node-1*", "*")
+def resolve_group(patterns, device_ids):
+    return [device_id for device_id in device_ids
+            if any(fnmatch.fnmatchcase(device_id, pattern) for pattern in patterns)]
+
+
+# Класс задания рассылки: список (ID устройства, топик, байты) и результаты по устройствам
+class FanOutJob:
+    def __init__(self, targets, qos, label=""):
+        self.targets = list(targets)
+        self.qos = qos
+        self.label = label
+        self.results = {}           # ID устройства -> ACKED, FAILED или TIMEOUT
+        self.acked = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.started = None         # Начало рассылки (time.perf_counter)
+        self.published = None       # Последнее сообщение передано клиенту MQTT
+        self.finished = None        # Получены все подтверждения (или истекли таймауты)
+        self.done = threading.Event()
+
+    # Метод записывает результат по устройству
+    def set_result(self, device_id, result):
+        self.results[device_id] = result
+        if result == ACKED:
+            self.acked += 1
+        elif result == FAILED:
+            self.failed += 1
+        else:
+            self.timeouts += 1
+
+    # Время от начала рассылки до последнего подтверждения, сек
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    # Метод возвращает словарь с итогами (для JSON, бенчмарка и строки статуса)
+    def summary(self):
+        return {
+            "label": self.label,
+            "targets": len(self.targets),
+            "acked": self.acked,
+            "failed": self.failed,
+            "timeout": self.timeouts,
+            "qos": self.qos,
+            "publish_s": (self.published - self.started) if self.published else None,
+            "total_s": self.elapsed,
+        }
+
+    # Метод возвращает текст итога для строки статуса
+    def summary_text(self):
+        text = f"{self.label}: {self.acked}/{len(self.targets)} delivered in {self.elapsed:.2f} s"
+        problems = [device_id for device_id, result in self.results.items() if result != ACKED]
+        if problems:
+            text += f", {len(problems)} not delivered ({', '.join(problems[:5])}{'...' if len(problems) > 5 else ''})"
+        return text
+
+
+# Класс конвейерной рассылки
+class FanOutPublisher:
+    # Конструктор класса
+    # publish(topic, payload, qos) - отправка, возвращает ID сообщения, QUEUED или None/False при ошибке
+    # on_done(job) - вызывается в потоке рассылки, когда задание завершено
+    def __init__(self, publish, window=WINDOW, qos=QOS, timeout=ACK_TIMEOUT, on_done=None):
+        self.publish = publish
+        self.window = window
+        self.qos = qos
+        self.timeout = timeout
+        self.on_done = on_done or (lambda job: None)
+        self.condition = threading.Condition()
+        self.inflight = {}          # ID сообщения -> (задание, ID устройства, время отправки)
+        self.early = set()          # Подтверждения, пришедшие, пока идет вызов publish() рассылки
+        self.publishing = False     # Поток рассылки внутри publish() (ID сообщения еще неизвестен)
+        self.jobs = deque()         # Задания в очереди
+        self.active = None          # Задание, которое сейчас рассылается
+        self.running = False
+        self._thread = None
+        # Счетчики и время рассылки
+        self.sent = 0               # Передано сообщений клиенту MQTT
+        self.acked = 0              # Подтверждено
+        self.failed = 0             # Ошибок отправки и таймаутов
+        self.fanout_time = Histogram()  # От начала рассылки до последнего подтверждения, сек
+
+    # Метод запускает поток рассылки
+    def start(self):
+        if self._thread is not None:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="rgb-fanout", daemon=True)
+        self._thread.start()
+
+    # Метод останавливает поток рассылки (неразосланные задания отбрасываются)
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(2)
+            self._thread = None
+
+    # Метод ставит рассылку в очередь и сразу возвращает задание (не ждет отправки)
+    # targets - список (ID устройства, топик, байты), qos - None: QoS по умолчанию
+    def send(self, targets, qos=None, label="Fan-out"):
+        job = FanOutJob(targets, self.qos if qos is None else qos, label)
+        with self.condition:
+            self.jobs.append(job)
+            self.condition.notify_all()
+        return job
+
+    # Метод вызывается при подтверждении сообщения брокером (в сетевом потоке MQTT)
+    # Возвращает True, если сообщение было из рассылки
+    def on_ack(self, mid):
+        with self.condition:
+            entry = self.inflight.pop(mid, None)
+            if entry is not None:
+                job, device_id, _ = entry
+                job.set_result(device_id, ACKED)
+                self.acked += 1
+                self.condition.notify_all()
+                return True
+            if self.publishing:
+                self.early.add(mid)  # Возможно, publish() еще не вернул ID этого сообщения
+            return False
+
+    # Основной цикл потока рассылки
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.jobs:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                job = self.active = self.jobs.popleft()
+            self._fan_out(job)
+            with self.condition:
+                self.active = None
+                self.early.clear()
+            self.fanout_time.observe(job.elapsed)
+            try:
+                self.on_done(job)
+            except Exception as e:
+                print(f"Error in fan-out handler: {e}")
+
+    # Метод рассылает одно задание: не больше window сообщений без подтверждения
+    def _fan_out(self, job):
+        job.started = time.perf_counter()
+        publish = self.publish
+        qos = job.qos
+        condition = self.condition
+        for device_id, topic, payload in job.targets:
+            with condition:
+                while self.running and len(self.inflight) >= self.window:
+                    condition.wait(self._next_timeout())
+                    self._expire()
+                if not self.running:
+                    break
+                self.publishing = True
+            # publish() вызывается без блокировки: подтверждение может прийти из сетевого
+            # потока раньше, чем мы запишем ID, - тогда оно попадет в early
+            mid = publish(topic, payload, qos)
+            with condition:
+                self.publishing = False
+                self.sent += 1
+                if not mid or mid == QUEUED:
+                    job.set_result(device_id, FAILED)
+                    self.failed += 1
+                elif mid in self.early:
+                    job.set_result(device_id, ACKED)
+                    self.acked += 1
+                else:
+                    self.inflight[mid] = (job, device_id, time.monotonic())
+                # Остальные подтверждения из early - чужих сообщений (ID paho используются
+                # повторно, поэтому старые записи не хранятся)
+                self.early.clear()
+        job.published = time.perf_counter()
+        # Ждем оставшиеся подтверждения
+        with condition:
+            while self.running and self.inflight:
+                condition.wait(self._next_timeout())
+                self._expire()
+            for _, device_id, _ in self.inflight.values():
+                job.set_result(device_id, TIMEOUT)  # Остановка до получения подтверждений
+            self.inflight.clear()
+        job.finished = time.perf_counter()
+        job.done.set()
+
+    # Функция возвращает, сколько ждать до ближайшего таймаута (вызывается под блокировкой)
+    # Словарь хранит порядок добавления, поэтому первое сообщение - самое старое
+    def _next_timeout(self):
+        if not self.inflight:
+            return self.timeout
+        _, _, oldest = next(iter(self.inflight.values()))
+        return max(0.0, oldest + self.timeout - time.monotonic())
+
+    # Метод снимает сообщения без подтверждения дольше timeout (вызывается под блокировкой)
+    def _expire(self):
+        deadline = time.monotonic() - self.timeout
+        while self.inflight:
+            mid, (job, device_id, sent_at) = next(iter(self.inflight.items()))
+            if sent_at > deadline:
+                return
+            del self.inflight[mid]
+            job.set_result(device_id, TIMEOUT)
+            self.failed += 1
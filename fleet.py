@@ -0,0 +1,137 @@
+# Модуль для хранения данных от множества ESP32 устройств (парк устройств)
+import threading                    # Для защиты данных при одновременной записи и чтении из разных потоков
+import numpy as np                  # Типы данных для массивов
+from ring_buffer import RingBuffer  # Кольцевой буфер на массиве NumPy
+
+# Настройки парка устройств
+DEFAULT_DEVICE_ID = "esp32"   # ID устройства для старого топика без ID (esp32/sensor/dht)
+MAX_POINTS_PER_DEVICE = 4096  # Сколько последних измерений храним для каждого устройства (~128 КБ)
+MAX_DEVICES = 1000            # Максимальное количество устройств (защита от мусорных топиков)
+
+# Функция извлекает ID устройства из топика по шаблону с одним символом "+"
+# Например: шаблон "esp32/+/sensor/dht" и топик "esp32/node-17/sensor/dht" -> "node-17"
+def device_id_from_topic(topic, pattern):
+    topic_parts = topic.split("/")
+    pattern_parts = pattern.split("/")
+    # Количество уровней в топике и шаблоне должно совпадать
+    if len(topic_parts) != len(pattern_parts):
+        return None
+    device_id = None
+    for topic_part, pattern_part in zip(topic_parts, pattern_parts):
+        if pattern_part == "+":
+            device_id = topic_part  # Уровень "+" и есть ID устройства
+        elif topic_part != pattern_part:
+            return None  # Топик не подходит под шаблон
+    return device_id or None
+
+
+# Класс с историей измерений одного устройства
+class DeviceHistory:
+    # Конструктор - создаем буферы фиксированной длины
+    def __init__(self, device_id, max_points=MAX_POINTS_PER_DEVICE):
+        self.device_id = device_id
+        # Память под буферы выделяется сразу - при записи новые объекты не создаются
+        self.temp_data = RingBuffer(max_points, np.float32)  # Данные температуры
+        self.hum_data = RingBuffer(max_points, np.float32)   # Данные влажности
+        self.time_data = RingBuffer(max_points, np.float64)  # Время измерения (секунды epoch)
+        self.last_temperature = None  # Последнее значение температуры
+        self.last_humidity = None     # Последнее значение влажности
+        self.updates = 0              # Счетчик записей - по нему видно, что данные изменились
+
+    # Метод для добавления нового измерения - O(1)
+    # timestamp - время в секундах epoch (time.time())
+    def append(self, temperature, humidity, timestamp):
+        self.temp_data.append(temperature)
+        self.hum_data.append(humidity)
+        self.time_data.append(timestamp)
+        self.last_temperature = temperature
+        self.last_humidity = humidity
+        self.updates += 1
+
+    # Количество сохраненных измерений
+    def __len__(self):
+        return len(self.temp_data)
+
+
+# Класс для хранения истории всех устройств парка
+class Fleet:
+    # Конструктор класса
+    def __init__(self, max_points=MAX_POINTS_PER_DEVICE, max_devices=MAX_DEVICES):
+        self.max_points = max_points
+        self.max_devices = max_devices
+        self.devices = {}  # Словарь ID устройства -> DeviceHistory (поиск за O(1))
+        self.version = 0   # Увеличивается при появлении нового устройства
+        self.rejected = 0  # Измерений от новых устройств сверх max_devices (не добавлены в буферы)
+        # Блокировка: запись пачки и чтение снимка не должны пересекаться
+        self.lock = threading.Lock()
+
+    # Метод возвращает историю устройства, создавая ее при первом сообщении
+    # Вызывается только под блокировкой self.lock
+    def _get_or_create(self, device_id):
+        history = self.devices.get(device_id)
+        if history is None:
+            # Не даем словарю расти бесконечно
+            if len(self.devices) >= self.max_devices:
+                return None
+            history = DeviceHistory(device_id, self.max_points)
+            self.devices[device_id] = history
+            self.version += 1
+        return history
+
+    # Метод для добавления пачки измерений под одной блокировкой
+    # readings - список кортежей (ID устройства, время, температура, влажность)
+    # Возвращает количество измерений, не сохраненных из-за лимита устройств
+    def add_readings(self, readings):
+        rejected = 0
+        with self.lock:
+            for device_id, timestamp, temperature, humidity in readings:
+                history = self._get_or_create(device_id)
+                if history is not None:
+                    history.append(temperature, humidity, timestamp)
+                else:
+                    if not rejected:
+                        first_rejected = device_id
+                    rejected += 1
+            if rejected:
+                # Сообщаем один раз, дальше растет только счетчик
+                if not self.rejected:
+                    print(f"Device limit ({self.max_devices}) reached, readings from new devices "
+                          f"are ignored (first: {first_rejected})")
+                self.rejected += rejected
+        return rejected
+
+    # Метод возвращает согласованные копии данных выбранных устройств
+    # reduce - необязательная функция (время, температура, влажность) -> (время, температура, влажность),
+    # например прореживание: тогда под блокировкой копируются только оставшиеся точки
+    # Результат: список кортежей (ID устройства, время, температура, влажность, счетчик записей)
+    def snapshot(self, device_ids, reduce=None):
+        series = []
+        with self.lock:
+            for device_id in device_ids:
+                history = self.devices.get(device_id)
+                if history is None:
+                    continue
+                data = (history.time_data.view(), history.temp_data.view(), history.hum_data.view())
+                if reduce is not None:
+                    data = reduce(*data)
+                series.append((device_id,) + tuple(array.copy() for array in data) + (history.updates,))
+        return series
+
+    # Метод возвращает отпечаток данных выбранных устройств: ((ID устройства, счетчик записей), ...)
+    # Такой же, как у снимка, но без копирования; читается без блокировки (только целые числа)
+    def signature(self, device_ids):
+        devices = self.devices
+        return tuple((device_id, devices[device_id].updates) for device_id in device_ids if device_id in devices)
+
+    # Метод возвращает историю устройства или None
+    def get(self, device_id):
+        return self.devices.get(device_id)
+
+    # Метод возвращает отсортированный список ID всех устройств
+    def device_ids(self):
+        with self.lock:
+            return sorted(self.devices)
+
+    # Количество устройств в парке
+    def __len__(self):
+        return len(self.devices)
@@ -0,0 +1,114 @@
+# Модуль режима без графического интерфейса (python main.py --headless)
+# Сеть обслуживает цикл asyncio (AsyncMQTTClient), а разбор, буферы устройств и история
+# на диске - то же ядро, что и у окна (core.py). Программа работает до Ctrl+C или SIGTERM,
+# раз в stats_interval секунд выводит счетчики в консоль. С --replay вместо сети
+# сообщения берутся из записи (импорт записанного трафика в историю).
+import asyncio                      # Цикл событий
+import signal                       # Для корректной остановки по SIGTERM
+import time                         # Для расчета скорости приема
+
+# Максимальный объем памяти процесса (модуль есть только в Unix)
+try:
+    import resource
+except ImportError:
+    resource = None
+
+STATS_INTERVAL = 10         # Как часто выводить счетчики, сек
+STOP_TIMEOUT = 5.0          # Сколько ждать отправки DISCONNECT при остановке, сек
+
+
+# Функция возвращает максимальный объем памяти процесса в МБ (None, если неизвестно)
+def peak_memory_mb():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # В Linux - в КБ
+
+
+# Задача периодически выводит счетчики ядра и клиента
+async def report_stats(core, client, interval):
+    last_received = core.pipeline.received
+    last_time = time.monotonic()
+    while True:
+        await asyncio.sleep(interval)
+        stats = core.stats()
+        now = time.monotonic()
+        rate = (stats["received"] - last_received) / (now - last_time)
+        last_received, last_time = stats["received"], now
+        line = (f"[headless] {'connected' if client.connected else 'disconnected'}  "
+                f"rate {rate:.0f} msg/s  received {stats['received']}  processed {stats['processed']}  "
+                f"failed {stats['failed']}  dropped {stats['dropped']}  queued {stats['queued']}  "
+                f"devices {stats['devices']}")
+        if stats["rejected"]:
+            line += f"  over device limit {stats['rejected']}"
+        if "written" in stats:
+            line += f"  written {stats['written']}"
+        if "alerts" in stats:
+            line += f"  alerts {stats['alerts']}"
+        memory = peak_memory_mb()
+        if memory is not None:
+            line += f"  peak memory {memory:.0f} MB"
+        print(line, flush=True)
+
+
+# Основная задача: запускает ядро и MQTT клиента и ждет сигнала остановки
+async def serve(core, client, stats_interval=STATS_INTERVAL):
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: Ctrl+C придет как KeyboardInterrupt
+    core.start()
+    client_task = loop.create_task(client.run())
+    stats_task = loop.create_task(report_stats(core, client, stats_interval)) if stats_interval else None
+    print("Headless mode started, press Ctrl+C to stop", flush=True)
+    try:
+        await stop.wait()
+    finally:
+        # Отключаемся от брокера, затем дорабатываем очередь и записываем остаток истории
+        client.stop()
+        await asyncio.wait([client_task], timeout=STOP_TIMEOUT)
+        if stats_task is not None:
+            stats_task.cancel()
+        core.stop()
+        print("Headless mode stopped", flush=True)
+
+
+# Функция запускает режим без интерфейса (блокирует до остановки)
+def run(core, client, stats_interval=STATS_INTERVAL):
+    try:
+        asyncio.run(serve(core, client, stats_interval))
+    except KeyboardInterrupt:
+        core.stop()
+
+
+# Функция воспроизводит запись через ядро (блокирует до конца записи или Ctrl+C)
+def run_replay(core, replayer, stats_interval=STATS_INTERVAL):
+    core.start()
+    started = time.monotonic()
+    replayer.start()
+    print(f"Replaying {replayer.path}, press Ctrl+C to stop", flush=True)
+    try:
+        next_report = started + stats_interval if stats_interval else None
+        while not replayer.done:
+            time.sleep(0.1)
+            if next_report is not None and time.monotonic() >= next_report:
+                next_report += stats_interval
+                print(f"[headless] {replayer.status_text()}", flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        replayer.stop()
+        # Дорабатываем очередь и записываем остаток истории
+        core.stop()
+    elapsed = time.monotonic() - started
+    stats = core.stats()
+    line = (f"[headless] {replayer.status_text()}  in {elapsed:.1f} s "
+            f"({replayer.replayed / max(elapsed, 1e-9):.0f} msg/s)  processed {stats['processed']}  "
+            f"failed {stats['failed']}  dropped {stats['dropped']}")
+    if stats["rejected"]:
+        line += f"  over device limit {stats['rejected']}"
+    if "written" in stats:
+        line += f"  written {stats['written']}"
+    print(line, flush=True)
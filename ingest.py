@@ -0,0 +1,210 @@
+# Модуль конвейера приема сообщений
+# Поток MQTT только кладет сырые сообщения в ограниченную очередь,
+# рабочий поток разбирает их пачками и передает результат обработчикам (sinks),
+# а GUI раз в кадр забирает один объединенный снимок последних значений.
+import threading                    # Для рабочего потока и блокировок
+import time                         # Для работы со временем
+from collections import deque       # Очередь: append/popleft атомарны и не требуют блокировки
+from decoders import DecodeError, get_decoder # Быстрый разбор сообщений с проверкой значений
+from metrics import Histogram       # Гистограммы времени разбора и задержки
+
+# Настройки конвейера
+QUEUE_SIZE = 10000          # Максимальное количество сообщений в очереди
+BATCH_SIZE = 500            # Максимальный размер пачки для обработки за один раз
+DROP_OLDEST = "drop_oldest" # При переполнении выбрасываем самое старое сообщение
+DROP_NEWEST = "drop_newest" # При переполнении выбрасываем новое сообщение
+SAMPLE_EVERY = 16           # Время разбора и задержка замеряются у каждого 16-го сообщения пачки
+
+
+# Класс конвейера приема сообщений с DHT сенсоров
+class IngestPipeline:
+    # Конструктор класса
+    # resolve_device - функция, которая по топику возвращает ID устройства или None
+    # decoder - декодер с определением формата (AutoDecoder из get_decoder, по умолчанию самый быстрый)
+    def __init__(self, resolve_device, maxsize=QUEUE_SIZE, batch_size=BATCH_SIZE, policy=DROP_OLDEST,
+                 decoder=None):
+        if policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"Unknown drop policy: {policy}")
+        self.resolve_device = resolve_device
+        self.decoder = decoder or get_decoder()
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.policy = policy
+        self.sinks = []              # Обработчики пачек измерений (вызываются в рабочем потоке)
+        self.device_formats = {}     # ID устройства -> формат его последнего сообщения (json/binary)
+        self._queue = deque()        # Очередь сырых сообщений (topic, payload, время получения, время постановки)
+        self._wakeup = threading.Event()  # Сигнал рабочему потоку о новых сообщениях
+        self._running = False
+        self._thread = None
+        # Последние значения устройств, еще не забранные GUI
+        self._pending = {}
+        self._pending_count = 0
+        self._pending_lock = threading.Lock()
+        # Счетчики (каждый изменяется только одним потоком)
+        self.received = 0    # Принято из сети
+        self.dropped = 0     # Выброшено при переполнении очереди
+        self.processed = 0   # Успешно разобрано
+        self.failed = 0      # Ошибки разбора и некорректные значения
+        self.last_error = None  # Текст последней ошибки разбора
+        self.ignored = 0     # Сообщения из неизвестных топиков
+        self.rejected = 0    # Измерения, не принятые буферами парка (сверх лимита устройств)
+        self.batches = 0     # Обработано пачек
+        self.frames = 0      # Снимков, отданных GUI
+        self.coalesced = 0   # Сообщений, объединенных в снимки (не показанных по отдельности)
+        # Гистограммы (секунды), обновляются рабочим потоком
+        self.parse_time = Histogram()    # Разбор одного сообщения (выборочно)
+        self.batch_time = Histogram()    # Обработка пачки целиком, включая обработчики
+        self.latency = Histogram()       # От постановки в очередь до записи в буферы (выборочно)
+
+    # Метод для добавления обработчика пачек измерений
+    # Обработчик получает список кортежей (ID устройства, время, температура, влажность)
+    # и может вернуть количество измерений, которые он не принял
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    # Метод вызывается из потока MQTT - только кладет сообщение в очередь
+    # received_at - время приема для измерения (при воспроизведении - исходное из записи);
+    # задержка конвейера считается не от него, а от момента постановки в очередь
+    def submit(self, topic, payload, received_at=None):
+        if received_at is None:
+            received_at = time.time()
+        self.received += 1
+        if len(self._queue) >= self.maxsize:
+            self.dropped += 1
+            if self.policy == DROP_NEWEST:
+                return False
+            try:
+                self._queue.popleft()  # Освобождаем место, выбрасывая самое старое сообщение
+            except IndexError:
+                pass
+        self._queue.append((topic, payload, received_at, time.perf_counter()))
+        self._wakeup.set()
+        return True
+
+    # Текущая длина очереди
+    @property
+    def queued(self):
+        return len(self._queue)
+
+    # Метод для запуска рабочего потока
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="ingest-worker", daemon=True)
+        self._thread.start()
+
+    # Метод для остановки рабочего потока (оставшиеся сообщения обрабатываются)
+    def stop(self, timeout=2.0):
+        self._running = False
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    # Основной цикл рабочего потока
+    def _run(self):
+        while self._running:
+            self._wakeup.wait(0.5)
+            self._wakeup.clear()
+            self.drain()
+        self.drain()
+
+    # Метод обрабатывает все сообщения, накопившиеся в очереди, пачками
+    # Возвращает количество обработанных сообщений
+    def drain(self):
+        total = 0
+        while True:
+            batch = []
+            try:
+                for _ in range(self.batch_size):
+                    batch.append(self._queue.popleft())
+            except IndexError:
+                pass  # Очередь опустела
+            if not batch:
+                return total
+            self.process_batch(batch)
+            total += len(batch)
+
+    # Метод разбирает пачку сырых сообщений и передает измерения обработчикам
+    def process_batch(self, batch):
+        started = time.perf_counter()
+        readings = []
+        decode = self.decoder.decode_with_format
+        failed = 0
+        submitted = []  # Время постановки в очередь у сообщений, для которых замеряется задержка
+        for index, (topic, payload, received_at, queued_at) in enumerate(batch):
+            device_id = self.resolve_device(topic)
+            if device_id is None:
+                self.ignored += 1
+                continue
+            try:
+                # Разбираем байты сообщения сразу в проверенную структуру
+                if index % SAMPLE_EVERY:
+                    payload_kind, reading = decode(payload)
+                else:
+                    parse_started = time.perf_counter()
+                    payload_kind, reading = decode(payload)
+                    self.parse_time.observe(time.perf_counter() - parse_started)
+                    submitted.append(queued_at)
+            except DecodeError as e:
+                # Некорректное измерение отбрасываем, а не подставляем 0
+                failed += 1
+                self.last_error = f"{device_id}: {e}"
+                continue
+            readings.append((device_id, received_at, reading.temperature, reading.humidity))
+            # Запоминаем формат устройства - в нем же будем отправлять ему команды
+            if self.device_formats.get(device_id) != payload_kind:
+                self.device_formats[device_id] = payload_kind
+        if failed:
+            self.failed += failed
+            # Одно сообщение на пачку, чтобы не тормозить обработку выводом в консоль
+            print(f"Rejected {failed} invalid message(s), last error: {self.last_error}")
+        self.processed += len(readings)
+        self.batches += 1
+        if not readings:
+            self.batch_time.observe(time.perf_counter() - started)
+            return
+        # Передаем пачку обработчикам (буферы графиков, хранилище и т.д.)
+        for sink in self.sinks:
+            try:
+                rejected = sink(readings)
+                if rejected:
+                    self.rejected += rejected
+            except Exception as e:
+                print(f"Error in ingest sink: {e}")
+        now = time.perf_counter()
+        for queued_at in submitted:
+            self.latency.observe(now - queued_at)
+        self.batch_time.observe(time.perf_counter() - started)
+        # Запоминаем только последнее значение каждого устройства для GUI
+        with self._pending_lock:
+            for reading in readings:
+                self._pending[reading[0]] = reading
+            self._pending_count += len(readings)
+
+    # Метод вызывается из GUI раз в кадр - забирает последние значения устройств
+    # Возвращает словарь ID устройства -> (ID, время, температура, влажность)
+    def take_snapshot(self):
+        with self._pending_lock:
+            latest, count = self._pending, self._pending_count
+            self._pending, self._pending_count = {}, 0
+        if count:
+            self.frames += 1
+            self.coalesced += count - len(latest)
+        return latest
+
+    # Метод возвращает словарь со значениями счетчиков
+    def stats(self):
+        return {
+            "received": self.received,
+            "queued": self.queued,
+            "dropped": self.dropped,
+            "processed": self.processed,
+            "failed": self.failed,
+            "ignored": self.ignored,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "frames": self.frames,
+            "coalesced": self.coalesced,
+        }
@@ -1,14 +1,26 @@
 # Импортируем нужные библиотеки
-import tkinter as tk                # Основная библиотека для создания графического интерфейса
-from tkinter import ttk, messagebox # ttk - улучшенные виджеты, messagebox - для всплывающих сообщений
-import paho.mqtt.client as mqtt     # Библиотека для работы с MQTT протоколом - протокол для IoT устройств
+import argparse                     # Для разбора аргументов командной строки
 import json                         # Для работы с JSON форматом данных
+import threading                    # Загрузка истории в фоне, пока окно отвечает
 import time                         # Для работы со временем
-from matplotlib.figure import Figure # Для создания графиков
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg # Адаптер для встраивания графиков в tkinter
-import threading                    # Для работы с потоками
-import matplotlib.ticker as ticker  # Для форматирования осей графиков
-from matplotlib.ticker import FuncFormatter # Для пользовательского форматирования значений на графике
+from ingest import DROP_OLDEST      # Политика переполнения очереди приема
+from binary_frames import FORMAT_BINARY, FORMAT_JSON, encode_rgb_frame # Компактный двоичный формат
+from publisher import CoalescingPublisher # Ограничение частоты отправки команд со слайдеров
+from metrics import MetricsExporter, format_snapshot # Экспорт метрик (Prometheus, JSON) и панель диагностики
+from profiler import SamplingProfiler # Выборочный профилировщик (включается по требованию)
+from recording import Replayer, parse_speed # Воспроизведение записанного трафика MQTT
+from fanout import FanOutPublisher, resolve_group # Групповая рассылка команд RGB
+# Ядро приема (core, fleet, analytics) импортируется в create_core, а вместе с ним NumPy:
+# при быстром запуске - уже после появления окна
+# Библиотеки окна: в режиме --headless они не нужны и на сервере могут быть не установлены
+# (matplotlib и paho импортируются позже, когда они нужны: это самая долгая часть запуска)
+try:
+    import tkinter as tk                # Основная библиотека для создания графического интерфейса
+    from tkinter import ttk, messagebox # ttk - улучшенные виджеты, messagebox - для всплывающих сообщений
+    from tkinter import filedialog      # Выбор файла для экспорта метрик и стеков профилировщика
+except ImportError as e:
+    tk = None
+    GUI_IMPORT_ERROR = e
 
 # Настройки подключения к MQTT брокеру
 MQTT_BROKER = "193.43.147.210"  # IP-адрес MQTT брокера
@@ -16,100 +28,258 @@ MQTT_PORT = 1883                # Стандартный порт для MQTT
 MQTT_USERNAME = ""         # Имя пользователя для авторизации
 MQTT_PASSWORD = ""    # Пароль для авторизации
 MQTT_TOPIC_DHT = "esp32/sensor/dht"  # Топик, куда ESP32 отправляет данные с DHT-сенсора
+MQTT_TOPIC_DHT_FLEET = "esp32/+/sensor/dht"  # Шаблон топика для парка устройств, "+" - ID устройства
 MQTT_TOPIC_RGB = "esp32/control/rgb"  # Топик для управления RGB-светодиодом
+MQTT_RECONNECT_MIN_DELAY = 1    # Первая задержка перед переподключением, сек
+MQTT_RECONNECT_MAX_DELAY = 60   # Максимальная задержка перед переподключением, сек
+MQTT_OFFLINE_QUEUE_SIZE = 100   # Сколько сообщений хранить, пока нет связи
+# Параллельные топики для компактного двоичного формата (см. binary_frames.py)
+MQTT_TOPIC_DHT_BIN = "esp32/sensor/dht/bin"
+MQTT_TOPIC_DHT_FLEET_BIN = "esp32/+/sensor/dht/bin"
+MQTT_TOPIC_RGB_BIN = "esp32/control/rgb/bin"
+# Топики для подписки: одиночный ESP32 и весь парк устройств, в JSON и в двоичном формате
+MQTT_SUBSCRIBE_TOPICS = [MQTT_TOPIC_DHT, MQTT_TOPIC_DHT_FLEET, MQTT_TOPIC_DHT_BIN, MQTT_TOPIC_DHT_FLEET_BIN]
+# Формат команд RGB: "auto" - такой же, в каком ESP32 присылает данные DHT, "json" или "binary"
+RGB_PAYLOAD_FORMAT = "auto"
+RGB_MAX_RATE = 10       # Максимум команд RGB в секунду при перемещении слайдеров
+RGB_SETTLE_MS = 300     # Через сколько мс без движения слайдера значение отправляется с QoS 1
 
-# Класс для работы с MQTT клиентом
-class MQTTClient:
-    # Функция обработки события подключения
-    def on_connect(self, client, userdata, flags, rc, properties=None):
-        if rc == 0:  # rc=0 означает успешное подключение
-            print("Connected to MQTT Broker!")
-            self.connected = True  # Ставим флаг, что подключены
-            # Подписываемся на топик с данными от сенсора
-            self.client.subscribe(MQTT_TOPIC_DHT)
-        else:  # Если rc не 0, значит ошибка
-            print(f"Failed to connect, return code {rc}")
-            self.connected = False
-    
-    # Конструктор класса - инициализация при создании объекта        
-    def __init__(self, broker, port, username, password, on_message_callback):
-        # Создаем MQTT клиент с версией MQTTv5
-        self.client = mqtt.Client(client_id="", protocol=mqtt.MQTTv5)
-        # Устанавливаем логин и пароль
-        self.client.username_pw_set(username, password)
-        # Задаем функции обратного вызова для событий
-        self.client.on_connect = self.on_connect  # Вызовется при подключении
-        self.client.on_message = on_message_callback  # Вызовется при получении сообщения
-        # Сохраняем параметры подключения
-        self.broker = broker
-        self.port = port
-        self.connected = False  # Изначально не подключены
-    
-    # Метод для подключения к брокеру
-    def connect(self):
-        try:
-            # Подключаемся к брокеру с таймаутом 60 секунд
-            self.client.connect(self.broker, self.port, 60)
-            # Запускаем обработку MQTT сообщений в отдельном потоке
-            self.client.loop_start()
-            return True
-        except Exception as e:
-            # Если произошла ошибка, выводим сообщение
-            print(f"Connection error: {e}")
-            return False
-    
-    # Метод для отключения от брокера
-    def disconnect(self):
-        self.client.loop_stop()  # Останавливаем обработку сообщений
-        self.client.disconnect()  # Отключаемся от брокера
-    
-    # Метод для отправки сообщения в определенный топик
-    def publish(self, topic, message):
-        if self.connected:  # Проверяем, подключены ли мы
-            # Отправляем сообщение
-            result = self.client.publish(topic, message)
-            status = result[0]  # Получаем статус отправки
-            if status == 0:  # 0 означает успешную отправку
-                print(f"Message sent to topic {topic}")
-                return True
-            else:
-                print(f"Failed to send message to topic {topic}")
-                return False
-        else:
-            print("Not connected to broker")
-            return False
+# Групповые команды RGB (сцены для многих устройств)
+RGB_TOPIC_TEMPLATE = "esp32/{device}/control/rgb"          # Топик команд устройства парка
+RGB_TOPIC_TEMPLATE_BIN = "esp32/{device}/control/rgb/bin"  # То же в двоичном формате
+RGB_GROUP_TOPIC = "esp32/group/{group}/control/rgb"        # Общий топик группы (устройства подписываются сами)
+RGB_GROUP_USE_TOPIC = False     # True - одно сообщение в общий топик группы вместо рассылки по устройствам
+RGB_FANOUT_WINDOW = 100         # Сколько сообщений рассылки может одновременно ждать подтверждения
+RGB_FANOUT_QOS = 1              # QoS рассылки (0 - без подтверждения брокером)
+RGB_FANOUT_TIMEOUT = 10         # Сколько ждать подтверждения одного сообщения, сек
+# Группы устройств: имя -> шаблоны ID устройств ("*" - любые символы)
+DEVICE_GROUPS = {
+    "all nodes": ["node-*"],
+}
+# Кому отправлять команды RGB (кроме групп из DEVICE_GROUPS)
+RGB_TARGET_SINGLE = "ESP32"              # Одиночный ESP32 (топик MQTT_TOPIC_RGB, режим Live)
+RGB_TARGET_SELECTED = "Selected devices" # Устройства, выбранные на вкладке DHT Data
+RGB_TARGET_ALL = "All devices"           # Все устройства, от которых приходили данные
+
+# Настройки отрисовки графиков
+GRAPH_REFRESH_MS = 200        # Период обновления графиков в миллисекундах (можно уменьшать до ~50)
+GRAPH_RENDER_MODE = "blit"    # "blit" - перерисовка только линий, "full" - полная перерисовка кадра
+GRAPH_DOWNSAMPLE = "minmax"   # Прореживание до ширины графика: "minmax", "lttb" или None
+
+# Быстрый запуск: окно показывается сразу, клиент MQTT создается и подключается после
+# первой отрисовки окна, а matplotlib загружается при первом открытии вкладки DHT Data.
+# False - все создается до появления окна (графики готовы сразу)
+FAST_STARTUP = True
+
+# Настройки конвейера приема сообщений
+INGEST_QUEUE_SIZE = 10000     # Максимум сообщений в очереди между потоком MQTT и обработчиком
+INGEST_BATCH_SIZE = 500       # Сколько сообщений обрабатывается за один раз
+INGEST_DROP_POLICY = DROP_OLDEST  # Что выбрасывать при переполнении очереди
+PAYLOAD_DECODER = "auto"      # "auto", "msgspec", "orjson" или "json"
+
+# Режим без интерфейса (python main.py --headless)
+HEADLESS_STATS_INTERVAL = 10    # Как часто выводить счетчики в консоль, сек (0 - не выводить)
+
+# Потоковая аналитика и оповещения
+ANALYTICS_WINDOW = 60           # Измерений в скользящем окне (среднее, минимум, максимум, скорость)
+ANALYTICS_EWMA_ALPHA = 0.1      # Вес нового измерения в EWMA (оценка аномалии)
+ANOMALY_THRESHOLD = 4.0         # Отклонение от EWMA (в стандартных отклонениях) для оповещения
+ALERT_HOLD_S = 10               # Сколько секунд условие должно держаться, чтобы поднять или снять оповещение
+ALERT_TOPIC = "esp32/{device}/alert"  # Топик оповещений, {device} - ID устройства
+# Пороги (нижний, верхний), None - без границы; "*" - для всех устройств, можно задать отдельно по ID
+ALERT_RULES = {
+    "*": {"temperature": (5, 40), "humidity": (15, 85)},
+}
+
+# Метрики и профилирование
+METRICS_HTTP_PORT = None        # Порт для Prometheus (http://127.0.0.1:порт/metrics), None - не запускать
+METRICS_JSON_PATH = None        # Файл периодических снимков метрик JSON, None - не писать
+METRICS_JSON_INTERVAL = 10      # Период записи снимков JSON, сек
+PROFILER_INTERVAL_MS = 5        # Интервал выборок профилировщика, мс
+
+# Настройки истории измерений на диске
+HISTORY_DB_PATH = "history.db"  # Файл базы SQLite (None - не сохранять историю)
+HISTORY_REFRESH_S = 30          # Как часто перечитывать историю для выбранного диапазона
+# Диапазоны графика: "Live" - данные из памяти, остальные - из базы (в секундах)
+HISTORY_RANGES = {
+    "Live": None,
+    "1 hour": 3600,
+    "24 hours": 86400,
+    "7 days": 7 * 86400,
+    "30 days": 30 * 86400,
+}
 
 # Главный класс приложения - интерфейс для управления ESP32
 class ESP32ControlApp:
     # Конструктор класса
-    def __init__(self, root):
+    # db_path - файл истории, record_path - файл записи трафика (None - не записывать)
+    # replay_path - воспроизвести запись вместо подключения к брокеру, replay_speed - скорость
+    def __init__(self, root, db_path=HISTORY_DB_PATH, record_path=None, replay_path=None, replay_speed=1.0):
         self.root = root  # Корневое окно приложения
         self.root.title("ESP32 MQTT Control")  # Заголовок окна
         self.root.geometry("800x600")  # Начальный размер окна
         self.root.minsize(800, 600)  # Минимальный размер окна
         
-        # Массивы для хранения данных для графиков
-        self.temp_data = []  # Данные температуры
-        self.hum_data = []   # Данные влажности
-        self.time_data = []  # Временные метки
-        
-        # Создаем элементы интерфейса
+        # Ядро приема: конвейер разбора, буферы устройств и история на диске.
+        # Окно только показывает данные ядра - то же ядро работает и без окна (--headless)
+        # Ядро создается в start_services (при быстром запуске - после появления окна),
+        # история на диске открывается там же (при быстром запуске - в фоновом потоке)
+        self.core = None
+        self.db_path = db_path
+        self.record_path = record_path
+        self.fleet = None       # Отдельный буфер для каждого устройства
+        self.pipeline = None    # Поток MQTT кладет сообщения в очередь конвейера
+        self.store = None       # История на диске (None - отключена или еще не открыта)
+        self.analytics = None   # Скользящая статистика и оповещения
+        self.history_cache = None  # (ключ запроса, время запроса, данные)
+        # Устройства, выбранные пользователем для отображения
+        self.selected_devices = ()
+        self.device_list_version = -1  # Версия парка, отображенная в списке устройств
+        self.profiler = SamplingProfiler(PROFILER_INTERVAL_MS / 1000)
+        self.replay_path = replay_path
+        self.replay_speed = replay_speed
+        self.replayer = None
+        self.services_started = False  # Клиент MQTT, отправка команд и экспорт метрик созданы
+        
+        # Создаем элементы интерфейса (графики - сразу или при первом открытии вкладки DHT Data)
+        self.renderer = None
         self.create_widgets()
         
+        # При быстром запуске сначала показываем окно, остальное - когда цикл Tk свободен
+        if FAST_STARTUP:
+            self.root.update_idletasks()
+            self.root.after_idle(self.start_services)
+        else:
+            self.start_services()
+    
+    # Метод открывает историю на диске и подгружает последние измерения в буферы устройств
+    # При быстром запуске это делает фоновый поток (на большой базе - секунды), окно
+    # в это время отвечает, а кнопки Connect и Send недоступны до finish_services
+    def start_services(self):
+        self.core = create_core(None, self.record_path)
+        self.fleet = self.core.fleet
+        self.pipeline = self.core.pipeline
+        self.analytics = self.core.analytics
+        if self.renderer is not None:
+            self.register_graph_metrics(self.core.metrics)  # Графики создали до ядра
+        if not self.db_path:
+            self.finish_services(None)
+        elif FAST_STARTUP:
+            self.status_label.config(text="Status: Loading history...")
+            threading.Thread(target=self._load_history, name="history-loader", daemon=True).start()
+        else:
+            self.finish_services(self.core.load_store(self.db_path))
+    
+    # Метод загрузки истории (выполняется в фоновом потоке), результат передается в GUI поток
+    def _load_history(self):
+        store = self.core.load_store(self.db_path)
+        try:
+            self.root.after(0, lambda: self.finish_services(store))
+        except (RuntimeError, tk.TclError):
+            pass  # Окно уже закрыто
+    
+    # Метод создает клиент MQTT, отправку команд и экспорт метрик, затем подключается
+    # к брокеру (в сетевом потоке) или запускает воспроизведение записи
+    # store - история на диске с подгруженными измерениями (None - без истории)
+    def finish_services(self, store):
+        from mqtt_client import MQTTClient  # paho загружается уже после появления окна
+        
+        # Новые измерения пишутся в историю, затем запускаются рабочие потоки ядра
+        # (после загрузки истории, чтобы старые измерения не попали в буферы после новых)
+        if store is not None:
+            self.core.attach_store(store)
+        self.store = store
+        self.core.start()
+        
         # Создаем MQTT клиент с параметрами из глобальных переменных
         self.mqtt_client = MQTTClient(
             MQTT_BROKER, 
             MQTT_PORT, 
             MQTT_USERNAME, 
             MQTT_PASSWORD, 
-            self.on_message  # Передаем метод-обработчик сообщений
+            self.on_message,  # Передаем метод-обработчик сообщений
+            topics=MQTT_SUBSCRIBE_TOPICS,
+            on_publish_callback=self.on_publish,  # Подтверждения доставки команд
+            min_delay=MQTT_RECONNECT_MIN_DELAY,
+            max_delay=MQTT_RECONNECT_MAX_DELAY,
+            offline_queue_size=MQTT_OFFLINE_QUEUE_SIZE
         )
         
-        # Пытаемся подключиться к брокеру при запуске
-        self.connect_to_broker()
+        # Отправка команд RGB: не чаще RGB_MAX_RATE в секунду, последнее значение - с QoS 1
+        self.rgb_publisher = CoalescingPublisher(
+            self.mqtt_client.publish,
+            self.root.after,
+            self.root.after_cancel,
+            max_rate=RGB_MAX_RATE,
+            settle_ms=RGB_SETTLE_MS,
+            on_result=self.show_message
+        )
         
-        # Запускаем периодическое обновление графиков
+        # Групповая рассылка: отдельный поток, не больше RGB_FANOUT_WINDOW сообщений без подтверждения
+        self.mqtt_client.set_max_inflight(max(RGB_FANOUT_WINDOW, 20))
+        self.fanout = FanOutPublisher(
+            lambda topic, payload, qos: self.mqtt_client.publish(topic, payload, qos, queue=False),
+            window=RGB_FANOUT_WINDOW,
+            qos=RGB_FANOUT_QOS,
+            timeout=RGB_FANOUT_TIMEOUT,
+            on_done=self.on_fanout_done
+        )
+        self.fanout.start()
+        
+        # Метрики окна и клиента добавляются к метрикам ядра; экспорт - в фоновых потоках
+        self.register_metrics(self.core.metrics)
+        self.metrics_exporter = MetricsExporter(self.core.metrics, METRICS_HTTP_PORT, METRICS_JSON_PATH,
+                                                METRICS_JSON_INTERVAL)
+        self.metrics_exporter.start()
+        
+        # Воспроизводим запись через тот же конвейер, что и живой трафик,
+        # иначе подключаемся к брокеру при запуске (в фоне, окно сразу готово к работе)
+        # Оповещения публикуются в MQTT (при воспроизведении записи - только показываются)
+        self.analytics.on_alert = self.publish_alert
+        if self.replay_path:
+            self.replayer = Replayer(self.replay_path, self.core.submit, self.replay_speed,
+                                     backlog=lambda: self.pipeline.queued, max_backlog=INGEST_QUEUE_SIZE // 2)
+            self.core.metrics.counter("replayed_total", "Messages replayed from a recording",
+                                      lambda: self.replayer.replayed)
+            self.replayer.start()
+        else:
+            self.connect_to_broker()
+        self.services_started = True
+        # Кнопки, которым нужен клиент MQTT, доступны только теперь
+        self.connect_button.config(state="normal")
+        self.send_button.config(state="normal")
+        
+        # Запускаем периодическое обновление графиков, списка устройств, счетчиков и статуса
         self._update_graphs()
+        self._refresh_device_list()
+        self._update_pipeline_stats()
+        self._update_connection_status()
+        self._update_diagnostics()
+        self._update_analytics()
+    
+    # Метод регистрирует метрики отправки команд и MQTT клиента
+    def register_metrics(self, metrics):
+        publisher = self.rgb_publisher
+        metrics.counter("rgb_submitted_total", "RGB value changes", lambda: publisher.submitted)
+        metrics.counter("rgb_sent_total", "RGB commands published", lambda: publisher.sent)
+        metrics.counter("rgb_coalesced_total", "RGB changes replaced before sending", lambda: publisher.coalesced)
+        metrics.counter("rgb_failed_total", "RGB commands that failed to publish", lambda: publisher.failed)
+        metrics.histogram("publish_ack_seconds", "Final RGB command to broker ack", publisher.ack_time)
+        fanout = self.fanout
+        metrics.counter("fanout_sent_total", "Group RGB messages published", lambda: fanout.sent)
+        metrics.counter("fanout_acked_total", "Group RGB messages acknowledged", lambda: fanout.acked)
+        metrics.counter("fanout_failed_total", "Group RGB messages failed or timed out", lambda: fanout.failed)
+        metrics.histogram("fanout_seconds", "Group RGB command to the last ack", fanout.fanout_time)
+        self.core.register_client_metrics(self.mqtt_client)
+        metrics.gauge("mqtt_offline_queue", "Messages waiting for reconnect",
+                      lambda: len(self.mqtt_client.offline_queue))
+    
+    # Метод регистрирует метрики отрисовки (вызывается, когда графики созданы)
+    def register_graph_metrics(self, metrics):
+        renderer = self.renderer
+        metrics.histogram("render_seconds", "Graph frame time with blitting", renderer.render_time)
+        metrics.histogram("full_redraw_seconds", "Graph frame time with a full redraw", renderer.full_redraw_time)
+        metrics.counter("full_redraws_total", "Full graph redraws", lambda: renderer.full_redraws)
     
     # Метод для создания всех элементов интерфейса    
     def create_widgets(self):
@@ -124,12 +294,18 @@ class ESP32ControlApp:
         self.tab_dht = ttk.Frame(self.tab_control)
         self.tab_control.add(self.tab_dht, text="DHT Data")
         
+        # Создаем третью вкладку с метриками и профилировщиком
+        self.tab_diag = ttk.Frame(self.tab_control)
+        self.tab_control.add(self.tab_diag, text="Diagnostics")
+        
         # Размещаем контейнер с вкладками в окне
         self.tab_control.pack(expand=1, fill="both")
+        self.tab_control.bind("<<NotebookTabChanged>>", self.on_tab_changed)
         
         # Настраиваем содержимое вкладок
         self.setup_rgb_tab()  # Настройка вкладки RGB
         self.setup_dht_tab()  # Настройка вкладки DHT
+        self.setup_diag_tab()  # Настройка вкладки диагностики
         
         # Создаем фрейм для отображения статуса подключения внизу окна
         self.status_frame = ttk.Frame(self.root)
@@ -139,8 +315,17 @@ class ESP32ControlApp:
         self.status_label = ttk.Label(self.status_frame, text="Status: Disconnected")
         self.status_label.pack(side="left")
         
+        # Метка со счетчиками конвейера приема сообщений
+        self.stats_label = ttk.Label(self.status_frame, text="")
+        self.stats_label.pack(side="left", padx=20)
+        
+        # Метка для сообщений о результате отправки (вместо всплывающих окон)
+        self.message_label = ttk.Label(self.status_frame, text="")
+        self.message_label.pack(side="left", padx=20)
+        
         # Кнопка для подключения/отключения
-        self.connect_button = ttk.Button(self.status_frame, text="Connect", command=self.connect_to_broker)
+        self.connect_button = ttk.Button(self.status_frame, text="Connect", command=self.connect_to_broker,
+                                         state="disabled")  # Включается в start_services
         self.connect_button.pack(side="right")
     
     # Метод для настройки вкладки с управлением RGB    
@@ -158,34 +343,38 @@ class ESP32ControlApp:
         # Слайдер для красного цвета
         ttk.Label(self.rgb_frame, text="Red:").grid(row=0, column=0, sticky="w", padx=5, pady=5)
         self.red_slider = ttk.Scale(self.rgb_frame, from_=0, to=255, orient="horizontal", 
-                                   variable=self.red_var, command=self.update_color_preview)
+                                   variable=self.red_var, command=self.on_slider_change)
         self.red_slider.grid(row=0, column=1, sticky="we", padx=5, pady=5)
         ttk.Label(self.rgb_frame, textvariable=self.red_var).grid(row=0, column=2, padx=5, pady=5)
         
         # Слайдер для зеленого цвета
         ttk.Label(self.rgb_frame, text="Green:").grid(row=1, column=0, sticky="w", padx=5, pady=5)
         self.green_slider = ttk.Scale(self.rgb_frame, from_=0, to=255, orient="horizontal", 
-                                     variable=self.green_var, command=self.update_color_preview)
+                                     variable=self.green_var, command=self.on_slider_change)
         self.green_slider.grid(row=1, column=1, sticky="we", padx=5, pady=5)
         ttk.Label(self.rgb_frame, textvariable=self.green_var).grid(row=1, column=2, padx=5, pady=5)
         
         # Слайдер для синего цвета
         ttk.Label(self.rgb_frame, text="Blue:").grid(row=2, column=0, sticky="w", padx=5, pady=5)
         self.blue_slider = ttk.Scale(self.rgb_frame, from_=0, to=255, orient="horizontal", 
-                                    variable=self.blue_var, command=self.update_color_preview)
+                                    variable=self.blue_var, command=self.on_slider_change)
         self.blue_slider.grid(row=2, column=1, sticky="we", padx=5, pady=5)
         ttk.Label(self.rgb_frame, textvariable=self.blue_var).grid(row=2, column=2, padx=5, pady=5)
         
         # Слайдер для яркости
         ttk.Label(self.rgb_frame, text="Brightness:").grid(row=3, column=0, sticky="w", padx=5, pady=5)
         self.brightness_slider = ttk.Scale(self.rgb_frame, from_=0, to=255, orient="horizontal", 
-                                         variable=self.brightness_var, command=self.update_color_preview)
+                                         variable=self.brightness_var, command=self.on_slider_change)
         self.brightness_slider.grid(row=3, column=1, sticky="we", padx=5, pady=5)
         ttk.Label(self.rgb_frame, textvariable=self.brightness_var).grid(row=3, column=2, padx=5, pady=5)
         
         # Настраиваем, чтобы слайдеры растягивались при изменении размера окна
         self.rgb_frame.columnconfigure(1, weight=1)
         
+        # Когда слайдер отпускают, сразу отправляем финальное значение
+        for slider in (self.red_slider, self.green_slider, self.blue_slider, self.brightness_slider):
+            slider.bind("<ButtonRelease-1>", self.on_slider_release)
+        
         # Создаем фрейм для предпросмотра цвета
         self.preview_frame = ttk.LabelFrame(self.tab_rgb, text="Color Preview")
         self.preview_frame.pack(fill="both", expand=True, padx=10, pady=10)
@@ -194,9 +383,26 @@ class ESP32ControlApp:
         self.color_preview = tk.Canvas(self.preview_frame, width=200, height=100, bg="#000000")
         self.color_preview.pack(padx=10, pady=10, expand=True, fill="both")
         
+        # Фрейм для кнопки отправки и режима живого управления
+        self.send_frame = ttk.Frame(self.tab_rgb)
+        self.send_frame.pack(pady=10)
+        
+        # Кому отправлять: одиночный ESP32, выбранные устройства, все устройства или группа
+        ttk.Label(self.send_frame, text="Target:").pack(side="left")
+        self.target_var = tk.StringVar(value=RGB_TARGET_SINGLE)
+        self.target_box = ttk.Combobox(self.send_frame, textvariable=self.target_var, state="readonly", width=18,
+                                       values=[RGB_TARGET_SINGLE, RGB_TARGET_SELECTED, RGB_TARGET_ALL]
+                                       + [f"Group: {name}" for name in DEVICE_GROUPS])
+        self.target_box.pack(side="left", padx=5)
+        
+        # Флажок: светодиод следует за слайдерами во время перемещения (только одиночный ESP32)
+        self.live_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(self.send_frame, text="Live", variable=self.live_var).pack(side="left", padx=10)
+        
         # Кнопка для отправки значений RGB на ESP32
-        self.send_button = ttk.Button(self.tab_rgb, text="Send to ESP32", command=self.send_rgb_values)
-        self.send_button.pack(pady=10)
+        self.send_button = ttk.Button(self.send_frame, text="Send to ESP32", command=self.send_rgb_values,
+                                      state="disabled")  # Включается в start_services
+        self.send_button.pack(side="left", padx=10)
         
     # Метод для настройки вкладки с данными DHT-сенсора    
     def setup_dht_tab(self):
@@ -209,34 +415,104 @@ class ESP32ControlApp:
         self.temp_label.pack(side="left", padx=20, pady=10)
         
         self.hum_label = ttk.Label(self.current_frame, text="Humidity: N/A")
-        self.hum_label.pack(side="right", padx=20, pady=10)
+        self.hum_label.pack(side="left", padx=20, pady=10)
+        
+        # Выбор диапазона графика: данные из памяти или история из базы
+        self.range_var = tk.StringVar(value="Live")
+        self.range_box = ttk.Combobox(self.current_frame, textvariable=self.range_var,
+                                      values=list(HISTORY_RANGES), state="readonly", width=10)
+        self.range_box.pack(side="right", padx=20, pady=10)
+        self.range_box.bind("<<ComboboxSelected>>", self.on_range_select)
+        ttk.Label(self.current_frame, text="Range:").pack(side="right", pady=10)
+        
+        # Скользящая статистика основного выбранного устройства и оповещения
+        self.analytics_frame = ttk.LabelFrame(self.tab_dht, text="Statistics")
+        self.analytics_frame.pack(fill="x", padx=10)
+        self.temp_stats_label = ttk.Label(self.analytics_frame, text="Temperature: N/A")
+        self.temp_stats_label.pack(anchor="w", padx=20)
+        self.hum_stats_label = ttk.Label(self.analytics_frame, text="Humidity: N/A")
+        self.hum_stats_label.pack(anchor="w", padx=20)
+        self.alert_label = ttk.Label(self.analytics_frame, text="Alerts: none", foreground="red")
+        self.alert_label.pack(anchor="w", padx=20)
+        
+        # Фрейм со списком устройств, слева от графиков
+        self.devices_frame = ttk.LabelFrame(self.tab_dht, text="Devices")
+        self.devices_frame.pack(fill="y", side="left", padx=(10, 0), pady=10)
+        
+        # Список устройств с множественным выбором (Ctrl/Shift + клик)
+        self.device_listbox = tk.Listbox(self.devices_frame, selectmode="extended",
+                                         exportselection=False, width=18)
+        self.device_scrollbar = ttk.Scrollbar(self.devices_frame, orient="vertical",
+                                              command=self.device_listbox.yview)
+        self.device_listbox.config(yscrollcommand=self.device_scrollbar.set)
+        self.device_scrollbar.pack(side="right", fill="y")
+        self.device_listbox.pack(side="left", fill="y", expand=True)
+        self.device_listbox.bind("<<ListboxSelect>>", self.on_device_select)
         
         # Фрейм для графиков исторических данных
         self.graph_frame = ttk.LabelFrame(self.tab_dht, text="Historical Data")
         self.graph_frame.pack(fill="both", expand=True, padx=10, pady=10)
         
+        # Надпись на месте графиков, пока они не созданы
+        self.graph_placeholder = ttk.Label(self.graph_frame, text="Graphs are created when the tab is opened")
+        self.graph_placeholder.pack(expand=True)
+        if not FAST_STARTUP:
+            self.setup_graphs()
+    
+    # Обработчик переключения вкладок: графики создаются при первом открытии вкладки DHT Data
+    def on_tab_changed(self, event=None):
+        if self.renderer is None and self.tab_control.select() == str(self.tab_dht):
+            self.graph_placeholder.config(text="Loading graphs...")
+            self.root.update_idletasks()  # Показываем вкладку до загрузки matplotlib
+            self.setup_graphs()
+    
+    # Метод создает фигуру matplotlib, канвас и объект отрисовки графиков
+    def setup_graphs(self):
+        try:
+            from matplotlib.figure import Figure # Для создания графиков
+            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg # Адаптер для встраивания графиков в tkinter
+            from renderer import GraphRenderer  # Быстрая отрисовка графиков (blitting)
+        except ImportError as e:
+            # Без matplotlib вкладка работает, но без графиков
+            self.graph_placeholder.config(text=f"Graphs are not available ({e})")
+            return
+        self.graph_placeholder.destroy()
+        
         # Создаем фигуру matplotlib для графиков
         self.figure = Figure(figsize=(8, 4), dpi=100)
         
-        # Создаем график для температуры (верхний)
+        # Создаем график для температуры (верхний) и влажности (нижний) с общей осью времени
         self.temp_plot = self.figure.add_subplot(211)  # 2 строки, 1 столбец, 1-й график
-        self.temp_plot.set_title("Temperature (°C)")
-        self.temp_plot.set_ylabel("Temperature (°C)")
-        self.temp_plot.grid(True)  # Включаем сетку
-        
-        # Создаем график для влажности (нижний)
-        self.hum_plot = self.figure.add_subplot(212)  # 2 строки, 1 столбец, 2-й график
-        self.hum_plot.set_title("Humidity (%)")
-        self.hum_plot.set_xlabel("Time")
-        self.hum_plot.set_ylabel("Humidity (%)")
-        self.hum_plot.grid(True)  # Включаем сетку
+        self.hum_plot = self.figure.add_subplot(212, sharex=self.temp_plot)  # 2-й график
         
         # Создаем канвас tkinter для отображения графиков matplotlib
         self.canvas = FigureCanvasTkAgg(self.figure, self.graph_frame)
         self.canvas.get_tk_widget().pack(fill="both", expand=True)
         
-        # Устанавливаем автоматическое размещение графиков
-        self.figure.tight_layout()
+        # Объект для отрисовки: настраивает оси один раз и затем только обновляет линии
+        self.renderer = GraphRenderer(self.figure, self.canvas, self.temp_plot, self.hum_plot,
+                                      use_blit=GRAPH_RENDER_MODE == "blit",
+                                      downsample=GRAPH_DOWNSAMPLE)
+        if self.core is not None:
+            self.register_graph_metrics(self.core.metrics)
+    
+    # Метод для настройки вкладки диагностики
+    def setup_diag_tab(self):
+        # Панель с кнопками экспорта и профилировщика
+        buttons = ttk.Frame(self.tab_diag)
+        buttons.pack(fill="x", padx=10, pady=5)
+        ttk.Button(buttons, text="Export Prometheus...",
+                   command=lambda: self.export_metrics("prometheus")).pack(side="left")
+        ttk.Button(buttons, text="Export JSON...",
+                   command=lambda: self.export_metrics("json")).pack(side="left", padx=5)
+        # Флажок включения профилировщика
+        self.profiler_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(buttons, text="Sampling profiler", variable=self.profiler_var,
+                        command=self.toggle_profiler).pack(side="left", padx=20)
+        ttk.Button(buttons, text="Save stacks...", command=self.save_profile).pack(side="left")
+        # Текстовое поле с метриками и отчетом профилировщика (только для чтения)
+        self.diag_text = tk.Text(self.tab_diag, font=("Courier", 9), wrap="none", state="disabled")
+        self.diag_text.pack(expand=True, fill="both", padx=10, pady=5)
     
     # Метод для обновления предпросмотра цвета при изменении слайдеров    
     def update_color_preview(self, *args):
@@ -254,19 +530,38 @@ class ESP32ControlApp:
         color = f"#{r:02x}{g:02x}{b:02x}"  # Форматируем каждое значение как 2-значное hex число
         self.color_preview.config(bg=color)  # Устанавливаем цвет фона канваса
     
-    # Метод для отправки RGB значений на ESP32    
-    def send_rgb_values(self):
-        # Проверяем, что мы подключены к брокеру
-        if not hasattr(self, 'mqtt_client') or not self.mqtt_client.connected:
-            messagebox.showerror("Error", "Not connected to MQTT broker.")
-            return
-            
+    # Обработчик перемещения слайдера
+    def on_slider_change(self, *args):
+        self.update_color_preview()
+        # В режиме Live отправляем значение (частые изменения объединяются)
+        # Без связи команды ждут переподключения в очереди MQTT клиента
+        # (до запуска клиента при быстром запуске меняется только предпросмотр)
+        if self.services_started and self.live_var.get() and self.target_var.get() == RGB_TARGET_SINGLE:
+            self.rgb_publisher.submit(*self.build_rgb_message())
+    
+    # Обработчик отпускания слайдера - финальное значение отправляется сразу
+    def on_slider_release(self, event=None):
+        if self.services_started and self.live_var.get() and self.target_var.get() == RGB_TARGET_SINGLE:
+            self.rgb_publisher.flush()
+    
+    # Метод формирует топик и содержимое команды RGB из текущих значений слайдеров
+    def build_rgb_message(self):
+        from fleet import DEFAULT_DEVICE_ID  # Уже загружен ядром
         # Получаем значения RGB и яркости
         r = int(self.red_var.get())
         g = int(self.green_var.get())
         b = int(self.blue_var.get())
         brightness = int(self.brightness_var.get())
         
+        # Выбираем формат: в режиме "auto" - тот, в котором ESP32 присылает данные
+        payload_format = RGB_PAYLOAD_FORMAT
+        if payload_format == "auto":
+            payload_format = self.pipeline.device_formats.get(DEFAULT_DEVICE_ID, FORMAT_JSON)
+        
+        if payload_format == FORMAT_BINARY:
+            # Компактный двоичный кадр (6 байт) в параллельный топик
+            return MQTT_TOPIC_RGB_BIN, encode_rgb_frame(r, g, b, brightness)
+        
         # Создаем словарь с данными
         data = {
             "red": r,
@@ -274,56 +569,79 @@ class ESP32ControlApp:
             "blue": b,
             "brightness": brightness
         }
-        
         # Преобразуем словарь в JSON строку
-        payload = json.dumps(data)
-        
-        # Отправляем данные на ESP32
-        success = self.mqtt_client.publish(MQTT_TOPIC_RGB, payload)
-        
-        # Выводим сообщение об успехе или ошибке
-        if success:
-            messagebox.showinfo("Success", "RGB values sent to ESP32!")
+        return MQTT_TOPIC_RGB, json.dumps(data)
+    
+    # Метод для отправки RGB значений на ESP32    
+    def send_rgb_values(self):
+        if self.target_var.get() != RGB_TARGET_SINGLE:
+            self.send_rgb_to_group(self.target_var.get())
+            return
+        # Отправляем текущее значение сразу как финальное (QoS 1), результат появится
+        # в строке статуса; без связи команда уйдет после переподключения
+        self.rgb_publisher.send_final(*self.build_rgb_message())
+    
+    # Метод отправляет текущие значения RGB группе устройств (не блокирует окно)
+    # Содержимое сериализуется один раз на формат, рассылку выполняет поток FanOutPublisher
+    def send_rgb_to_group(self, target):
+        if not self.mqtt_client.connected:
+            self.show_message("Not connected, group commands are not queued", False)
+            return
+        from fleet import DEFAULT_DEVICE_ID  # Уже загружен ядром
+        r, g, b = int(self.red_var.get()), int(self.green_var.get()), int(self.blue_var.get())
+        brightness = int(self.brightness_var.get())
+        json_payload = json.dumps({"red": r, "green": g, "blue": b, "brightness": brightness}).encode()
+        binary_payload = encode_rgb_frame(r, g, b, brightness)
+        group = target[len("Group: "):] if target.startswith("Group: ") else None
+        if group is not None and RGB_GROUP_USE_TOPIC:
+            # Одно сообщение в общий топик группы: подтверждает только брокер
+            targets = [(f"group:{group}", RGB_GROUP_TOPIC.format(group=group), json_payload)]
         else:
-            messagebox.showerror("Error", "Failed to send RGB values.")
+            if target == RGB_TARGET_SELECTED:
+                device_ids = list(self.selected_devices)
+            elif group is not None:
+                device_ids = resolve_group(DEVICE_GROUPS[group], self.fleet.device_ids())
+            else:
+                device_ids = self.fleet.device_ids()
+            targets = []
+            for device_id in device_ids:
+                # Формат устройства: "auto" - тот, в котором оно присылает данные DHT
+                payload_format = RGB_PAYLOAD_FORMAT
+                if payload_format == "auto":
+                    payload_format = self.pipeline.device_formats.get(device_id, FORMAT_JSON)
+                binary = payload_format == FORMAT_BINARY
+                if device_id == DEFAULT_DEVICE_ID:
+                    topic = MQTT_TOPIC_RGB_BIN if binary else MQTT_TOPIC_RGB
+                else:
+                    topic = (RGB_TOPIC_TEMPLATE_BIN if binary else RGB_TOPIC_TEMPLATE).format(device=device_id)
+                targets.append((device_id, topic, binary_payload if binary else json_payload))
+        if not targets:
+            self.show_message(f"{target}: no devices", False)
+            return
+        self.fanout.send(targets, label=f"RGB to {target}")
+        self.show_message(f"RGB to {target}: sending to {len(targets)} device(s)...")
+    
+    # Метод вызывается потоком рассылки по окончании групповой команды
+    def on_fanout_done(self, job):
+        # Передаем итог в GUI поток
+        self.root.after(0, lambda: self.show_message(job.summary_text(), job.acked == len(job.targets)))
+    
+    # Метод показывает результат операции в строке статуса, не блокируя интерфейс
+    def show_message(self, text, ok=True):
+        self.message_label.config(text=text, foreground="" if ok else "red")
+    
+    # Обработчик подтверждения доставки (вызывается в потоке MQTT)
+    def on_publish(self, mid):
+        # Групповая рассылка учитывает подтверждения сразу в сетевом потоке (без блокировки окна)
+        if self.fanout.on_ack(mid):
+            return
+        # Передаем подтверждение в GUI поток
+        self.root.after(0, lambda: self.rgb_publisher.on_ack(mid))
     
-    # Обработчик входящих MQTT сообщений    
+    # Обработчик входящих MQTT сообщений (вызывается в потоке MQTT)
     def on_message(self, client, userdata, msg):
-        topic = msg.topic  # Топик сообщения
-        payload = msg.payload.decode("utf-8")  # Декодируем содержимое из байтов в строку
-        
-        try:
-            # Обрабатываем только сообщения от DHT сенсора
-            if topic == MQTT_TOPIC_DHT:
-                # Парсим JSON данные
-                data = json.loads(payload)
-                
-                # Извлекаем температуру и влажность, и округляем до 1 знака
-                temperature = round(data.get("temperature", 0), 1)
-                humidity = round(data.get("humidity", 0), 1)
-                
-                # Обновляем метки в GUI потоке (важно, т.к. MQTT работает в другом потоке)
-                self.root.after(0, lambda: self.update_dht_labels(temperature, humidity))
-                
-                # Добавляем текущее время для графика
-                current_time = time.strftime("%H:%M:%S")
-                
-                # Ограничиваем максимальное количество точек данных
-                max_points = 20
-                
-                # Добавляем новые данные в массивы
-                self.temp_data.append(temperature)
-                self.hum_data.append(humidity)
-                self.time_data.append(current_time)
-                
-                # Оставляем только последние max_points точек
-                if len(self.temp_data) > max_points:
-                    self.temp_data = self.temp_data[-max_points:]
-                    self.hum_data = self.hum_data[-max_points:]
-                    self.time_data = self.time_data[-max_points:]
-                
-        except Exception as e:
-            print(f"Error processing message: {e}")
+        # Только кладем сырое сообщение в очередь - разбор выполняет рабочий поток
+        self.core.submit(msg.topic, msg.payload)
     
     # Метод для обновления меток с текущими значениями    
     def update_dht_labels(self, temperature, humidity):
@@ -331,83 +649,222 @@ class ESP32ControlApp:
         self.temp_label.config(text=f"Temperature: {temperature:.1f}°C")
         self.hum_label.config(text=f"Humidity: {humidity:.1f}%")
     
+    # Обработчик выбора устройств в списке
+    def on_device_select(self, event=None):
+        device_ids = [self.device_listbox.get(i) for i in self.device_listbox.curselection()]
+        self.selected_devices = tuple(device_ids)
+        # Сразу показываем последние значения основного выбранного устройства
+        history = self.fleet.get(device_ids[0]) if device_ids else None
+        if history is not None and history.last_temperature is not None:
+            self.update_dht_labels(history.last_temperature, history.last_humidity)
+        else:
+            self.temp_label.config(text="Temperature: N/A")
+            self.hum_label.config(text="Humidity: N/A")
+    
+    # Обработчик выбора диапазона графика
+    def on_range_select(self, event=None):
+        if HISTORY_RANGES.get(self.range_var.get()) and self.store is None:
+            if self.services_started or not self.db_path:
+                messagebox.showerror("Error", "History storage is disabled.")
+            else:
+                messagebox.showerror("Error", "History is still loading.")
+            self.range_var.set("Live")
+        self.history_cache = None  # Историю нужно перечитать
+    
+    # Метод возвращает историю выбранных устройств из базы
+    # Запрос выполняется только при смене диапазона/устройств или раз в HISTORY_REFRESH_S
+    def load_history_series(self, selected, span):
+        now = time.time()
+        key = (tuple(selected), span)
+        cache = self.history_cache
+        if cache is None or cache[0] != key or now - cache[1] > HISTORY_REFRESH_S:
+            series = []
+            for device_id in selected:
+                # Хранилище само выбирает разрешение: сырые точки, минутные или часовые агрегаты
+                _, times, temps, hums, _, _ = self.store.history(device_id, now - span, now)
+                series.append((device_id, times, temps, hums))
+            cache = self.history_cache = (key, now, series)
+        return cache
+    
+    # Метод для обновления списка устройств (только если появились новые)
+    def _refresh_device_list(self):
+        try:
+            if self.fleet.version != self.device_list_version:
+                self.device_list_version = self.fleet.version
+                device_ids = self.fleet.device_ids()
+                selected = set(self.selected_devices)
+                # Перезаполняем список, сохраняя выбор пользователя
+                self.device_listbox.delete(0, "end")
+                for index, device_id in enumerate(device_ids):
+                    self.device_listbox.insert("end", device_id)
+                    if device_id in selected:
+                        self.device_listbox.selection_set(index)
+                # Если ничего не выбрано, показываем первое устройство
+                if not selected and device_ids:
+                    self.device_listbox.selection_set(0)
+                    self.on_device_select()
+        except Exception as e:
+            print(f"Error updating device list: {e}")
+        
+        # Планируем следующую проверку через 1 секунду
+        self.root.after(1000, self._refresh_device_list)
+    
+    # Метод для обновления счетчиков конвейера в строке статуса
+    def _update_pipeline_stats(self):
+        stats = self.pipeline.stats()
+        text = f"Queued: {stats['queued']}  Dropped: {stats['dropped']}  Coalesced: {stats['coalesced']}"
+        if stats["rejected"]:
+            text += f"  Over device limit: {stats['rejected']}"
+        self.stats_label.config(text=text)
+        self.root.after(1000, self._update_pipeline_stats)
+    
+    # Метод обновляет скользящую статистику и строку оповещений
+    def _update_analytics(self):
+        from analytics import format_alert  # Уже загружен ядром
+        stats = self.analytics.device_stats(self.selected_devices[0]) if self.selected_devices else None
+        for label, metric, name in ((self.temp_stats_label, "temperature", "Temperature"),
+                                    (self.hum_stats_label, "humidity", "Humidity")):
+            if stats is None:
+                label.config(text=f"{name}: N/A")
+                continue
+            item = stats[metric]
+            label.config(text=f"{name}: avg {item['avg']:.1f}  min {item['min']:.1f}  max {item['max']:.1f}  "
+                              f"rate {item['rate']:+.2f}/min  anomaly {item['score']:.1f}")
+        active = self.analytics.active_count()
+        text = f"Alerts: {active} active" if active else "Alerts: none"
+        if self.analytics.recent:
+            text += f"  |  last: {format_alert(self.analytics.recent[-1])}"
+        self.alert_label.config(text=text)
+        self.root.after(1000, self._update_analytics)
+    
+    # Метод публикует оповещение в MQTT (вызывается в рабочем потоке конвейера)
+    def publish_alert(self, event):
+        from analytics import format_alert
+        print(f"Alert: {format_alert(event)}")
+        if self.replayer is None:
+            self.mqtt_client.publish(ALERT_TOPIC.format(device=event["device"]), json.dumps(event), qos=1)
+    
+    # Метод обновляет строку статуса подключения (состояние меняет сетевой поток MQTT)
+    def _update_connection_status(self):
+        if self.replayer is not None and not self.mqtt_client.running:
+            text = f"Status: {self.replayer.status_text()}"
+        else:
+            text = f"Status: {self.mqtt_client.status_text()}"
+        waiting = len(self.mqtt_client.offline_queue)
+        if waiting:
+            text += f"  ({waiting} waiting)"
+        self.status_label.config(text=text)
+        self.root.after(500, self._update_connection_status)
+    
+    # Метод обновляет панель диагностики (только когда вкладка открыта)
+    def _update_diagnostics(self):
+        if self.tab_control.select() == str(self.tab_diag):
+            text = format_snapshot(self.core.metrics.snapshot())
+            if self.profiler.samples:
+                text += "\n\nSampling profiler" + (" (running)" if self.profiler.running else "") + "\n"
+                text += self.profiler.report()
+            # Сохраняем положение прокрутки, чтобы обновление не мешало читать
+            position = self.diag_text.yview()[0]
+            self.diag_text.config(state="normal")
+            self.diag_text.delete("1.0", "end")
+            self.diag_text.insert("1.0", text)
+            self.diag_text.config(state="disabled")
+            self.diag_text.yview_moveto(position)
+        self.root.after(1000, self._update_diagnostics)
+    
+    # Метод сохраняет метрики в файл: fmt - "prometheus" или "json"
+    def export_metrics(self, fmt):
+        extension = ".json" if fmt == "json" else ".prom"
+        path = filedialog.asksaveasfilename(defaultextension=extension, initialfile=f"metrics{extension}")
+        if not path:
+            return
+        try:
+            if fmt == "json":
+                self.core.metrics.write_json(path)
+            else:
+                with open(path, "w") as f:
+                    f.write(self.core.metrics.prometheus_text())
+            self.show_message(f"Metrics saved to {path}")
+        except OSError as e:
+            self.show_message(f"Failed to save metrics: {e}", False)
+    
+    # Метод включает или выключает профилировщик (флажок на вкладке диагностики)
+    def toggle_profiler(self):
+        if self.profiler_var.get():
+            self.profiler.clear()
+            self.profiler.start()
+        else:
+            self.profiler.stop()
+    
+    # Метод сохраняет свернутые стеки профилировщика (для flamegraph.pl или speedscope)
+    def save_profile(self):
+        if not self.profiler.samples:
+            self.show_message("No profiler samples, enable the sampling profiler first", False)
+            return
+        path = filedialog.asksaveasfilename(defaultextension=".txt", initialfile="profile.txt")
+        if not path:
+            return
+        try:
+            self.profiler.write_collapsed(path)
+            self.show_message(f"Profiler stacks saved to {path}")
+        except OSError as e:
+            self.show_message(f"Failed to save profiler stacks: {e}", False)
+    
     # Метод для обновления графиков    
     def _update_graphs(self):
-        # Функция форматирования чисел для осей - одно число после запятой
-        def format_axis(x, pos):
-            return f"{x:.1f}"
-            
+        started = time.perf_counter()
         # Обновляем графики температуры и влажности
         try:
-            # Очищаем графики
-            self.temp_plot.clear()
-            self.hum_plot.clear()
+            # Забираем один объединенный снимок последних значений за кадр
+            latest = self.pipeline.take_snapshot()
+            selected = self.selected_devices
             
-            # Настраиваем график температуры
-            self.temp_plot.set_title("Temperature (°C)")
-            self.temp_plot.set_ylabel("Temperature (°C)")
-            self.temp_plot.grid(True)
-            # Устанавливаем форматирование чисел на оси Y
-            self.temp_plot.yaxis.set_major_formatter(FuncFormatter(format_axis))
-            
-            # Настраиваем график влажности
-            self.hum_plot.set_title("Humidity (%)")
-            self.hum_plot.set_xlabel("Time")
-            self.hum_plot.set_ylabel("Humidity (%)")
-            self.hum_plot.grid(True)
-            # Устанавливаем форматирование чисел на оси Y
-            self.hum_plot.yaxis.set_major_formatter(FuncFormatter(format_axis))
-            
-            # Если есть данные для отображения
-            if self.temp_data and self.hum_data and self.time_data:
-                # Округляем данные до одного знака после запятой
-                plot_temp_data = [round(t, 1) for t in self.temp_data]
-                plot_hum_data = [round(h, 1) for h in self.hum_data]
-                
-                # Отрисовываем графики: красная линия - температура, синяя - влажность
-                self.temp_plot.plot(range(len(plot_temp_data)), plot_temp_data, 'r-')
-                self.hum_plot.plot(range(len(plot_hum_data)), plot_hum_data, 'b-')
-                
-                # Устанавливаем метки времени по оси X
-                if len(self.time_data) > 10:
-                    # Если точек много, показываем только часть для читаемости
-                    step = len(self.time_data) // 5
-                    self.temp_plot.set_xticks(range(0, len(self.time_data), step))
-                    self.temp_plot.set_xticklabels([self.time_data[i] for i in range(0, len(self.time_data), step)], rotation=45)
-                    self.hum_plot.set_xticks(range(0, len(self.time_data), step))
-                    self.hum_plot.set_xticklabels([self.time_data[i] for i in range(0, len(self.time_data), step)], rotation=45)
-                else:
-                    # Если точек мало, показываем все
-                    self.temp_plot.set_xticks(range(len(self.time_data)))
-                    self.temp_plot.set_xticklabels(self.time_data, rotation=45)
-                    self.hum_plot.set_xticks(range(len(self.time_data)))
-                    self.hum_plot.set_xticklabels(self.time_data, rotation=45)
+            # Обновляем метки основного выбранного устройства, если пришли новые данные
+            if selected and selected[0] in latest:
+                _, _, temperature, humidity = latest[selected[0]]
+                self.update_dht_labels(temperature, humidity)
             
-            # Применяем автоматическое размещение графиков
-            self.figure.tight_layout()
-            # Обновляем отображение канваса
-            self.canvas.draw()
+            # Рисуем только когда вкладка с графиками открыта и графики созданы
+            span = HISTORY_RANGES.get(self.range_var.get())
+            visible = self.renderer is not None and self.tab_control.select() == str(self.tab_dht)
+            if visible and span and self.store is not None:
+                # История из базы для выбранного диапазона
+                key, loaded_at, series = self.load_history_series(selected, span)
+                self.renderer.render(series, ("history", key, loaded_at))
+            elif visible and not self.renderer.is_current(self.fleet.signature(selected)):
+                # Данные изменились (иначе снимок не делаем: прореживание идет под блокировкой
+                # парка и задерживало бы рабочий поток приема ради кадра, который не нужен).
+                # Согласованные копии данных только выбранных пользователем устройств,
+                # прореженные до ширины графика (копируются только нужные точки)
+                snapshot = self.fleet.snapshot(selected, self.renderer.reduce_series)
+                series = [item[:4] for item in snapshot]
+                signature = tuple((item[0], item[4]) for item in snapshot)
+                self.renderer.render(series, signature)
             
         except Exception as e:
             print(f"Error updating graphs: {e}")
         
-        # Планируем следующее обновление через 5 секунд
-        self.root.after(5000, self._update_graphs)
+        # Планируем следующее обновление с учетом времени отрисовки,
+        # чтобы медленный кадр не накапливал отставание
+        elapsed_ms = int((time.perf_counter() - started) * 1000)
+        self.root.after(max(10, GRAPH_REFRESH_MS - elapsed_ms), self._update_graphs)
     
     # Метод для подключения к MQTT брокеру    
+    # Подключение и переподключения идут в сетевом потоке, окно не блокируется
     def connect_to_broker(self):
-        # Пытаемся подключиться через MQTT клиент
+        # Запускаем подключение через MQTT клиент
         if self.mqtt_client.connect():
-            # Если успешно, обновляем статус и меняем кнопку на "Отключиться"
-            self.status_label.config(text="Status: Connected")
+            # Меняем кнопку на "Отключиться", статус обновляет _update_connection_status
+            self.status_label.config(text="Status: Connecting...")
             self.connect_button.config(text="Disconnect", command=self.disconnect_from_broker)
         else:
-            # Если ошибка, показываем статус
+            # Если ошибка, показываем статус и причину
             self.status_label.config(text="Status: Connection Failed")
+            self.show_message(f"Connection failed: {self.mqtt_client.last_error}", False)
     
     # Метод для отключения от MQTT брокера    
     def disconnect_from_broker(self):
-        # Отключаемся от брокера
+        # Отключаемся от брокера (не ждем сетевой поток - окно не блокируется)
         self.mqtt_client.disconnect()
         # Обновляем статус и меняем кнопку на "Подключиться"
         self.status_label.config(text="Status: Disconnected")
@@ -415,17 +872,117 @@ class ESP32ControlApp:
     
     # Метод вызываемый при закрытии приложения    
     def on_closing(self):
-        # Отключаемся от брокера, если подключены
-        if hasattr(self, 'mqtt_client'):
-            self.mqtt_client.disconnect()
+        # Отключаемся от брокера, если подключены, и останавливаем воспроизведение
+        # (окно могли закрыть до запуска клиента MQTT - тогда останавливать нечего)
+        if self.services_started:
+            self.mqtt_client.disconnect(wait=2.0)  # Окно закрывается - ждем отправки DISCONNECT
+            if self.replayer is not None:
+                self.replayer.stop()
+            self.fanout.stop()
+        # Останавливаем рабочий поток конвейера, затем записываем остаток истории
+        if self.core is not None:
+            self.core.stop()
+        self.profiler.stop()
+        if self.services_started:
+            self.metrics_exporter.stop()  # Последний снимок JSON - уже после остановки конвейера
         self.root.destroy()  # Закрываем окно приложения
 
+# Функция создает ядро приема данных с настройками из глобальных переменных
+def create_core(db_path=HISTORY_DB_PATH, record_path=None):
+    from core import IngestCore         # Ядро приема данных (общее для окна и режима --headless)
+    from analytics import StreamAnalytics # Скользящая статистика и оповещения по порогам
+    return IngestCore(
+        [MQTT_TOPIC_DHT, MQTT_TOPIC_DHT_BIN],              # Старые топики одного ESP32 без ID
+        [MQTT_TOPIC_DHT_FLEET, MQTT_TOPIC_DHT_FLEET_BIN],  # Шаблоны топиков парка устройств
+        INGEST_QUEUE_SIZE,
+        INGEST_BATCH_SIZE,
+        INGEST_DROP_POLICY,
+        decoder=PAYLOAD_DECODER,
+        db_path=db_path,
+        record_path=record_path,
+        analytics=StreamAnalytics(ALERT_RULES, ANALYTICS_WINDOW, ANALYTICS_EWMA_ALPHA, ANOMALY_THRESHOLD,
+                                  ALERT_HOLD_S)
+    )
+
+# Функция запускает прием данных без окна (цикл asyncio) до Ctrl+C или SIGTERM
+# С replay_path вместо брокера воспроизводится запись (импорт в историю db_path)
+def run_headless(db_path=HISTORY_DB_PATH, record_path=None, replay_path=None, replay_speed=1.0):
+    from headless import run, run_replay  # Импортируем только в этом режиме
+    from mqtt_client import AsyncMQTTClient
+    from analytics import format_alert
+    core = create_core(db_path, record_path)
+    exporter = MetricsExporter(core.metrics, METRICS_HTTP_PORT, METRICS_JSON_PATH, METRICS_JSON_INTERVAL)
+    if replay_path:
+        replayer = Replayer(replay_path, core.submit, replay_speed,
+                            backlog=lambda: core.pipeline.queued, max_backlog=INGEST_QUEUE_SIZE // 2)
+        core.metrics.counter("replayed_total", "Messages replayed from a recording", lambda: replayer.replayed)
+        core.analytics.on_alert = lambda event: print(f"Alert: {format_alert(event)}", flush=True)
+        exporter.start()
+        try:
+            run_replay(core, replayer, HEADLESS_STATS_INTERVAL)
+        finally:
+            exporter.stop()
+        return
+    client = AsyncMQTTClient(MQTT_BROKER, MQTT_PORT, MQTT_USERNAME, MQTT_PASSWORD, core.submit,
+                             topics=MQTT_SUBSCRIBE_TOPICS,
+                             min_delay=MQTT_RECONNECT_MIN_DELAY, max_delay=MQTT_RECONNECT_MAX_DELAY)
+    core.register_client_metrics(client)
+
+    # Оповещения выводятся в консоль и публикуются в MQTT (из рабочего потока конвейера)
+    def publish_alert(event):
+        print(f"Alert: {format_alert(event)}", flush=True)
+        client.publish(ALERT_TOPIC.format(device=event["device"]), json.dumps(event), qos=1)
+
+    core.analytics.on_alert = publish_alert
+    exporter.start()
+    try:
+        run(core, client, HEADLESS_STATS_INTERVAL)
+    finally:
+        exporter.stop()
+
 # Точка входа программы - выполняется только если запущен этот файл напрямую
 if __name__ == "__main__":
-    root = tk.Tk()  # Создаем корневое окно Tkinter
-    app = ESP32ControlApp(root)  # Создаем приложение
-    root.protocol("WM_DELETE_WINDOW", app.on_closing)  # Привязываем обработчик закрытия окна
-    root.mainloop()  # Запускаем главный цикл обработки событий
+    parser = argparse.ArgumentParser(description="ESP32 MQTT Control")
+    parser.add_argument("--headless", action="store_true",
+                        help="receive and store data without the window (for servers)")
+    parser.add_argument("--record", metavar="FILE",
+                        help="append raw MQTT traffic to FILE for later replay")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="replay a recording through the ingest pipeline instead of connecting")
+    parser.add_argument("--speed", type=parse_speed, default=1.0,
+                        help="replay speed: 1 (real time), 100 (100x) or max (default: 1)")
+    parser.add_argument("--db", metavar="FILE",
+                        help=f"history database (default: {HISTORY_DB_PATH}; with --replay: no history)")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="sample stacks of all threads until exit and save them to FILE (flamegraph format)")
+    args = parser.parse_args()
+    if args.db is None and not args.replay:
+        args.db = HISTORY_DB_PATH
+    elif args.db is None:
+        # Воспроизведение в рабочую базу добавило бы копии измерений и второй раз
+        # сложило бы их в агрегаты - без --db история при воспроизведении не пишется
+        print("Replaying without history storage (use --db FILE to import the recording)")
+    if tk is None and not args.headless:
+        raise SystemExit(f"GUI libraries are not available ({GUI_IMPORT_ERROR}), use --headless")
+    # Профилирование всего запуска (например, сервера без окна)
+    session_profiler = None
+    if args.profile:
+        session_profiler = SamplingProfiler(PROFILER_INTERVAL_MS / 1000)
+        session_profiler.start()
+    try:
+        if args.headless:
+            run_headless(args.db, args.record, args.replay, args.speed)
+        else:
+            root = tk.Tk()  # Создаем корневое окно Tkinter
+            app = ESP32ControlApp(root, args.db, args.record, args.replay, args.speed)  # Создаем приложение
+            root.protocol("WM_DELETE_WINDOW", app.on_closing)  # Привязываем обработчик закрытия окна
+            root.mainloop()  # Запускаем главный цикл обработки событий
+    finally:
+        if session_profiler is not None:
+            session_profiler.stop()
+            session_profiler.write_collapsed(args.profile)
+            print(session_profiler.report())
+            print(f"Profiler stacks saved to {args.profile}")
 
 #echo "# python_gui_mqtt_esp32" >> README.md
 #git init
@@ -0,0 +1,229 @@
+# Модуль метрик работы приложения: счетчики, показатели и гистограммы задержек
+# Счетчики компонентов (конвейера, хранилища, клиента MQTT) уже хранятся в их атрибутах,
+# поэтому реестр читает их только при экспорте - на горячем пути ничего не добавляется.
+# Гистограммы (время разбора, отрисовки, подтверждения отправки) обновляются компонентами:
+# observe() - это бинарный поиск по границам и два сложения.
+# Экспорт: текстовый формат Prometheus (HTTP /metrics) и периодические снимки JSON.
+import bisect                       # Поиск интервала гистограммы
+import json                         # Снимки в формате JSON
+import os                           # Атомарная замена файла снимка
+import threading                    # Поток экспорта
+import time                         # Время снимка
+
+PREFIX = "esp32_"           # Префикс имен метрик
+# Границы интервалов гистограмм по умолчанию (секунды): от 1 мкс до 10 с, 1-2.5-5 на декаду
+DEFAULT_BUCKETS = tuple(m * 10.0 ** e for e in range(-6, 1) for m in (1, 2.5, 5)) + (10.0,)
+QUANTILES = (0.5, 0.9, 0.99) # Квантили для панели диагностики и JSON
+JSON_INTERVAL = 10          # Период записи снимков JSON по умолчанию, сек
+
+
+# Класс гистограммы с фиксированными интервалами (как histogram в Prometheus)
+# Обновляется одним потоком; читать можно из любого (значения могут отставать на одно измерение)
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)  # Последний интервал - больше всех границ
+        self.sum = 0.0
+        self.count = 0
+
+    # Метод добавляет одно измерение
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    # Метод оценивает квантиль q (0...1) линейной интерполяцией внутри интервала
+    def quantile(self, q):
+        counts = list(self.counts)
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if cumulative + count >= rank and count:
+                low = self.bounds[i - 1] if i > 0 else 0.0
+                high = self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+                return low + (high - low) * (rank - cumulative) / count
+            cumulative += count
+        return self.bounds[-1]
+
+    # Метод возвращает словарь: количество, сумма, среднее и квантили
+    def summary(self):
+        count = self.count
+        result = {"count": count, "sum": self.sum, "mean": self.sum / count if count else None}
+        for q in QUANTILES:
+            result[f"p{round(q * 100)}"] = self.quantile(q)
+        return result
+
+
+# Класс реестра метрик приложения
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}  # Имя -> (тип, описание, источник)
+        self._lock = threading.Lock()
+
+    # Метод регистрирует счетчик: read() возвращает текущее значение (только растет)
+    def counter(self, name, help_text, read):
+        self._add(name, "counter", help_text, read)
+
+    # Метод регистрирует показатель: read() возвращает текущее значение (может уменьшаться)
+    def gauge(self, name, help_text, read):
+        self._add(name, "gauge", help_text, read)
+
+    # Метод регистрирует гистограмму, которую обновляет компонент
+    def histogram(self, name, help_text, histogram):
+        self._add(name, "histogram", help_text, histogram)
+
+    def _add(self, name, kind, help_text, source):
+        with self._lock:
+            self._metrics[name] = (kind, help_text, source)
+
+    # Метод возвращает список (имя, тип, описание, источник) в порядке регистрации
+    def items(self):
+        with self._lock:
+            return [(name,) + item for name, item in self._metrics.items()]
+
+    # Функция читает значение счетчика или показателя (ошибка чтения не ломает экспорт)
+    @staticmethod
+    def _read(read):
+        try:
+            value = read()
+        except Exception:
+            return None
+        return None if value is None else float(value)
+
+    # Метод возвращает снимок всех метрик в виде словаря (для JSON и панели диагностики)
+    def snapshot(self):
+        result = {"time": time.time()}
+        for name, kind, _, source in self.items():
+            result[name] = source.summary() if kind == "histogram" else self._read(source)
+        return result
+
+    # Метод возвращает все метрики в текстовом формате Prometheus
+    def prometheus_text(self):
+        lines = []
+        for name, kind, help_text, source in self.items():
+            full_name = PREFIX + name
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            if kind == "histogram":
+                cumulative = 0
+                counts = list(source.counts)
+                for bound, count in zip(source.bounds, counts):
+                    cumulative += count
+                    lines.append(f'{full_name}_bucket{{le="{bound:g}"}} {cumulative}')
+                cumulative += counts[-1]
+                lines.append(f'{full_name}_bucket{{le="+Inf"}} {cumulative}')
+                lines.append(f"{full_name}_sum {source.sum:.9g}")
+                lines.append(f"{full_name}_count {cumulative}")
+            else:
+                value = self._read(source)
+                lines.append(f"{full_name} {'NaN' if value is None else f'{value:.9g}'}")
+        return "\n".join(lines) + "\n"
+
+    # Метод записывает снимок JSON в файл (через временный файл, чтобы читатель не увидел половину)
+    def write_json(self, path):
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(self.snapshot(), f, indent=1)
+        os.replace(temporary, path)
+
+
+# Класс экспорта метрик в фоновом потоке: HTTP /metrics и/или периодические снимки JSON
+class MetricsExporter:
+    # http_port - порт для Prometheus (None - не запускать), json_path - файл снимков (None - не писать)
+    def __init__(self, registry, http_port=None, json_path=None, json_interval=JSON_INTERVAL,
+                 host="127.0.0.1"):
+        self.registry = registry
+        self.http_port = http_port
+        self.json_path = json_path
+        self.json_interval = json_interval
+        self.host = host
+        self._server = None
+        self._stop = threading.Event()
+        self._threads = []
+
+    # Метод запускает потоки экспорта
+    def start(self):
+        if self.http_port is not None:
+            # http.server импортируется только при включенном порте (заметно замедляет запуск)
+            from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer # Отдача /metrics для Prometheus
+            registry = self.registry
+
+            # Обработчик запросов: /metrics - текст Prometheus, /metrics.json - снимок JSON
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path == "/metrics":
+                        body = registry.prometheus_text().encode()
+                        content_type = "text/plain; version=0.0.4; charset=utf-8"
+                    elif self.path == "/metrics.json":
+                        body = json.dumps(registry.snapshot()).encode()
+                        content_type = "application/json"
+                    else:
+                        self.send_error(404)
+                        return
+                    self.send_response(200)
+                    self.send_header("Content-Type", content_type)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass  # Не печатаем каждый запрос в консоль
+
+            self._server = ThreadingHTTPServer((self.host, self.http_port), Handler)
+            self._server.daemon_threads = True
+            self._spawn(self._server.serve_forever, "metrics-http")
+            print(f"Metrics: http://{self.host}:{self._server.server_address[1]}/metrics")
+        if self.json_path:
+            self._spawn(self._write_json_loop, "metrics-json")
+
+    def _spawn(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    # Цикл записи снимков JSON
+    def _write_json_loop(self):
+        while not self._stop.wait(self.json_interval):
+            try:
+                self.registry.write_json(self.json_path)
+            except OSError as e:
+                print(f"Metrics snapshot error: {e}")
+
+    # Метод останавливает потоки экспорта (последний снимок JSON записывается)
+    def stop(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        for thread in self._threads:
+            thread.join(2)
+        self._threads = []
+        if self.json_path:
+            try:
+                self.registry.write_json(self.json_path)
+            except OSError as e:
+                print(f"Metrics snapshot error: {e}")
+
+
+# Функция форматирует снимок метрик для панели диагностики
+def format_snapshot(snapshot):
+    lines = []
+    for name, value in snapshot.items():
+        if name == "time":
+            continue
+        if isinstance(value, dict):
+            if not value["count"]:
+                lines.append(f"{name:<36} no data")
+                continue
+            quantiles = "  ".join(f"p{round(q * 100)} {value[f'p{round(q * 100)}'] * 1000:8.3f}"
+                                  for q in QUANTILES)
+            lines.append(f"{name:<36} n {value['count']:<9} {quantiles} ms")
+        elif value is None:
+            lines.append(f"{name:<36} -")
+        else:
+            lines.append(f"{name:<36} {value:g}")
+    return "\n".join(lines)
@@ -0,0 +1,368 @@
+# Модуль MQTT клиентов
+# MQTTClient - клиент для окна: сеть обслуживает отдельный поток.
+# AsyncMQTTClient - клиент для режима без интерфейса: сеть обслуживает цикл asyncio
+# в том же потоке, что и остальная программа.
+# Оба клиента переподключаются с экспоненциально растущей задержкой и случайным разбросом
+# и заново подписываются на топики после переподключения.
+import asyncio                      # Цикл событий для режима без интерфейса
+import random                       # Для случайного разброса задержки переподключения
+import threading                    # Для сетевого потока и блокировок
+import time                         # Для работы со временем
+from collections import deque       # Очередь сообщений, отправленных без связи
+import paho.mqtt.client as mqtt     # Библиотека для работы с MQTT протоколом
+from publisher import QUEUED        # Ответ publish(), когда сообщение ждет переподключения
+
+# Настройки подключения
+DEFAULT_TOPIC = "esp32/sensor/dht"  # Топик для подписки по умолчанию
+KEEPALIVE = 60                  # Интервал проверки связи с брокером, сек
+RECONNECT_MIN_DELAY = 1         # Первая задержка перед переподключением, сек
+RECONNECT_MAX_DELAY = 60        # Максимальная задержка перед переподключением, сек
+OFFLINE_QUEUE_SIZE = 100        # Сколько сообщений хранить, пока нет связи
+
+
+# Функция возвращает задержку перед попыткой переподключения номер attempt (с 0)
+# Задержка растет в 2 раза, но не больше max_delay; случайный разброс в пределах
+# половины задержки не дает множеству клиентов переподключаться одновременно
+def reconnect_delay(attempt, min_delay=RECONNECT_MIN_DELAY, max_delay=RECONNECT_MAX_DELAY):
+    delay = min(max_delay, min_delay * 2 ** min(attempt, 16))
+    return random.uniform(delay / 2, delay)
+
+
+# Класс для работы с MQTT клиентом
+# Подключение не блокирует интерфейс: сеть обслуживает отдельный поток, который
+# при обрыве связи переподключается с экспоненциально растущей задержкой (со случайным
+# разбросом) и заново подписывается на топики. Сообщения, отправленные без связи,
+# ждут в ограниченной очереди и уходят сразу после переподключения.
+class MQTTClient:
+    # Функция обработки события подключения (вызывается в сетевом потоке)
+    def on_connect(self, client, userdata, flags, rc, properties=None):
+        if rc == 0:  # rc=0 означает успешное подключение
+            print("Connected to MQTT Broker!")
+            self.connections += 1
+            self.attempt = 0  # Следующий обрыв снова начнется с минимальной задержки
+            self.last_error = None
+            # Подписываемся на все топики с данными от сенсоров одним запросом
+            # (после переподключения подписки восстанавливаются здесь же)
+            self.client.subscribe([(topic, 0) for topic in self.topics])
+            with self.lock:
+                self.connected = True  # Ставим флаг, что подключены
+                # Отправляем сообщения, накопленные без связи
+                while self.offline_queue:
+                    topic, message, qos = self.offline_queue.popleft()
+                    self.client.publish(topic, message, qos)
+                    self.flushed += 1
+        else:  # Если rc не 0, значит ошибка
+            print(f"Failed to connect, return code {rc}")
+            self.last_error = str(rc)
+            self.connected = False
+
+    # Функция обработки разрыва соединения (вызывается в сетевом потоке)
+    def on_disconnect(self, client, userdata, rc, properties=None):
+        with self.lock:
+            self.connected = False
+        if rc != 0:  # rc=0 - отключение по запросу пользователя
+            print(f"Disconnected from MQTT Broker, return code {rc}")
+            self.last_error = str(rc)
+
+    # Конструктор класса - инициализация при создании объекта
+    # on_publish_callback(mid) - вызывается в потоке MQTT, когда брокер подтвердил сообщение
+    def __init__(self, broker, port, username, password, on_message_callback, topics=None,
+                 on_publish_callback=None, min_delay=RECONNECT_MIN_DELAY, max_delay=RECONNECT_MAX_DELAY,
+                 offline_queue_size=OFFLINE_QUEUE_SIZE):
+        # Создаем MQTT клиент с версией MQTTv5
+        self.client = mqtt.Client(client_id="", protocol=mqtt.MQTTv5)
+        # Устанавливаем логин и пароль
+        self.client.username_pw_set(username, password)
+        # Задаем функции обратного вызова для событий
+        self.client.on_connect = self.on_connect  # Вызовется при подключении
+        self.client.on_disconnect = self.on_disconnect  # Вызовется при разрыве соединения
+        self.client.on_message = on_message_callback  # Вызовется при получении сообщения
+        if on_publish_callback is not None:
+            # Вызовется при подтверждении отправки (для QoS 1 - после PUBACK от брокера)
+            self.client.on_publish = lambda client, userdata, mid: on_publish_callback(mid)
+        # publish() из других потоков только ставит пакет в очередь клиента,
+        # в сокет его записывает сетевой поток (иначе запись шла бы из двух потоков сразу)
+        self.client.on_socket_register_write = lambda client, userdata, sock: None
+        # Сохраняем параметры подключения
+        self.broker = broker
+        self.port = port
+        self.connected = False  # Изначально не подключены
+        # Топики для подписки (по умолчанию только топик одного DHT сенсора)
+        self.topics = list(topics) if topics else [DEFAULT_TOPIC]
+        # Сетевой поток и состояние переподключения
+        self.lock = threading.Lock()  # Защищает connected и очередь сообщений без связи
+        self.running = False          # Поток должен поддерживать соединение
+        self._stop_event = threading.Event()  # Прерывает ожидание перед переподключением
+        self._thread = None
+        self.min_delay = min_delay    # Задержки перед переподключением, сек
+        self.max_delay = max_delay
+        self.attempt = 0              # Номер неудачной попытки подряд
+        self.retry_at = None          # Когда будет следующая попытка (time.time()), если ждем
+        self.last_error = None        # Причина последнего обрыва или ошибки подключения
+        self.connections = 0          # Сколько раз подключались (больше 1 - были переподключения)
+        # Сообщения, отправленные без связи (при переполнении выбрасываются самые старые)
+        self.offline_queue = deque(maxlen=offline_queue_size)
+        self.flushed = 0              # Отправлено сообщений из очереди после переподключения
+
+    # Метод для подключения к брокеру - не блокирует, подключение идет в сетевом потоке
+    def connect(self):
+        if self.running:
+            return True
+        if self._thread is not None and self._thread.is_alive():
+            # Предыдущий сетевой поток еще завершается (например, ждет таймаута подключения):
+            # второй поток на том же клиенте paho запускать нельзя
+            self.last_error = "previous connection is still closing"
+            print("Connection error: previous connection is still closing, try again later")
+            return False
+        try:
+            # Только сохраняет параметры, само подключение выполнит сетевой поток
+            self.client.connect_async(self.broker, self.port, KEEPALIVE)
+        except Exception as e:
+            # Если произошла ошибка, выводим сообщение
+            print(f"Connection error: {e}")
+            return False
+        self.running = True
+        self.attempt = 0
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="mqtt-network", daemon=True)
+        self._thread.start()
+        return True
+
+    # Основной цикл сетевого потока: подключение, обработка сети, ожидание и повтор
+    def _run(self):
+        while self.running:
+            self.retry_at = None
+            try:
+                self.client.reconnect()  # Блокирует только этот поток (до таймаута TCP)
+                rc = mqtt.MQTT_ERR_SUCCESS
+                while self.running and rc == mqtt.MQTT_ERR_SUCCESS:
+                    rc = self.client.loop(timeout=1.0)
+            except (OSError, ValueError) as e:  # socket.error/timeout - подклассы OSError
+                print(f"Connection error: {e}")
+                self.last_error = str(e)
+            with self.lock:
+                self.connected = False
+            if not self.running:
+                break
+            # Ждем перед следующей попыткой; disconnect() прерывает ожидание
+            delay = reconnect_delay(self.attempt, self.min_delay, self.max_delay)
+            self.attempt += 1
+            self.retry_at = time.time() + delay
+            self._stop_event.wait(delay)
+        self.retry_at = None
+        # Поток остановлен при открытом соединении - отправляем DISCONNECT и закрываем сокет
+        if self.client.socket() is not None:
+            self.client.disconnect()
+            self.client.loop(timeout=1.0)
+
+    # Метод для отключения от брокера
+    # wait - сколько секунд ждать остановки сетевого потока (0 - не ждать: кнопка в окне
+    # не должна зависать, пока поток ждет таймаута подключения к недоступному брокеру)
+    def disconnect(self, wait=0):
+        self.client.disconnect()  # Ставит DISCONNECT в очередь, отправит сетевой поток
+        self.running = False
+        self._stop_event.set()  # Прерываем ожидание перед переподключением
+        if self._thread is not None:
+            if wait:
+                self._thread.join(timeout=wait)
+            if not self._thread.is_alive():
+                self._thread = None  # Пока поток жив, connect() не запустит второй
+        with self.lock:
+            self.connected = False
+
+    # Метод для отправки сообщения в определенный топик
+    # Возвращает ID сообщения (всегда больше 0) при успехе, QUEUED, если связи нет и
+    # сообщение ждет переподключения, или False при ошибке
+    # queue=False - без связи не откладывать сообщение, а сразу вернуть False
+    def publish(self, topic, message, qos=0, queue=True):
+        with self.lock:
+            if self.connected:  # Проверяем, подключены ли мы
+                # Отправляем сообщение
+                result = self.client.publish(topic, message, qos)
+                status = result[0]  # Получаем статус отправки
+                if status == 0:  # 0 означает успешную отправку
+                    return result.mid
+                print(f"Failed to send message to topic {topic}")
+                return False
+            if not queue:
+                return False
+            # Нет связи - откладываем до переподключения. Новое значение с QoS 0
+            # заменяет еще не отправленное значение с QoS 0 в том же топике
+            queue = self.offline_queue
+            if qos == 0 and queue and queue[-1][0] == topic and queue[-1][2] == 0:
+                queue[-1] = (topic, message, qos)
+            else:
+                queue.append((topic, message, qos))
+            return QUEUED
+
+    # Метод задает, сколько сообщений с QoS > 0 может одновременно ждать подтверждения брокера
+    # (остальные paho держит в своей очереди)
+    def set_max_inflight(self, count):
+        self.client.max_inflight_messages_set(count)
+
+    # Метод возвращает текст состояния подключения для строки статуса
+    def status_text(self):
+        if self.connected:
+            return "Connected"
+        if not self.running:
+            return "Disconnected"
+        retry_at = self.retry_at
+        if retry_at is None:
+            return "Connecting..."
+        text = f"Reconnecting in {max(0, retry_at - time.time()):.0f}s"
+        if self.last_error:
+            text += f" ({self.last_error})"
+        return text
+
+
+# Класс MQTT клиента, которым управляет цикл asyncio (без отдельного сетевого потока)
+# Сокет paho регистрируется в цикле событий: чтение и запись выполняются, когда сокет
+# готов, проверка связи (keepalive) - раз в секунду. Только открытие TCP соединения
+# выполняется в пуле потоков, остальные вызовы идут из потока цикла.
+class AsyncMQTTClient:
+    # Конструктор класса
+    # on_message(topic, payload) - вызывается для каждого входящего сообщения в потоке цикла
+    def __init__(self, broker, port, username, password, on_message, topics=None,
+                 min_delay=RECONNECT_MIN_DELAY, max_delay=RECONNECT_MAX_DELAY):
+        self.client = mqtt.Client(client_id="", protocol=mqtt.MQTTv5)
+        self.client.username_pw_set(username, password)
+        self.client.on_connect = self.on_connect
+        self.client.on_disconnect = self.on_disconnect
+        self.client.on_message = lambda client, userdata, msg: on_message(msg.topic, msg.payload)
+        # Сокет обслуживает цикл событий, а не поток paho
+        self.client.on_socket_open = self._on_socket_open
+        self.client.on_socket_close = self._on_socket_close
+        self.client.on_socket_register_write = self._on_socket_register_write
+        self.client.on_socket_unregister_write = self._on_socket_unregister_write
+        self.broker = broker
+        self.port = port
+        self.topics = list(topics) if topics else [DEFAULT_TOPIC]
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.connected = False
+        self.running = False
+        self.attempt = 0              # Номер неудачной попытки подряд
+        self.last_error = None        # Причина последнего обрыва или ошибки подключения
+        self.connections = 0          # Сколько раз подключались
+        self._loop = None
+        self._loop_thread = None      # Поток цикла событий
+        self._closed = None           # Future, завершается при разрыве соединения
+        self._stop = None             # Event, прерывает ожидание перед переподключением
+
+    # Функция обработки события подключения
+    def on_connect(self, client, userdata, flags, rc, properties=None):
+        if rc == 0:
+            print("Connected to MQTT Broker!")
+            self.connected = True
+            self.connections += 1
+            self.attempt = 0
+            self.last_error = None
+            self.client.subscribe([(topic, 0) for topic in self.topics])
+        else:
+            print(f"Failed to connect, return code {rc}")
+            self.last_error = str(rc)
+
+    # Функция обработки разрыва соединения
+    def on_disconnect(self, client, userdata, rc, properties=None):
+        self.connected = False
+        if rc != 0:
+            print(f"Disconnected from MQTT Broker, return code {rc}")
+            self.last_error = str(rc)
+        if self._closed is not None and not self._closed.done():
+            self._closed.set_result(rc)
+
+    # Метод выполняет callback в потоке цикла: обработчики сокета paho вызывает и из пула
+    # потоков, где идет подключение, а цикл событий не потокобезопасен
+    def _in_loop(self, callback, *args):
+        if threading.get_ident() == self._loop_thread:
+            callback(*args)
+        else:
+            self._loop.call_soon_threadsafe(callback, *args)
+
+    # Сокет открыт - ждем входящих данных
+    def _on_socket_open(self, client, userdata, sock):
+        self._in_loop(self._loop.add_reader, sock, self.client.loop_read)
+
+    # Сокет закрыт - убираем его из цикла событий
+    def _on_socket_close(self, client, userdata, sock):
+        self._in_loop(self._socket_closed, sock)
+
+    # Метод убирает закрытый сокет из цикла событий (в потоке цикла)
+    def _socket_closed(self, sock):
+        self._loop.remove_reader(sock)
+        if self._closed is not None and not self._closed.done():
+            self._closed.set_result(None)  # Закрыт без on_disconnect (например, при подключении)
+
+    # Есть данные для отправки - ждем готовности сокета к записи
+    def _on_socket_register_write(self, client, userdata, sock):
+        self._in_loop(self._loop.add_writer, sock, self.client.loop_write)
+
+    # Все данные отправлены
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self._in_loop(self._loop.remove_writer, sock)
+
+    # Основной цикл клиента: подключение, ожидание разрыва, задержка и повтор
+    # Завершается после stop()
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._stop = asyncio.Event()
+        self.running = True
+        while self.running:
+            self._closed = self._loop.create_future()
+            try:
+                # Открытие TCP соединения (DNS, ожидание брокера до таймаута) - в пуле потоков,
+                # чтобы недоступный брокер не останавливал цикл и другие задачи
+                await self._loop.run_in_executor(None, self.client.connect, self.broker, self.port,
+                                                 KEEPALIVE)
+            except (OSError, ValueError) as e:
+                print(f"Connection error: {e}")
+                self.last_error = str(e)
+            else:
+                if not self.running:
+                    self.client.disconnect()  # stop() вызван во время подключения
+                    break
+                misc = self._loop.create_task(self._misc())
+                await self._closed
+                misc.cancel()
+            self.connected = False
+            if not self.running:
+                break
+            delay = reconnect_delay(self.attempt, self.min_delay, self.max_delay)
+            self.attempt += 1
+            try:
+                await asyncio.wait_for(self._stop.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+        self._closed = None
+
+    # Периодическая проверка связи (keepalive, повторная отправка QoS > 0)
+    async def _misc(self):
+        while True:
+            await asyncio.sleep(1.0)
+            if self.client.loop_misc() != mqtt.MQTT_ERR_SUCCESS:
+                return
+
+    # Метод отправляет сообщение; можно вызывать из любого потока (отправка выполняется в цикле)
+    # Возвращает False, если связи нет (сообщение не сохраняется)
+    def publish(self, topic, message, qos=0):
+        loop = self._loop
+        if loop is None or not self.connected:
+            return False
+        loop.call_soon_threadsafe(self.client.publish, topic, message, qos)
+        return True
+
+    # Метод останавливает клиента: отправляет DISCONNECT и прерывает ожидание
+    def stop(self):
+        self.running = False
+        if self._stop is not None:
+            self._stop.set()
+        if self.client.socket() is not None:
+            self.client.disconnect()  # Сокет закроется после отправки DISCONNECT
+        elif self._closed is not None and not self._closed.done():
+            self._closed.set_result(None)
+
+    # Метод возвращает словарь со значениями счетчиков
+    def stats(self):
+        return {"connected": self.connected, "connections": self.connections,
+                "last_error": self.last_error}
@@ -0,0 +1,100 @@
+# Модуль выборочного профилировщика (включается по требованию)
+# Отдельный поток через равные интервалы снимает стеки всех потоков программы
+# (sys._current_frames) и считает, в каких функциях они находятся. Программу он
+# не изменяет и почти не замедляет, поэтому его можно включать прямо во время работы.
+# Результат: топ функций по числу выборок и свернутые стеки для flamegraph.pl/speedscope.
+import collections                  # Подсчет выборок
+import sys                          # Стеки потоков
+import threading                    # Поток профилировщика
+
+INTERVAL = 0.005            # Интервал между выборками, сек
+MAX_DEPTH = 64              # Максимальная глубина сохраняемого стека
+
+
+# Класс выборочного профилировщика
+class SamplingProfiler:
+    def __init__(self, interval=INTERVAL):
+        self.interval = interval
+        self.samples = 0                            # Количество снимков
+        self.stacks = collections.Counter()         # (поток, стек) -> количество выборок
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    # Профилировщик запущен
+    @property
+    def running(self):
+        return self._thread is not None
+
+    # Метод запускает снятие выборок (накопленные ранее выборки сохраняются)
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    # Метод останавливает снятие выборок
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(2)
+        self._thread = None
+
+    # Метод удаляет накопленные выборки
+    def clear(self):
+        with self._lock:
+            self.stacks.clear()
+            self.samples = 0
+
+    # Основной цикл потока профилировщика
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            frames = sys._current_frames()
+            with self._lock:
+                self.samples += 1
+                for thread_id, frame in frames.items():
+                    if thread_id == own_id:
+                        continue
+                    stack = []
+                    while frame is not None and len(stack) < MAX_DEPTH:
+                        code = frame.f_code
+                        file_name = code.co_filename.replace("\\", "/").rsplit("/", 1)[-1]
+                        stack.append(f"{code.co_name} ({file_name}:{code.co_firstlineno})")
+                        frame = frame.f_back
+                    stack.reverse()  # От внешней функции к внутренней
+                    self.stacks[(names.get(thread_id, str(thread_id)), tuple(stack))] += 1
+
+    # Метод возвращает текстовый отчет: функции с наибольшим числом выборок
+    # own - функция была на вершине стека, total - функция была в стеке
+    def report(self, top=20):
+        own = collections.Counter()
+        total = collections.Counter()
+        with self._lock:
+            items = list(self.stacks.items())
+            samples = self.samples
+        for (thread_name, stack), count in items:
+            if not stack:
+                continue
+            own[(thread_name, stack[-1])] += count
+            for function in set(stack):
+                total[(thread_name, function)] += count
+        if not samples:
+            return "No samples"
+        lines = [f"{samples} samples every {self.interval * 1000:g} ms",
+                 f"{'own %':>6} {'total %':>7}  thread / function"]
+        for (thread_name, function), count in own.most_common(top):
+            lines.append(f"{100 * count / samples:6.1f} {100 * total[(thread_name, function)] / samples:7.1f}"
+                         f"  {thread_name}: {function}")
+        return "\n".join(lines)
+
+    # Метод записывает свернутые стеки (формат flamegraph.pl, speedscope): "поток;f1;f2 N"
+    def write_collapsed(self, path):
+        with self._lock:
+            items = list(self.stacks.items())
+        with open(path, "w") as f:
+            for (thread_name, stack), count in items:
+                f.write(";".join((thread_name,) + stack) + f" {count}\n")
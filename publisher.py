@@ -0,0 +1,138 @@
+# Модуль для отправки команд во время перемещения слайдеров
+# Частые изменения объединяются: отправляется не больше max_rate сообщений в секунду,
+# последнее значение всегда доходит (отправка по заднему фронту), одинаковые
+# сообщения со слайдеров не повторяются (явная отправка по кнопке - всегда).
+# Промежуточные кадры идут с QoS 0, финальное значение - с QoS 1, когда слайдер
+# отпустили или он не двигался settle_ms миллисекунд.
+import math                         # Для округления задержки вверх
+import time                         # Для замера интервалов между отправками
+from metrics import Histogram       # Время подтверждения финальных сообщений
+
+# Настройки отправки
+MAX_RATE = 10           # Максимум сообщений в секунду во время перемещения
+SETTLE_MS = 300         # Через сколько мс без изменений значение считается финальным
+QOS_INTERMEDIATE = 0    # QoS для промежуточных значений
+QOS_FINAL = 1           # QoS для финального значения
+QUEUED = -1             # publish() вернул QUEUED: связи нет, сообщение уйдет после переподключения
+
+
+# Класс отправки с объединением частых изменений
+# Все методы вызываются в одном потоке (потоке Tk), таймеры - через schedule/cancel
+class CoalescingPublisher:
+    # Конструктор класса
+    # publish(topic, payload, qos) - отправка, возвращает ID сообщения, QUEUED или None/False при ошибке
+    # schedule(delay_ms, callback) - запуск таймера (например root.after), cancel(handle) - отмена
+    # on_result(text, ok) - уведомление о результате для строки статуса
+    def __init__(self, publish, schedule, cancel, max_rate=MAX_RATE, settle_ms=SETTLE_MS, on_result=None):
+        self.publish = publish
+        self.schedule = schedule
+        self.cancel = cancel
+        self.interval_ms = 1000.0 / max_rate
+        self.settle_ms = settle_ms
+        self.on_result = on_result or (lambda text, ok: None)
+        self.latest = None          # Последнее значение (topic, payload)
+        self.pending = False        # Есть значение, которое еще не отправлено
+        self.last_sent = None       # Последнее отправленное (topic, payload, qos)
+        self.last_send_time = None  # Время последней отправки (time.monotonic)
+        self.final_mid = None       # ID финального сообщения, ждем подтверждения
+        self.final_sent_at = None   # Время отправки финального сообщения (time.perf_counter)
+        self._trailing = None       # Таймер отложенной отправки
+        self._settle = None         # Таймер финальной отправки
+        # Счетчики
+        self.submitted = 0  # Изменений значения
+        self.sent = 0       # Отправлено сообщений
+        self.skipped = 0    # Пропущено (значение не изменилось)
+        self.coalesced = 0  # Изменений, замененных более новым значением до отправки
+        self.failed = 0     # Ошибок отправки
+        self.queued = 0     # Отложено до переподключения
+        self.ack_time = Histogram()  # От отправки финального значения до подтверждения брокером, сек
+
+    # Метод вызывается при каждом изменении значения (например, при движении слайдера)
+    def submit(self, topic, payload):
+        self.submitted += 1
+        if self.pending:
+            self.coalesced += 1  # Предыдущее значение так и не было отправлено
+        self.latest = (topic, payload)
+        self.pending = True
+        # Перезапускаем таймер финальной отправки
+        if self._settle is not None:
+            self.cancel(self._settle)
+        self._settle = self.schedule(self.settle_ms, self._on_settle)
+        if self._trailing is not None:
+            return  # Отправка уже запланирована - она возьмет самое новое значение
+        wait_ms = 0.0
+        if self.last_send_time is not None:
+            wait_ms = self.interval_ms - (time.monotonic() - self.last_send_time) * 1000
+        if wait_ms <= 0:
+            self._send(QOS_INTERMEDIATE)
+        else:
+            self._trailing = self.schedule(int(math.ceil(wait_ms)), self._on_trailing)
+
+    # Метод сразу отправляет значение как финальное (например, по кнопке)
+    # Отправляет даже то же самое значение: устройство могло перезагрузиться, а сообщение,
+    # отложенное без связи, - выпасть из ограниченной очереди
+    def send_final(self, topic, payload):
+        self.submitted += 1
+        self.latest = (topic, payload)
+        self.pending = True
+        self.last_sent = None
+        self.flush()
+
+    # Метод отправляет финальное значение сразу (например, когда слайдер отпустили)
+    def flush(self):
+        if self._trailing is not None:
+            self.cancel(self._trailing)
+            self._trailing = None
+        if self._settle is not None:
+            self.cancel(self._settle)
+            self._settle = None
+        if self.latest is not None:
+            self._send(QOS_FINAL)
+
+    # Таймер отложенной отправки промежуточного значения
+    def _on_trailing(self):
+        self._trailing = None
+        if self.pending:
+            self._send(QOS_INTERMEDIATE)
+
+    # Таймер финальной отправки: значение не менялось settle_ms
+    def _on_settle(self):
+        self._settle = None
+        self.flush()
+
+    # Метод отправляет последнее значение с заданным QoS
+    def _send(self, qos):
+        topic, payload = self.latest
+        self.pending = False
+        # Такое же сообщение уже отправлено с не меньшим QoS - повторять не нужно
+        last = self.last_sent
+        if last is not None and last[0] == topic and last[1] == payload and last[2] >= qos:
+            self.skipped += 1
+            return
+        mid = self.publish(topic, payload, qos)
+        self.last_send_time = time.monotonic()
+        if mid == QUEUED:
+            self.queued += 1
+            self.last_sent = (topic, payload, qos)
+            if qos >= QOS_FINAL:
+                self.final_mid = None
+                self.on_result("Not connected, RGB values will be sent after reconnect", False)
+            return
+        if not mid:
+            self.failed += 1
+            self.last_sent = None  # Следующая попытка не должна считаться повтором
+            self.on_result("Failed to send RGB values", False)
+            return
+        self.sent += 1
+        self.last_sent = (topic, payload, qos)
+        if qos >= QOS_FINAL:
+            self.final_mid = mid
+            self.final_sent_at = time.perf_counter()
+            self.on_result("RGB values sent, waiting for broker ack...", True)
+
+    # Метод вызывается при подтверждении доставки сообщения брокером
+    def on_ack(self, mid):
+        if mid == self.final_mid:
+            self.final_mid = None
+            self.ack_time.observe(time.perf_counter() - self.final_sent_at)
+            self.on_result("RGB values delivered", True)
@@ -0,0 +1,235 @@
+# Модуль записи и воспроизведения трафика MQTT (разбор инцидентов, повторяемая нагрузка)
+# Формат файла (только дописывается): заголовок MAGIC, затем записи подряд.
+# Запись - заголовок RECORD (время приема float64, номер топика uint32, длина uint32) и байты.
+# Имя топика хранится в файле один раз: при первой встрече пишется запись с номером
+# TOPIC_DEFINITION, байты которой - имя топика; топики нумеруются по порядку появления.
+# Чтение идет через mmap по одной записи, поэтому файлы в несколько ГБ не загружаются
+# в память целиком. Оборванная последняя запись (сбой во время записи) при чтении
+# пропускается, а при дописывании в тот же файл - обрезается.
+import mmap                         # Отображение файла в память для потокового чтения
+import os                           # Размер файла
+import struct                       # Упаковка заголовков записей
+import threading                    # Блокировка записи и поток воспроизведения
+import time                         # Время приема и темп воспроизведения
+
+MAGIC = b"MQTTREC1"                 # Заголовок файла записи (формат версии 1)
+RECORD = struct.Struct("<dII")      # Время приема, номер топика, длина данных
+TOPIC_DEFINITION = 0xFFFFFFFF       # Номер записи, объявляющей новый топик
+FLUSH_INTERVAL = 1.0        # Как часто сбрасывать буфер записи на диск, сек
+SPEED_MAX = 0               # Скорость воспроизведения "как можно быстрее"
+MAX_SLEEP = 0.5             # Максимальная пауза между проверками остановки, сек
+
+
+# Класс ошибки формата файла записи
+class RecordingError(Exception):
+    pass
+
+
+# Функция разбирает скорость воспроизведения из командной строки: "1", "100", "max"
+def parse_speed(text):
+    if text.lower() == "max":
+        return SPEED_MAX
+    speed = float(text)
+    if speed < 0:
+        raise ValueError("speed must not be negative")
+    return speed
+
+
+# Функция обходит записи отображенного файла
+# Возвращает кортежи (позиция конца записи, время, номер топика, начало данных, длина данных)
+def _walk(data):
+    if data[:len(MAGIC)] != MAGIC:
+        raise RecordingError("not an MQTT recording")
+    position = len(MAGIC)
+    size = len(data)
+    header = RECORD.size
+    while position + header <= size:
+        timestamp, topic_id, length = RECORD.unpack_from(data, position)
+        start = position + header
+        end = start + length
+        if end > size:
+            break  # Оборванная последняя запись
+        yield end, timestamp, topic_id, start, length
+        position = end
+
+
+# Функция отображает файл в память (только чтение), для пустого файла - ошибка формата
+def _map(f):
+    size = os.fstat(f.fileno()).st_size
+    if size < len(MAGIC):
+        raise RecordingError("not an MQTT recording")
+    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(data, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+        data.madvise(mmap.MADV_SEQUENTIAL)  # Ядро читает наперед и освобождает прочитанные страницы
+    return data
+
+
+# Функция читает записи файла по одной: (время приема, топик, байты сообщения)
+def iter_records(path):
+    with open(path, "rb") as f:
+        data = _map(f)
+        try:
+            topics = []
+            for _, timestamp, topic_id, start, length in _walk(data):
+                if topic_id == TOPIC_DEFINITION:
+                    topics.append(data[start:start + length].decode())
+                else:
+                    yield timestamp, topics[topic_id], data[start:start + length]
+        finally:
+            data.close()
+
+
+# Функция читает только заголовки записей (данные сообщений не копируются)
+# Возвращает словарь: количество сообщений, время первого и последнего, топики, конец целых записей
+def scan(path):
+    with open(path, "rb") as f:
+        data = _map(f)
+        try:
+            topics = []
+            messages = 0
+            first = last = None
+            end = len(MAGIC)
+            for end, timestamp, topic_id, start, length in _walk(data):
+                if topic_id == TOPIC_DEFINITION:
+                    topics.append(data[start:start + length].decode())
+                    continue
+                messages += 1
+                if first is None:
+                    first = timestamp
+                last = timestamp
+            return {"messages": messages, "first": first, "last": last, "topics": topics,
+                    "end": end, "size": len(data)}
+        finally:
+            data.close()
+
+
+# Класс записи сырых сообщений MQTT в файл
+# record() вызывается в потоке или цикле MQTT: только упаковка заголовка и запись в буфер
+class Recorder:
+    def __init__(self, path, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.topics = {}            # Топик -> номер в файле
+        self.recorded = 0           # Записано сообщений за этот запуск
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+        self._file = None
+
+    # Метод открывает файл: новый создается, в существующий записи дописываются
+    def open(self):
+        if os.path.exists(self.path) and os.path.getsize(self.path):
+            info = scan(self.path)
+            self.topics = {topic: index for index, topic in enumerate(info["topics"])}
+            self._file = open(self.path, "r+b")
+            if info["end"] < info["size"]:
+                print(f"Recording {self.path}: dropped incomplete last record")
+                self._file.truncate(info["end"])
+            self._file.seek(info["end"])
+        else:
+            self._file = open(self.path, "wb")
+            self._file.write(MAGIC)
+
+    # Метод записывает одно сообщение; timestamp - время приема (по умолчанию сейчас)
+    def record(self, topic, payload, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        with self.lock:
+            if self._file is None:
+                return False
+            topic_id = self.topics.get(topic)
+            if topic_id is None:
+                name = topic.encode()
+                self._file.write(RECORD.pack(timestamp, TOPIC_DEFINITION, len(name)) + name)
+                topic_id = self.topics[topic] = len(self.topics)
+            self._file.write(RECORD.pack(timestamp, topic_id, len(payload)))
+            self._file.write(payload)
+            self.recorded += 1
+            # Периодически сбрасываем буфер, чтобы файл можно было читать во время записи
+            now = time.monotonic()
+            if now - self.last_flush >= self.flush_interval:
+                self._file.flush()
+                self.last_flush = now
+        return True
+
+    # Метод закрывает файл (буфер записывается на диск)
+    def close(self):
+        with self.lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+# Класс воспроизведения записи через тот же путь приема, что и живой трафик
+class Replayer:
+    # submit(topic, payload, received_at) - прием сообщения (например IngestCore.submit)
+    # speed - 1 - реальное время, 100 - в 100 раз быстрее, SPEED_MAX - как можно быстрее
+    # keep_time - сохранять исходное время приема (графики инцидента), иначе - текущее время
+    # backlog() и max_backlog - длина очереди приема: при SPEED_MAX воспроизведение ждет,
+    # пока очередь не освободится, чтобы сообщения не выбрасывались при переполнении
+    def __init__(self, path, submit, speed=1.0, keep_time=True, backlog=None, max_backlog=None):
+        self.path = path
+        self.submit = submit
+        self.speed = speed
+        self.keep_time = keep_time
+        self.backlog = backlog
+        self.max_backlog = max_backlog
+        self.replayed = 0           # Воспроизведено сообщений
+        self.position = None        # Время приема последнего воспроизведенного сообщения
+        self.done = False           # Воспроизведение закончено (или остановлено)
+        self.error = None           # Текст ошибки чтения файла
+        self._stop = threading.Event()
+        self._thread = None
+
+    # Метод запускает воспроизведение в фоновом потоке
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="replay", daemon=True)
+        self._thread.start()
+
+    # Метод останавливает воспроизведение
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(2)
+            self._thread = None
+
+    # Метод воспроизводит запись (блокирует до конца файла или остановки), возвращает число сообщений
+    def run(self):
+        stop = self._stop
+        submit = self.submit
+        keep_time = self.keep_time
+        throttle = self.backlog is not None and self.max_backlog
+        first = started = None
+        try:
+            for timestamp, topic, payload in iter_records(self.path):
+                if first is None:
+                    first, started = timestamp, time.monotonic()
+                if self.speed:
+                    # Ждем момента, когда сообщение пришло бы при выбранной скорости
+                    delay = (timestamp - first) / self.speed - (time.monotonic() - started)
+                    while delay > 0 and not stop.wait(min(delay, MAX_SLEEP)):
+                        delay = (timestamp - first) / self.speed - (time.monotonic() - started)
+                elif throttle:
+                    while self.backlog() >= self.max_backlog and not stop.wait(0.001):
+                        pass
+                if stop.is_set():
+                    break
+                submit(topic, payload, timestamp if keep_time else None)
+                self.replayed += 1
+                self.position = timestamp
+        except (OSError, RecordingError) as e:
+            self.error = str(e)
+            print(f"Replay error: {e}")
+        self.done = True
+        return self.replayed
+
+    # Метод возвращает текст для строки статуса
+    def status_text(self):
+        speed = "max" if not self.speed else f"x{self.speed:g}"
+        text = f"Replay {speed}: {self.replayed} messages"
+        if self.position is not None:
+            text += f", at {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.position))}"
+        if self.error:
+            text += f" (error: {self.error})"
+        elif self.done:
+            text += " (finished)"
+        return text
@@ -0,0 +1,226 @@
+# Модуль для быстрой отрисовки графиков температуры и влажности
+# Линии создаются один раз и обновляются через set_data. В режиме blit
+# перерисовывается только слой с данными поверх сохраненного фона
+# (оси, сетка, подписи), а полная перерисовка и tight_layout выполняются
+# только при выходе данных за границы осей, смене устройств или изменении размера окна.
+import time                         # Для форматирования времени на оси X
+from matplotlib.ticker import FuncFormatter, MaxNLocator # Форматирование и расстановка меток на осях
+from downsample import METHOD_MINMAX, downsample_indices # Прореживание точек до ширины графика
+from metrics import Histogram       # Гистограммы времени кадров
+
+# Настройки масштабирования осей
+X_MARGIN = 0.25      # Запас справа по оси времени (доля от ширины окна данных)
+Y_MARGIN = 0.1       # Запас сверху и снизу по оси значений
+MIN_X_SPAN = 60.0    # Минимальная ширина оси времени в секундах
+MIN_Y_SPAN = 1.0     # Минимальный диапазон оси значений
+MIN_FILL = 0.5       # Если ось вдвое шире нужной для данных - сужаем ось
+MIN_POINTS = 200     # Минимальное количество точек линии после прореживания
+
+
+# Функция форматирования чисел для осей - одно число после запятой
+def format_value_axis(x, pos):
+    return f"{x:.1f}"
+
+
+# Функция форматирования оси времени - секунды epoch в ЧЧ:ММ:СС
+def format_time_axis(x, pos):
+    return time.strftime("%H:%M:%S", time.localtime(x))
+
+
+# Функция возвращает границы оси времени для данных от low до high
+# Запас справа нужен, чтобы новые точки долго не выходили за границу
+def time_limits(low, high):
+    span = max(high - low, MIN_X_SPAN)
+    return (low, low + span * (1 + X_MARGIN))
+
+
+# Функция возвращает границы оси значений для данных от low до high
+def value_limits(low, high):
+    pad = max(high - low, MIN_Y_SPAN) * Y_MARGIN + MIN_Y_SPAN / 2
+    return (low - pad, high + pad)
+
+
+# Функция проверяет, можно ли оставить текущие границы оси
+# ideal - границы, которые были бы выбраны для этих данных с нуля
+def limits_fit(limits, low, high, ideal):
+    if limits is None:
+        return False
+    if low < limits[0] or high > limits[1]:
+        return False  # Данные вышли за границы
+    # Ось намного шире, чем нужно для данных - границы нужно сузить
+    return (limits[1] - limits[0]) * MIN_FILL <= ideal[1] - ideal[0]
+
+
+# Класс для отрисовки графиков с переиспользованием линий и фона
+class GraphRenderer:
+    # Конструктор класса
+    # downsample - метод прореживания ("minmax", "lttb" или None - рисовать все точки)
+    def __init__(self, figure, canvas, temp_plot, hum_plot, use_blit=True, downsample=METHOD_MINMAX):
+        self.figure = figure
+        self.canvas = canvas
+        self.temp_plot = temp_plot
+        self.hum_plot = hum_plot
+        self.use_blit = use_blit
+        self.downsample = downsample
+        self.lines = {}            # ID устройства -> (линия температуры, линия влажности)
+        self.background = None     # Сохраненный фон для blitting
+        self.x_limits = None       # Текущие границы оси времени
+        self.temp_limits = None    # Текущие границы оси температуры
+        self.hum_limits = None     # Текущие границы оси влажности
+        self.needs_layout = True   # Нужно пересчитать размещение (tight_layout)
+        self.needs_redraw = True   # Нужна полная перерисовка фона
+        self.last_signature = None # Отпечаток данных последнего кадра
+        self.full_redraws = 0      # Счетчик полных перерисовок
+        self.render_time = Histogram()       # Время кадров с blitting, сек
+        self.full_redraw_time = Histogram()  # Время кадров с полной перерисовкой, сек
+        self.setup_axes()
+        # Подписываемся на события холста: изменение размера и полную перерисовку
+        self.canvas.mpl_connect("resize_event", self.on_resize)
+        self.canvas.mpl_connect("draw_event", self.on_draw)
+
+    # Метод для настройки осей - выполняется один раз
+    def setup_axes(self):
+        # Настраиваем график температуры
+        self.temp_plot.set_title("Temperature (°C)")
+        self.temp_plot.set_ylabel("Temperature (°C)")
+        # Настраиваем график влажности
+        self.hum_plot.set_title("Humidity (%)")
+        self.hum_plot.set_xlabel("Time")
+        self.hum_plot.set_ylabel("Humidity (%)")
+        for plot in (self.temp_plot, self.hum_plot):
+            plot.grid(True)  # Включаем сетку
+            # Одно число после запятой по оси Y, не больше 6 меток времени по оси X
+            plot.yaxis.set_major_formatter(FuncFormatter(format_value_axis))
+            plot.xaxis.set_major_locator(MaxNLocator(6))
+            plot.xaxis.set_major_formatter(FuncFormatter(format_time_axis))
+            plot.tick_params(axis="x", labelrotation=45)
+
+    # Обработчик изменения размера холста - фон и размещение устарели
+    def on_resize(self, event):
+        self.needs_layout = True
+        self.needs_redraw = True
+
+    # Обработчик полной перерисовки холста - запоминаем фон без линий данных
+    def on_draw(self, event):
+        if self.use_blit:
+            self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+
+    # Максимальное количество точек линии - ширина области графика в пикселях
+    def max_points(self):
+        return max(int(self.temp_plot.bbox.width), MIN_POINTS)
+
+    # Метод прореживает ряды устройства до ширины графика, сохраняя пики
+    # Если прореживать не нужно, возвращает исходные массивы
+    def reduce_series(self, times, temps, hums):
+        index = downsample_indices(times, (temps, hums), self.max_points(), self.downsample)
+        if index is None:
+            return times, temps, hums
+        return times[index], temps[index], hums[index]
+
+    # Метод создает линии для выбранных устройств (только при смене набора устройств)
+    def sync_lines(self, device_ids):
+        if list(self.lines) == list(device_ids):
+            return
+        for temp_line, hum_line in self.lines.values():
+            temp_line.remove()
+            hum_line.remove()
+        self.lines = {}
+        for index, device_id in enumerate(device_ids):
+            if len(device_ids) == 1:
+                # Одно устройство: красная линия - температура, синяя - влажность
+                temp_style, hum_style = "r-", "b-"
+            else:
+                # Несколько устройств: у каждого свой цвет на обоих графиках
+                temp_style = hum_style = f"C{index % 10}-"
+            temp_line, = self.temp_plot.plot([], [], temp_style, label=device_id, animated=self.use_blit)
+            hum_line, = self.hum_plot.plot([], [], hum_style, label=device_id, animated=self.use_blit)
+            self.lines[device_id] = (temp_line, hum_line)
+        # Легенда нужна только при нескольких устройствах
+        legend = self.temp_plot.get_legend()
+        if legend is not None:
+            legend.remove()
+        if len(device_ids) > 1:
+            self.temp_plot.legend(loc="upper left", fontsize="small")
+        self.x_limits = self.temp_limits = self.hum_limits = None
+        self.needs_redraw = True
+
+    # Метод пересчитывает границы осей, только если данные в них не помещаются
+    def update_limits(self, series):
+        series = [item for item in series if len(item[1])]
+        if not series:
+            return
+        x_low = min(float(times[0]) for _, times, _, _ in series)
+        x_high = max(float(times[-1]) for _, times, _, _ in series)
+        ideal = time_limits(x_low, x_high)
+        if not limits_fit(self.x_limits, x_low, x_high, ideal):
+            self.x_limits = ideal
+            self.temp_plot.set_xlim(self.x_limits)
+            self.hum_plot.set_xlim(self.x_limits)
+            self.needs_redraw = True
+        for index, plot, name in ((2, self.temp_plot, "temp_limits"), (3, self.hum_plot, "hum_limits")):
+            low = min(float(item[index].min()) for item in series)
+            high = max(float(item[index].max()) for item in series)
+            limits = getattr(self, name)
+            ideal = value_limits(low, high)
+            if not limits_fit(limits, low, high, ideal):
+                limits = ideal
+                setattr(self, name, limits)
+                plot.set_ylim(limits)
+                self.needs_redraw = True
+
+    # Метод проверяет, что кадр с таким отпечатком данных уже на экране
+    def is_current(self, signature):
+        return signature == self.last_signature and not self.needs_redraw
+
+    # Метод для отрисовки кадра
+    # series - список кортежей (ID устройства, время, температура, влажность)
+    # signature - отпечаток данных; если он не изменился, кадр не перерисовывается
+    def render(self, series, signature=None):
+        if signature is not None and self.is_current(signature):
+            return False
+        self.last_signature = signature
+        started = time.perf_counter()
+        full_redraws = self.full_redraws
+        self.draw_series(series)
+        # Кадры с полной перерисовкой и с blitting различаются по стоимости в десятки раз
+        elapsed = time.perf_counter() - started
+        if self.full_redraws != full_redraws:
+            self.full_redraw_time.observe(elapsed)
+        else:
+            self.render_time.observe(elapsed)
+        return True
+
+    # Метод рисует ряды (device_id, times, temps, hums): обновляет линии, масштаб и экран
+    def draw_series(self, series):
+        # Прореживаем длинные ряды (короткие и уже прореженные остаются как есть)
+        series = [(device_id,) + self.reduce_series(times, temps, hums)
+                  for device_id, times, temps, hums in series]
+        self.sync_lines([item[0] for item in series])
+        # Обновляем данные существующих линий без создания новых объектов
+        for device_id, times, temps, hums in series:
+            temp_line, hum_line = self.lines[device_id]
+            temp_line.set_data(times, temps)
+            hum_line.set_data(times, hums)
+        self.update_limits(series)
+        if not self.use_blit or self.needs_redraw or self.background is None:
+            self.full_redraw()
+            if not self.use_blit:
+                return
+        else:
+            # Восстанавливаем фон (оси, сетка, подписи) вместо их перерисовки
+            self.canvas.restore_region(self.background)
+        # Рисуем только линии данных и переносим результат на экран
+        for temp_line, hum_line in self.lines.values():
+            self.temp_plot.draw_artist(temp_line)
+            self.hum_plot.draw_artist(hum_line)
+        self.canvas.blit(self.figure.bbox)
+
+    # Метод для полной перерисовки фигуры (фон сохранится в on_draw)
+    def full_redraw(self):
+        if self.needs_layout:
+            # Применяем автоматическое размещение графиков
+            self.figure.tight_layout()
+            self.needs_layout = False
+        self.canvas.draw()
+        self.needs_redraw = False
+        self.full_redraws += 1
@@ -0,0 +1,64 @@
+# Кольцевой буфер на заранее выделенном массиве NumPy
+import numpy as np                  # Для работы с массивами
+
+
+# Класс кольцевого буфера фиксированной емкости
+# Каждое значение записывается дважды: в позицию i и в позицию i + capacity.
+# Благодаря этому последние N значений всегда лежат в памяти подряд,
+# и упорядоченный срез (от старых к новым) получается без копирования.
+class RingBuffer:
+    # Конструктор - память выделяется один раз и больше не меняется
+    def __init__(self, capacity, dtype=np.float32):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._data = np.zeros(2 * capacity, dtype=dtype)
+        self._index = 0  # Позиция для следующей записи (0..capacity-1)
+        self._count = 0  # Сколько значений сейчас хранится
+
+    # Метод для добавления одного значения - O(1), без выделения памяти
+    def append(self, value):
+        index = self._index
+        self._data[index] = value
+        self._data[index + self.capacity] = value
+        index += 1
+        self._index = 0 if index == self.capacity else index
+        if self._count < self.capacity:
+            self._count += 1
+
+    # Метод для добавления пачки значений одной векторной операцией
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._data.dtype)
+        if len(values) == 0:
+            return
+        # Из слишком большой пачки нужны только последние capacity значений
+        if len(values) > self.capacity:
+            values = values[-self.capacity:]
+        positions = (self._index + np.arange(len(values))) % self.capacity
+        self._data[positions] = values
+        self._data[positions + self.capacity] = values
+        self._index = (self._index + len(values)) % self.capacity
+        self._count = min(self.capacity, self._count + len(values))
+
+    # Метод возвращает упорядоченный срез данных (от старых к новым) без копирования
+    # Срез только для чтения - он меняется при следующей записи в буфер
+    def view(self):
+        start = self._index + self.capacity - self._count
+        data = self._data[start:start + self._count]
+        data.flags.writeable = False
+        return data
+
+    # Метод возвращает последнее записанное значение
+    def last(self):
+        if self._count == 0:
+            raise IndexError("ring buffer is empty")
+        return self._data[self._index + self.capacity - 1]
+
+    # Метод для очистки буфера (память не освобождается)
+    def clear(self):
+        self._index = 0
+        self._count = 0
+
+    # Количество сохраненных значений
+    def __len__(self):
+        return self._count
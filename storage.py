@@ -0,0 +1,259 @@
+# Модуль для хранения истории измерений на диске (SQLite в режиме WAL)
+# Кроме сырых измерений хранятся заранее посчитанные агрегаты (min/max/среднее)
+# за 1 минуту и за 1 час, поэтому график за 30 дней читает ~720 строк,
+# а не миллионы сырых точек. Запись выполняется пачками в отдельном потоке.
+import queue                        # Очередь пачек для потока записи
+import sqlite3                      # Встроенная база данных
+import threading                    # Для потока записи и соединений на поток
+import time                         # Для работы со временем
+
+import numpy as np                  # Результаты запросов возвращаются массивами
+
+# Настройки хранилища
+RESOLUTION_RAW = 0          # Сырые измерения
+RESOLUTION_MINUTE = 60      # Агрегаты за 1 минуту
+RESOLUTION_HOUR = 3600      # Агрегаты за 1 час
+ROLLUP_RESOLUTIONS = (RESOLUTION_MINUTE, RESOLUTION_HOUR)
+RAW_RETENTION = 7 * 86400        # Сколько секунд хранить сырые измерения
+MINUTE_RETENTION = 90 * 86400    # Сколько секунд хранить минутные агрегаты (часовые - всегда)
+RAW_QUERY_SPAN = 3600            # До какого диапазона (сек) график строится по сырым точкам
+MAX_QUERY_POINTS = 2000          # Сколько точек максимум читать для одного графика
+FLUSH_INTERVAL = 1.0             # Как часто записывать накопленные пачки (сек)
+PRUNE_INTERVAL = 3600            # Как часто удалять устаревшие данные (сек)
+WRITE_QUEUE_SIZE = 1000          # Максимум пачек, ожидающих записи
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS readings (
+    device TEXT NOT NULL,
+    ts REAL NOT NULL,
+    temperature REAL NOT NULL,
+    humidity REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS readings_device_ts ON readings (device, ts);
+CREATE INDEX IF NOT EXISTS readings_ts ON readings (ts);
+CREATE TABLE IF NOT EXISTS rollups (
+    resolution INTEGER NOT NULL,
+    device TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    temp_min REAL NOT NULL,
+    temp_max REAL NOT NULL,
+    temp_sum REAL NOT NULL,
+    hum_min REAL NOT NULL,
+    hum_max REAL NOT NULL,
+    hum_sum REAL NOT NULL,
+    PRIMARY KEY (resolution, device, bucket)
+) WITHOUT ROWID;
+-- Устройства с недавними агрегатами (load_recent): поиск по диапазону bucket, а не по всей истории
+CREATE INDEX IF NOT EXISTS rollups_resolution_bucket ON rollups (resolution, bucket);
+"""
+
+# Добавление агрегата: если интервал уже есть - объединяем min/max/сумму/количество
+UPSERT_ROLLUP = """
+INSERT INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (resolution, device, bucket) DO UPDATE SET
+    count = count + excluded.count,
+    temp_min = min(temp_min, excluded.temp_min),
+    temp_max = max(temp_max, excluded.temp_max),
+    temp_sum = temp_sum + excluded.temp_sum,
+    hum_min = min(hum_min, excluded.hum_min),
+    hum_max = max(hum_max, excluded.hum_max),
+    hum_sum = hum_sum + excluded.hum_sum
+"""
+
+
+# Функция считает агрегаты пачки измерений в памяти (до записи в базу)
+# Возвращает список строк для UPSERT_ROLLUP
+def compute_rollups(readings, resolutions=ROLLUP_RESOLUTIONS):
+    buckets = {}
+    for device_id, timestamp, temperature, humidity in readings:
+        for resolution in resolutions:
+            key = (resolution, device_id, int(timestamp // resolution) * resolution)
+            item = buckets.get(key)
+            if item is None:
+                buckets[key] = [1, temperature, temperature, temperature, humidity, humidity, humidity]
+            else:
+                item[0] += 1
+                if temperature < item[1]:
+                    item[1] = temperature
+                if temperature > item[2]:
+                    item[2] = temperature
+                item[3] += temperature
+                if humidity < item[4]:
+                    item[4] = humidity
+                if humidity > item[5]:
+                    item[5] = humidity
+                item[6] += humidity
+    return [key + tuple(item) for key, item in buckets.items()]
+
+
+# Класс хранилища истории измерений
+class HistoryStore:
+    # Конструктор - открываем базу и создаем таблицы
+    def __init__(self, path, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._local = threading.local()   # Отдельное соединение для каждого читающего потока
+        self._queue = queue.Queue(WRITE_QUEUE_SIZE)
+        self._thread = None
+        self._running = False
+        self.written = 0    # Записано измерений
+        self.dropped = 0    # Измерений, не попавших в очередь записи
+        self.flushes = 0    # Количество транзакций записи
+        connection = self._connect()
+        # WAL: чтение не блокирует запись, synchronous=NORMAL - без fsync на каждую транзакцию
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)
+        connection.commit()
+
+    # Метод возвращает соединение с базой для текущего потока
+    def _connect(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    # Метод для запуска потока записи
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    # Метод для остановки потока записи (накопленные данные записываются)
+    def stop(self, timeout=5.0):
+        if not self._running:
+            return
+        self._running = False
+        try:
+            self._queue.put(None, timeout=timeout)  # Будим поток записи
+        except queue.Full:
+            pass  # Поток и так занят записью и увидит флаг остановки
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    # Обработчик пачки измерений для конвейера приема (вызывается в его рабочем потоке)
+    # Только кладет пачку в очередь - запись в базу выполняет отдельный поток
+    def add_readings(self, readings):
+        try:
+            self._queue.put_nowait(list(readings))
+        except queue.Full:
+            self.dropped += len(readings)
+
+    # Основной цикл потока записи: собираем пачки за flush_interval и пишем одной транзакцией
+    def _run(self):
+        last_prune = 0.0
+        while self._running:
+            pending = []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if batch is None:
+                    break  # Остановка
+                pending.extend(batch)
+            # Забираем все, что осталось в очереди (например, при остановке)
+            while True:
+                try:
+                    batch = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if batch is not None:
+                    pending.extend(batch)
+            try:
+                if pending:
+                    self.write(pending)
+                if time.time() - last_prune > PRUNE_INTERVAL:
+                    last_prune = time.time()
+                    self.prune()
+            except sqlite3.Error as e:
+                print(f"History write error: {e}")
+        self._connect().close()
+        self._local.connection = None
+
+    # Метод записывает пачку измерений и обновляет агрегаты одной транзакцией
+    def write(self, readings):
+        connection = self._connect()
+        with connection:
+            connection.executemany("INSERT INTO readings VALUES (?, ?, ?, ?)", readings)
+            connection.executemany(UPSERT_ROLLUP, compute_rollups(readings))
+        self.written += len(readings)
+        self.flushes += 1
+
+    # Метод удаляет устаревшие сырые измерения и минутные агрегаты
+    def prune(self, now=None):
+        now = time.time() if now is None else now
+        connection = self._connect()
+        with connection:
+            connection.execute("DELETE FROM readings WHERE ts < ?", (now - RAW_RETENTION,))
+            connection.execute("DELETE FROM rollups WHERE resolution = ? AND bucket < ?",
+                               (RESOLUTION_MINUTE, now - MINUTE_RETENTION))
+
+    # Функция выбирает разрешение так, чтобы на график пришлось не больше max_points точек
+    @staticmethod
+    def choose_resolution(span, max_points=MAX_QUERY_POINTS):
+        if span <= RAW_QUERY_SPAN:
+            return RESOLUTION_RAW
+        for resolution in ROLLUP_RESOLUTIONS:
+            if span / resolution <= max_points:
+                return resolution
+        return ROLLUP_RESOLUTIONS[-1]
+
+    # Метод читает историю устройства за интервал в подходящем разрешении
+    # Возвращает (разрешение, время, средняя температура, средняя влажность, min/max температуры, min/max влажности)
+    def history(self, device_id, since, until=None, max_points=MAX_QUERY_POINTS):
+        until = time.time() if until is None else until
+        resolution = self.choose_resolution(until - since, max_points)
+        connection = self._connect()
+        if resolution == RESOLUTION_RAW:
+            # Берем последние max_points сырых точек интервала
+            rows = connection.execute(
+                "SELECT ts, temperature, humidity, temperature, temperature, humidity, humidity "
+                "FROM (SELECT * FROM readings WHERE device = ? AND ts >= ? AND ts <= ? "
+                "ORDER BY ts DESC LIMIT ?) ORDER BY ts",
+                (device_id, since, until, max_points)).fetchall()
+        else:
+            # Точка агрегата ставится в середину интервала
+            rows = connection.execute(
+                "SELECT bucket + ? / 2.0, temp_sum / count, hum_sum / count, temp_min, temp_max, hum_min, hum_max "
+                "FROM rollups WHERE resolution = ? AND device = ? AND bucket >= ? AND bucket <= ? "
+                "ORDER BY bucket",
+                (resolution, resolution, device_id, since - resolution, until)).fetchall()
+        data = np.array(rows, dtype=np.float64).reshape(-1, 7)
+        return (resolution, data[:, 0], data[:, 1].astype(np.float32), data[:, 2].astype(np.float32),
+                data[:, 3:5].astype(np.float32), data[:, 5:7].astype(np.float32))
+
+    # Метод возвращает последние измерения устройств, активных за последний час
+    # Используется при запуске вместо чтения всей базы
+    # Результат: список кортежей (ID устройства, время, температура, влажность)
+    def load_recent(self, limit_per_device, max_age=RESOLUTION_HOUR):
+        connection = self._connect()
+        since = time.time() - max_age
+        # Часовые агрегаты хранятся всегда: без INDEXED BY (и статистики ANALYZE) планировщик
+        # берет первичный ключ и перебирает всю историю, время запуска растет с каждым днем
+        devices = [row[0] for row in connection.execute(
+            "SELECT DISTINCT device FROM rollups INDEXED BY rollups_resolution_bucket "
+            "WHERE resolution = ? AND bucket >= ?",
+            (RESOLUTION_HOUR, since - RESOLUTION_HOUR))]
+        readings = []
+        for device_id in devices:
+            rows = connection.execute(
+                "SELECT device, ts, temperature, humidity FROM readings "
+                "WHERE device = ? AND ts >= ? ORDER BY ts DESC LIMIT ?",
+                (device_id, since, limit_per_device)).fetchall()
+            readings.extend(reversed(rows))
+        return readings
+
+    # Метод возвращает словарь со значениями счетчиков
+    def stats(self):
+        return {"written": self.written, "dropped": self.dropped, "flushes": self.flushes,
+                "pending": self._queue.qsize()}